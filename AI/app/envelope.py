@@ -0,0 +1,116 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+import json
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Frame envelopes sent to frontend websockets.
+#
+# "json" (default, what the dashboard parses today):
+#     u32 big-endian metadata length | metadata JSON | JPEG
+# "binary" (opt-in with "envelope": "binary" in the subscribe message):
+#     fixed 24-byte header | stream id (utf-8) | metrics JSON | JPEG
+#     header = magic "XCF1", version u8, kind u8, stream id length u16,
+#              timestamp ms u64, metrics length u32, image length u32
+ENVELOPES = ("json", "binary")
+ENVELOPE_MAGIC = b"XCF1"
+ENVELOPE_VERSION = 1
+KIND_FRAME = 1
+
+_LEGACY_HEADER = struct.Struct(">I")
+_BINARY_HEADER = struct.Struct(">4sBBHQII")
+
+_ORJSON_OPTS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTS)
+        except TypeError:
+            pass
+    return json.dumps(obj).encode("utf-8")
+
+
+def dumps_text(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+
+def normalize_envelope(name: Optional[str]) -> str:
+    name = str.lower(name or "json")
+    return name if name in ENVELOPES else "json"
+
+
+class FrameEnvelope:
+    """Builds the per-frame prefix for both envelopes of one stream.
+
+    The metrics dict forwarded to frontends is usually the same object for
+    several seconds (see the publish interval in the routers), so its JSON
+    is cached by identity instead of being re-serialized on every frame.
+    """
+
+    def __init__(self, stream_id: str) -> None:
+        self.stream_id = stream_id
+        self._sid = str(stream_id).encode("utf-8")
+        self._metrics_obj: Any = None
+        self._metrics_json = b"null"
+
+    def _metrics_bytes(self, metrics: Any) -> bytes:
+        if metrics is not self._metrics_obj:
+            self._metrics_json = dumps(metrics)
+            self._metrics_obj = metrics
+        return self._metrics_json
+
+    def pack(self, envelope: str, ts_ms: int, metrics: Any, image: bytes) -> bytes:
+        # One b"".join copies the JPEG exactly once into the outgoing message;
+        # ASGI websocket.send takes a single bytes object, so that copy is the floor.
+        metrics_json = self._metrics_bytes(metrics)
+        if envelope == "binary":
+            header = _BINARY_HEADER.pack(
+                ENVELOPE_MAGIC, ENVELOPE_VERSION, KIND_FRAME,
+                len(self._sid), ts_ms, len(metrics_json), len(image),
+            )
+            return b"".join((header, self._sid, metrics_json, image))
+
+        stream_id = dumps(self.stream_id)
+        meta = b"".join((
+            b'{"type":"frame","stream_id":', stream_id,
+            b',"ts":', str(ts_ms).encode("ascii"),
+            b',"metrics":', metrics_json, b"}",
+        ))
+        return b"".join((_LEGACY_HEADER.pack(len(meta)), meta, image))
+
+
+def unpack(payload: bytes) -> Tuple[Dict[str, Any], memoryview]:
+    """Parse either envelope; returns (metadata, JPEG view)."""
+    view = memoryview(payload)
+    if bytes(view[:4]) == ENVELOPE_MAGIC:
+        _, version, kind, sid_len, ts_ms, metrics_len, image_len = _BINARY_HEADER.unpack_from(view)
+        pos = _BINARY_HEADER.size
+        stream_id = bytes(view[pos:pos + sid_len]).decode("utf-8")
+        pos += sid_len
+        metrics = json.loads(bytes(view[pos:pos + metrics_len]))
+        pos += metrics_len
+        meta = {"type": "frame", "stream_id": stream_id, "ts": ts_ms, "metrics": metrics}
+        return meta, view[pos:pos + image_len]
+    (meta_len,) = _LEGACY_HEADER.unpack_from(view)
+    meta = json.loads(bytes(view[4:4 + meta_len]))
+    return meta, view[4 + meta_len:]
@@ -0,0 +1,257 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from fastapi import WebSocket
+
+from app.envelope import normalize_envelope
+from components.logging import logger
+
+logger = logger.setup_logger("fanout")
+
+# "disconnect" closes a client whose send stalls for FANOUT_SEND_TIMEOUT
+# seconds or that misses FANOUT_MAX_DROPS frames in a row; "drop" keeps every
+# client and only ever delivers its newest frame.
+FANOUT_SLOW_POLICY = str.lower(os.getenv("FANOUT_SLOW_POLICY", "disconnect"))
+FANOUT_SEND_TIMEOUT = float(os.getenv("FANOUT_SEND_TIMEOUT", "5.0"))
+FANOUT_MAX_DROPS = int(os.getenv("FANOUT_MAX_DROPS", "150"))
+# A requested max width snaps down to one of these, so dashboards asking for
+# similar sizes share one rendition per frame.
+FANOUT_WIDTH_TIERS = tuple(
+    sorted(int(w) for w in os.getenv("FANOUT_WIDTH_TIERS", "160,320,640,1280").split(",") if w.strip())
+)
+
+
+def snap_width(max_width: Optional[int], tiers=FANOUT_WIDTH_TIERS) -> Optional[int]:
+    if not max_width or int(max_width) <= 0:
+        return None
+    fitting = [t for t in tiers if t <= int(max_width)]
+    if fitting:
+        return fitting[-1]
+    return tiers[0] if tiers else int(max_width)
+
+
+class ClientSender:
+    """One frontend websocket with a single-slot outbox and its sender task."""
+
+    def __init__(self, hub: "FanoutHub", ws: WebSocket, stream_id: Optional[str]) -> None:
+        self.hub = hub
+        self.ws = ws
+        self.stream_id = stream_id
+        self.max_fps: Optional[float] = None
+        self.width: Optional[int] = None
+        self.envelope = "json"
+        self._next_due = 0.0
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.sent = 0
+        self.dropped = 0
+        self.consecutive_drops = 0
+        self.send_ms = 0.0
+        self.task = asyncio.create_task(self._run())
+
+    def set_tier(self, max_fps: Optional[float] = None, max_width: Optional[int] = None) -> None:
+        try:
+            self.max_fps = float(max_fps) if max_fps and float(max_fps) > 0 else None
+        except (TypeError, ValueError):
+            self.max_fps = None
+        try:
+            self.width = snap_width(int(max_width)) if max_width else None
+        except (TypeError, ValueError):
+            self.width = None
+        self._next_due = 0.0
+
+    def due(self, now: float) -> bool:
+        if self.max_fps is None:
+            return True
+        if now < self._next_due:
+            return False
+        # Advance on a fixed grid so the delivered rate does not drift below
+        # max_fps when frames arrive slightly early.
+        interval = 1.0 / self.max_fps
+        self._next_due = max(self._next_due + interval, now + 0.5 * interval)
+        return True
+
+    def offer(self, payload: bytes) -> bool:
+        # Newest frame wins: a frame still waiting for the socket is replaced.
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+                self.consecutive_drops += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(payload)
+        return self.hub.policy != "disconnect" or self.consecutive_drops < self.hub.max_drops
+
+    async def _run(self) -> None:
+        reason = "closed"
+        try:
+            while True:
+                payload = await self.queue.get()
+                t0 = time.perf_counter()
+                if self.hub.policy == "disconnect":
+                    await asyncio.wait_for(self.ws.send_bytes(payload), self.hub.send_timeout)
+                else:
+                    await self.ws.send_bytes(payload)
+                self.send_ms = (time.perf_counter() - t0) * 1000.0
+                self.sent += 1
+                self.consecutive_drops = 0
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            reason = "send timeout"
+        except Exception:
+            reason = "send failed"
+        await self.hub.evict(self, reason)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "stream_id": self.stream_id,
+            "max_fps": self.max_fps,
+            "width": self.width,
+            "envelope": self.envelope,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "queue_depth": self.queue.qsize(),
+            "last_send_ms": round(self.send_ms, 2),
+        }
+
+
+class FanoutHub:
+    """Delivers each stream's frame payload to its subscribed frontends.
+
+    Clients may ask for a max fps and a max width. On every frame the hub
+    picks the clients that are due and renders each width tier they need
+    once, sharing the payload between them. Each client has its own sender
+    task, so one slow browser delays only itself. Clients subscribed without
+    a stream id receive every stream.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        policy: str = FANOUT_SLOW_POLICY,
+        send_timeout: float = FANOUT_SEND_TIMEOUT,
+        max_drops: int = FANOUT_MAX_DROPS,
+    ) -> None:
+        self.name = name
+        self.policy = "drop" if policy == "drop" else "disconnect"
+        self.send_timeout = send_timeout
+        self.max_drops = max(1, max_drops)
+        self._clients: Dict[WebSocket, ClientSender] = {}
+        self._by_stream: Dict[Optional[str], Set[ClientSender]] = {}
+        self.published = 0
+        self.evicted = 0
+        self.renditions: Dict[str, int] = {}
+        # Totals of clients that already left, so the counters only grow.
+        self._past_sent = 0
+        self._past_dropped = 0
+
+    def subscribe(
+        self,
+        ws: WebSocket,
+        stream_id: Optional[str],
+        max_fps: Optional[float] = None,
+        max_width: Optional[int] = None,
+        envelope: Optional[str] = None,
+    ) -> ClientSender:
+        stream_id = stream_id or None
+        sender = self._clients.get(ws)
+        if sender is None:
+            sender = ClientSender(self, ws, stream_id)
+            self._clients[ws] = sender
+        else:
+            self._by_stream.get(sender.stream_id, set()).discard(sender)
+            sender.stream_id = stream_id
+        sender.set_tier(max_fps, max_width)
+        sender.envelope = normalize_envelope(envelope)
+        self._by_stream.setdefault(stream_id, set()).add(sender)
+        return sender
+
+    def unsubscribe(self, ws: WebSocket) -> None:
+        sender = self._clients.pop(ws, None)
+        if sender is None:
+            return
+        self._by_stream.get(sender.stream_id, set()).discard(sender)
+        self._past_sent += sender.sent
+        self._past_dropped += sender.dropped
+        if sender.task is not asyncio.current_task():
+            sender.task.cancel()
+
+    async def publish(
+        self,
+        stream_id: str,
+        render: Callable[[Optional[int], str], Awaitable[Optional[bytes]]],
+        frame_width: Optional[int] = None,
+    ) -> int:
+        """Offer one frame to the due subscribers of ``stream_id``.
+
+        ``render(width, envelope)`` builds the payload for a width tier,
+        ``None`` being the full frame; it is awaited at most once per tier
+        and envelope.
+        """
+        now = time.monotonic()
+        recipients = list(self._by_stream.get(stream_id, ())) + list(self._by_stream.get(None, ()))
+        payloads: Dict[Any, Optional[bytes]] = {}
+        delivered = 0
+        for sender in recipients:
+            if not sender.due(now):
+                continue
+            width = sender.width
+            if width is not None and frame_width is not None and width >= frame_width:
+                width = None
+            key = (width, sender.envelope)
+            if key not in payloads:
+                payloads[key] = await render(width, sender.envelope)
+                tier = f"{width or 'full'}/{sender.envelope}"
+                self.renditions[tier] = self.renditions.get(tier, 0) + 1
+            payload = payloads[key]
+            if payload is None:
+                continue
+            delivered += 1
+            if not sender.offer(payload):
+                sender.task.cancel()
+                asyncio.create_task(self.evict(sender, f"{sender.consecutive_drops} frames dropped in a row"))
+        self.published += 1
+        return delivered
+
+    async def evict(self, sender: ClientSender, reason: str) -> None:
+        if self._clients.get(sender.ws) is not sender:
+            return
+        self.unsubscribe(sender.ws)
+        self.evicted += 1
+        logger.info(f"[{self.name}] dropping frontend client of stream {sender.stream_id}: {reason}")
+        try:
+            await sender.ws.close(code=1013)
+        except Exception:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        clients = [s.stats() for s in self._clients.values()]
+        return {
+            "policy": self.policy,
+            "clients": len(clients),
+            "published": self.published,
+            "evicted": self.evicted,
+            "renditions": dict(self.renditions),
+            "sent": self._past_sent + sum(c["sent"] for c in clients),
+            "dropped": self._past_dropped + sum(c["dropped"] for c in clients),
+            "queued": sum(c["queue_depth"] for c in clients),
+            "per_client": clients,
+        }
@@ -0,0 +1,111 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+import base64
+import binascii
+import math
+import struct
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from components.codec.jpeg_codec import JpegCodec
+
+# Producers declare how binary frames are encoded with "frame_encoding" in the
+# init config:
+#   jpeg        JPEG bytes
+#   b64         base64 text of a JPEG
+#   raw_bgr     height x width x 3 uint8, row-major (same-host producers)
+#   raw_yuv420  I420 planes, height * 3 / 2 rows of width bytes
+#   auto        JPEG when the payload starts with the SOI marker, else base64
+# Raw modes need "frame_width" and "frame_height".
+#
+# With "frame_timestamps": true every binary frame is prefixed with its
+# capture time, 8 bytes of big-endian float64 seconds on the producer's clock.
+# Speeds are then measured between capture times rather than server arrival
+# times, which queueing and socket batching stretch or compress.
+FRAME_ENCODINGS = ("auto", "jpeg", "b64", "raw_bgr", "raw_yuv420")
+RAW_ENCODINGS = ("raw_bgr", "raw_yuv420")
+
+_JPEG_SOI = b"\xff\xd8"
+CAPTURE_TS = struct.Struct(">d")
+
+# A decoder returns the BGR frame plus the JPEG it came from (None for raw
+# payloads), so an unannotated frame can be forwarded without re-encoding.
+FrameDecoder = Callable[[bytes], Tuple[Optional[np.ndarray], Optional[bytes]]]
+
+
+def _b64_jpeg(payload: bytes) -> Optional[bytes]:
+    try:
+        return base64.b64decode(payload, validate=False)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def pack_capture_ts(ts: float, payload: bytes) -> bytes:
+    return CAPTURE_TS.pack(ts) + payload
+
+
+def split_capture_ts(payload: bytes) -> Tuple[Optional[float], bytes]:
+    """Capture time and frame bytes; the time is None when missing or not finite."""
+    if len(payload) < CAPTURE_TS.size:
+        return None, payload
+    (ts,) = CAPTURE_TS.unpack_from(payload)
+    return (ts if math.isfinite(ts) else None), payload[CAPTURE_TS.size:]
+
+
+def make_frame_decoder(
+    encoding: Optional[str],
+    codec: JpegCodec,
+    scale: int = 1,
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+) -> FrameDecoder:
+    encoding = str.lower(encoding or "auto")
+    if encoding not in FRAME_ENCODINGS:
+        raise ValueError(f"Unknown frame_encoding {encoding!r}, expected one of {FRAME_ENCODINGS}")
+
+    if encoding in RAW_ENCODINGS:
+        if not width or not height:
+            raise ValueError(f"frame_encoding {encoding} needs frame_width and frame_height")
+        w, h = int(width), int(height)
+
+        if encoding == "raw_bgr":
+            def decode_raw_bgr(payload: bytes):
+                if len(payload) != w * h * 3:
+                    return None, None
+                # Read-only view over the websocket message, no copy.
+                return np.frombuffer(payload, dtype=np.uint8).reshape(h, w, 3), None
+            return decode_raw_bgr
+
+        def decode_raw_yuv420(payload: bytes):
+            if len(payload) != w * h * 3 // 2:
+                return None, None
+            planes = np.frombuffer(payload, dtype=np.uint8).reshape(h * 3 // 2, w)
+            return cv2.cvtColor(planes, cv2.COLOR_YUV2BGR_I420), None
+        return decode_raw_yuv420
+
+    def decode_jpeg(jpg: Optional[bytes]):
+        if not jpg:
+            return None, None
+        frame = codec.decode(jpg, scale)
+        return (frame, jpg) if frame is not None else (None, None)
+
+    if encoding == "jpeg":
+        return decode_jpeg
+    if encoding == "b64":
+        return lambda payload: decode_jpeg(_b64_jpeg(payload))
+    return lambda payload: decode_jpeg(payload if payload[:2] == _JPEG_SOI else _b64_jpeg(payload))
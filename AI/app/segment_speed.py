@@ -0,0 +1,140 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+import math
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+SEGMENT_SPEED_BUCKET_S = float(os.getenv("SEGMENT_SPEED_BUCKET_S", "10"))
+SEGMENT_SPEED_HISTORY_S = float(os.getenv("SEGMENT_SPEED_HISTORY_S", "3600"))
+SEGMENT_SPEED_HALFLIFE_S = float(os.getenv("SEGMENT_SPEED_HALFLIFE_S", "30"))
+
+
+class SegmentSpeedSeries:
+    """Fixed-width time buckets of one segment's speed samples in a ring.
+
+    Each bucket keeps count, sum, min, max and the EWMA at its last sample.
+    The EWMA is time-decayed (``halflife_s``), so it does not depend on how
+    many frames per second feed it, and reading it is O(1). Buckets older
+    than the ring are overwritten in place; nothing grows with uptime.
+    """
+
+    def __init__(
+        self,
+        bucket_s: float = SEGMENT_SPEED_BUCKET_S,
+        history_s: float = SEGMENT_SPEED_HISTORY_S,
+        halflife_s: float = SEGMENT_SPEED_HALFLIFE_S,
+    ) -> None:
+        self.bucket_s = max(1e-3, float(bucket_s))
+        self.size = max(1, int(math.ceil(history_s / self.bucket_s)))
+        self.halflife_s = max(1e-3, float(halflife_s))
+        self.stamp = np.full(self.size, -1, dtype=np.int64)
+        self.count = np.zeros(self.size, dtype=np.int64)
+        self.sum = np.zeros(self.size, dtype=np.float64)
+        self.min = np.full(self.size, np.inf, dtype=np.float64)
+        self.max = np.full(self.size, -np.inf, dtype=np.float64)
+        self.ewma_at = np.zeros(self.size, dtype=np.float64)
+        self.ewma: Optional[float] = None
+        self.last: Optional[float] = None
+        self.last_ts: Optional[float] = None
+
+    def add(self, value: float, ts: Optional[float] = None) -> None:
+        ts = time.time() if ts is None else float(ts)
+        value = float(value)
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            dt = max(0.0, ts - self.last_ts)
+            alpha = 1.0 - 0.5 ** (dt / self.halflife_s)
+            self.ewma += alpha * (value - self.ewma)
+        self.last = value
+        self.last_ts = ts if self.last_ts is None else max(ts, self.last_ts)
+
+        bucket = int(ts // self.bucket_s)
+        slot = bucket % self.size
+        if self.stamp[slot] != bucket:
+            self.stamp[slot] = bucket
+            self.count[slot] = 0
+            self.sum[slot] = 0.0
+            self.min[slot] = np.inf
+            self.max[slot] = -np.inf
+        self.count[slot] += 1
+        self.sum[slot] += value
+        if value < self.min[slot]:
+            self.min[slot] = value
+        if value > self.max[slot]:
+            self.max[slot] = value
+        self.ewma_at[slot] = self.ewma
+
+    def _window(self, seconds: float, now: Optional[float] = None) -> np.ndarray:
+        now = time.time() if now is None else float(now)
+        newest = int(now // self.bucket_s)
+        oldest = int((now - seconds) // self.bucket_s)
+        return (self.stamp > oldest) & (self.stamp <= newest) & (self.count > 0)
+
+    def window(self, seconds: float, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Aggregate of the buckets covering the last ``seconds``."""
+        mask = self._window(seconds, now)
+        if not mask.any():
+            return None
+        count = int(self.count[mask].sum())
+        return {
+            "count": count,
+            "mean": float(self.sum[mask].sum() / count),
+            "min": float(self.min[mask].min()),
+            "max": float(self.max[mask].max()),
+        }
+
+    def percentiles(
+        self, seconds: float, qs: Iterable[float] = (50, 90), now: Optional[float] = None
+    ) -> Optional[Dict[str, float]]:
+        """Percentiles of bucket means over the last ``seconds``, weighted by
+        sample count (samples themselves are not kept)."""
+        mask = self._window(seconds, now)
+        if not mask.any():
+            return None
+        means = self.sum[mask] / self.count[mask]
+        order = np.argsort(means)
+        means = means[order]
+        cdf = np.cumsum(self.count[mask][order]).astype(np.float64)
+        cdf /= cdf[-1]
+        return {f"p{q:g}": float(means[min(np.searchsorted(cdf, q / 100.0), means.size - 1)]) for q in qs}
+
+    def buckets(self, seconds: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        mask = self._window(seconds, now)
+        idx = np.nonzero(mask)[0]
+        idx = idx[np.argsort(self.stamp[idx])]
+        return [
+            {
+                "start": float(self.stamp[i] * self.bucket_s),
+                "count": int(self.count[i]),
+                "mean": float(self.sum[i] / self.count[i]),
+                "min": float(self.min[i]),
+                "max": float(self.max[i]),
+                "ewma": float(self.ewma_at[i]),
+            }
+            for i in idx
+        ]
+
+    def copy(self) -> "SegmentSpeedSeries":
+        clone = SegmentSpeedSeries.__new__(SegmentSpeedSeries)
+        clone.bucket_s, clone.size, clone.halflife_s = self.bucket_s, self.size, self.halflife_s
+        for name in ("stamp", "count", "sum", "min", "max", "ewma_at"):
+            setattr(clone, name, getattr(self, name).copy())
+        clone.ewma, clone.last, clone.last_ts = self.ewma, self.last, self.last_ts
+        return clone
@@ -0,0 +1,174 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+# "thread" runs decode / inference / encode on a shared thread pool (OpenCV and
+# ONNX Runtime release the GIL); "inline" keeps them on the event loop.
+STREAM_EXECUTOR = str.lower(os.getenv("STREAM_EXECUTOR", "thread"))
+STREAM_EXECUTOR_WORKERS = int(os.getenv("STREAM_EXECUTOR_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+STREAM_MAX_INFLIGHT = int(os.getenv("STREAM_MAX_INFLIGHT", "2"))
+# "queue" waits for the worker when STREAM_MAX_INFLIGHT frames are pending;
+# "latest" keeps only the newest pending frame and drops the rest.
+STREAM_INGEST_MODE = str.lower(os.getenv("STREAM_INGEST_MODE", "queue"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_frame_executor() -> Optional[ThreadPoolExecutor]:
+    global _executor
+    if STREAM_EXECUTOR == "inline":
+        return None
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=STREAM_EXECUTOR_WORKERS, thread_name_prefix="frame"
+        )
+    return _executor
+
+
+async def run_stage(fn: Callable[..., Any], *args) -> Any:
+    executor = get_frame_executor()
+    if executor is None:
+        return fn(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, fn, *args)
+
+
+async def finish_frame(coro) -> Any:
+    """Await one frame's handling; if cancelled, let it complete first.
+
+    Cancelling ``run_in_executor`` does not stop the thread it started, so a
+    stream torn down mid-frame would otherwise leave ``process_frame``
+    running while a reconnect reusing the same service starts another.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        await asyncio.gather(task, return_exceptions=True)
+        raise
+
+
+async def stop_worker(task: "asyncio.Task") -> None:
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+class StageTimings:
+    STAGES = ("decode", "infer", "encode", "fanout")
+
+    def __init__(self, alpha: float = 0.1) -> None:
+        self.alpha = alpha
+        self.frames = 0
+        self.passthrough = 0
+        self.last_ms: Dict[str, float] = {s: 0.0 for s in self.STAGES}
+        self.avg_ms: Dict[str, float] = {s: 0.0 for s in self.STAGES}
+        self.max_ms: Dict[str, float] = {s: 0.0 for s in self.STAGES}
+        self.started_at = time.time()
+
+    @contextmanager
+    def measure(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - t0) * 1000.0)
+
+    def record(self, stage: str, ms: float) -> None:
+        prev = self.avg_ms.get(stage, 0.0)
+        self.avg_ms[stage] = ms if self.frames == 0 or prev == 0.0 else prev + self.alpha * (ms - prev)
+        self.last_ms[stage] = ms
+        self.max_ms[stage] = max(self.max_ms.get(stage, 0.0), ms)
+
+    def frame_done(self, passthrough: bool = False) -> None:
+        self.frames += 1
+        if passthrough:
+            self.passthrough += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        return {
+            "frames": self.frames,
+            "fps": round(self.frames / elapsed, 2),
+            "passthrough_frames": self.passthrough,
+            "stages": {
+                s: {
+                    "last_ms": round(self.last_ms[s], 2),
+                    "avg_ms": round(self.avg_ms[s], 2),
+                    "max_ms": round(self.max_ms[s], 2),
+                }
+                for s in self.STAGES
+            },
+        }
+
+
+class FrameIngest:
+    """Hand-off between a websocket reader and its frame worker.
+
+    In ``queue`` mode the reader waits once ``maxsize`` frames are pending,
+    pushing back on the producer. In ``latest`` mode the reader never waits:
+    a new frame replaces the pending one, so stale frames are dropped before
+    they are decoded.
+    """
+
+    def __init__(self, mode: str = STREAM_INGEST_MODE, maxsize: int = STREAM_MAX_INFLIGHT) -> None:
+        self.mode = "latest" if str.lower(mode or "") == "latest" else "queue"
+        size = 1 if self.mode == "latest" else max(1, maxsize)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.received = 0
+        self.dropped = 0
+
+    async def put(self, payload: Any) -> None:
+        self.received += 1
+        if self.mode == "latest":
+            while self._queue.full():
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except asyncio.QueueEmpty:
+                    break
+            self._queue.put_nowait(payload)
+        else:
+            await self._queue.put(payload)
+
+    async def get(self) -> Any:
+        return await self._queue.get()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "received": self.received,
+            "dropped": self.dropped,
+            "queue_depth": self._queue.qsize(),
+        }
+
+    def flow_signal(self, timings: StageTimings, headroom: float = 0.9) -> Dict[str, Any]:
+        # Sustainable rate for this stream given how long a frame currently
+        # spends in the worker; the producer clamps its own limit_fps to it.
+        busy_ms = sum(timings.avg_ms.get(s, 0.0) for s in ("decode", "infer", "encode"))
+        capacity_fps = 1000.0 / busy_ms if busy_ms > 0 else None
+        return {
+            **self.stats(),
+            "capacity_fps": round(capacity_fps, 2) if capacity_fps else None,
+            "suggested_fps": round(capacity_fps * headroom, 2) if capacity_fps else None,
+        }
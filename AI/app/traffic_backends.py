@@ -0,0 +1,1027 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""Traffic state shared between uvicorn workers.
+
+With ``--workers N`` every worker imports its own ``app.utils``, so a stream
+handled by one worker is invisible to the routing tool and the chat intent
+running in another. ``TRAFFIC_STATE_BACKEND`` picks where the state lives:
+
+* ``local`` (default): in-process only, as before.
+* ``shm``: one POSIX shared-memory table of segment series that every
+  worker on the host maps; reads and writes are plain memory accesses.
+  Latest frames go to small files in a tmpfs directory.
+* ``redis``: workers push coalesced writes to Redis from a background
+  pipeline; a background thread keeps a local copy of the other workers'
+  segments, so requests never wait on Redis for a speed. Works across
+  hosts.
+
+Whatever the backend, a worker always answers from its own in-process
+state first, so the hot write path and reads of local streams are
+unchanged. Shared speeds and frames older than ``TRAFFIC_STATE_MAX_AGE_S``
+are ignored and cleaned up, so a worker never routes on values left behind
+by a stopped stream or a previous deployment.
+"""
+import fcntl
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+try:
+    import redis
+    from redis.backoff import NoBackoff
+    from redis.retry import Retry
+except ImportError:
+    redis = None
+
+from app.segment_speed import (
+    SEGMENT_SPEED_BUCKET_S,
+    SEGMENT_SPEED_HALFLIFE_S,
+    SEGMENT_SPEED_HISTORY_S,
+    SegmentSpeedSeries,
+)
+from app.traffic_store import TrafficMedia, TrafficState, history_summary
+from components.logging import logger
+
+logger = logger.setup_logger("traffic_backends")
+
+TRAFFIC_STATE_BACKEND = str.lower(os.getenv("TRAFFIC_STATE_BACKEND", "local"))
+TRAFFIC_STATE_MAX_AGE_S = float(os.getenv("TRAFFIC_STATE_MAX_AGE_S", "300"))
+
+TRAFFIC_SHM_NAME = os.getenv("TRAFFIC_SHM_NAME", "xcity_traffic")
+TRAFFIC_SHM_CAPACITY = int(os.getenv("TRAFFIC_SHM_CAPACITY", "1024"))
+TRAFFIC_SHM_FRAME_DIR = os.getenv("TRAFFIC_SHM_FRAME_DIR", "")
+TRAFFIC_SHM_FRAME_INTERVAL = float(os.getenv("TRAFFIC_SHM_FRAME_INTERVAL", "0.5"))
+
+TRAFFIC_REDIS_PREFIX = os.getenv("TRAFFIC_REDIS_PREFIX", "xcity:traffic")
+TRAFFIC_REDIS_TIMEOUT = float(os.getenv("TRAFFIC_REDIS_TIMEOUT", "0.5"))
+TRAFFIC_REDIS_FLUSH_MS = float(os.getenv("TRAFFIC_REDIS_FLUSH_MS", "50"))
+TRAFFIC_REDIS_CACHE_TTL = float(os.getenv("TRAFFIC_REDIS_CACHE_TTL", "0.5"))
+TRAFFIC_REDIS_FRAME_INTERVAL = float(os.getenv("TRAFFIC_REDIS_FRAME_INTERVAL", "1.0"))
+
+
+# ---------------------------------------------------------------------------
+# Shared memory
+# ---------------------------------------------------------------------------
+
+_SHM_MAGIC = 0x58435354  # "XCST"
+_SHM_VERSION = 2
+_SHM_HEADER_SLOTS = 8  # int64: magic, version, capacity, n_buckets, bucket_us, halflife_us, count, generation
+_SHM_PID_SLOTS = 64  # pids of the attached workers
+_SHM_HEADER_BYTES = (_SHM_HEADER_SLOTS + _SHM_PID_SLOTS) * 8
+(_H_MAGIC, _H_VERSION, _H_CAPACITY, _H_BUCKETS,
+ _H_BUCKET_US, _H_HALFLIFE_US, _H_COUNT, _H_GENERATION) = range(_SHM_HEADER_SLOTS)
+_SHM_ROW = np.dtype([
+    ("id", "S64"),
+    ("address", "S192"),
+    ("last", "f8"),
+    ("ewma", "f8"),
+    ("last_ts", "f8"),
+    ("has_value", "i8"),
+])
+_SHM_BUCKET_ARRAYS = (("stamp", np.int64), ("count", np.int64), ("sum", np.float64),
+                      ("min", np.float64), ("max", np.float64), ("ewma_at", np.float64))
+_SHM_VIEWS = ("header", "pids", "rows", "ids", "addresses", "last", "ewma", "last_ts", "has_value") + tuple(
+    field for field, _ in _SHM_BUCKET_ARRAYS
+)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _untrack(shm: shared_memory.SharedMemory) -> None:
+    # The block outlives any single worker: keep the resource tracker from
+    # unlinking it when this process exits. _unlink() removes it explicitly.
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def _unlink(shm: shared_memory.SharedMemory) -> None:
+    # SharedMemory.unlink() unregisters the name again; balance _untrack().
+    resource_tracker.register(shm._name, "shared_memory")
+    shm.unlink()
+
+
+class SharedSegmentTable:
+    """Fixed-capacity table of segment rows in one shared-memory block.
+
+    Layout: an int64 header, the pids of the attached workers, ``capacity``
+    rows of ``_SHM_ROW`` and then one ``(capacity, n_buckets)`` array per
+    SegmentSpeedSeries bucket field.
+
+    The block lives as long as one attached worker does: the last worker to
+    close() unlinks it, and a block whose workers all died is discarded on
+    the next attach, so every deployment starts empty and with the
+    configured layout. Rows are appended under an flock; once the table is
+    full, the row with the oldest sample past ``max_age`` is reused and the
+    header generation bumped so other workers rebuild their index.
+    """
+
+    def __init__(
+        self,
+        name: str = TRAFFIC_SHM_NAME,
+        capacity: int = TRAFFIC_SHM_CAPACITY,
+        bucket_s: float = SEGMENT_SPEED_BUCKET_S,
+        history_s: float = SEGMENT_SPEED_HISTORY_S,
+        halflife_s: float = SEGMENT_SPEED_HALFLIFE_S,
+        max_age: float = TRAFFIC_STATE_MAX_AGE_S,
+    ) -> None:
+        self.name = name
+        self.max_age = max_age
+        bucket_us = int(max(1e-3, float(bucket_s)) * 1e6)
+        n_buckets = max(1, int(math.ceil(history_s / (bucket_us / 1e6))))
+        halflife_us = int(max(1e-3, float(halflife_s)) * 1e6)
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+
+        # Creation and attach are serialised so an attaching worker never
+        # sees a half-initialised header.
+        with self._flock():
+            shm = self._attach_live()
+            created = shm is None
+            if created:
+                shm = shared_memory.SharedMemory(name=name, create=True, size=self._size(capacity, n_buckets))
+                _untrack(shm)
+                header = np.ndarray((_SHM_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf, offset=0)
+                header[:] = (0, _SHM_VERSION, capacity, n_buckets, bucket_us, halflife_us, 0, 0)
+                del header
+            self.shm = shm
+            self._map(shm)
+            header = self.header
+            if created:
+                self.stamp.fill(-1)
+                self.min.fill(np.inf)
+                self.max.fill(-np.inf)
+                header[_H_MAGIC] = _SHM_MAGIC
+            elif (header[_H_CAPACITY], header[_H_BUCKETS], header[_H_BUCKET_US]) != (capacity, n_buckets, bucket_us):
+                logger.warning(
+                    "Shared traffic table %r is in use with capacity=%d buckets=%d bucket_s=%.3f; "
+                    "the configured layout applies once all workers restart",
+                    name, header[_H_CAPACITY], header[_H_BUCKETS], header[_H_BUCKET_US] / 1e6,
+                )
+            self._register_pid()
+
+    @staticmethod
+    def _size(capacity: int, n_buckets: int) -> int:
+        return _SHM_HEADER_BYTES + capacity * _SHM_ROW.itemsize + len(_SHM_BUCKET_ARRAYS) * capacity * n_buckets * 8
+
+    @contextmanager
+    def _flock(self):
+        with open(self._lock_path, "a+") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _attach_live(self) -> Optional[shared_memory.SharedMemory]:
+        try:
+            shm = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return None
+        _untrack(shm)
+        live = False
+        if shm.size >= _SHM_HEADER_BYTES:
+            header = np.ndarray((_SHM_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf, offset=0)
+            pids = np.ndarray((_SHM_PID_SLOTS,), dtype=np.int64, buffer=shm.buf, offset=_SHM_HEADER_SLOTS * 8)
+            live = (
+                header[_H_MAGIC] == _SHM_MAGIC
+                and header[_H_VERSION] == _SHM_VERSION
+                and any(pid and _pid_alive(int(pid)) for pid in pids)
+            )
+            del header, pids
+        if live:
+            return shm
+        logger.info("Discarding shared traffic table %r left by a previous run", self.name)
+        _unlink(shm)
+        shm.close()
+        return None
+
+    def _map(self, shm: shared_memory.SharedMemory) -> None:
+        self.header = np.ndarray((_SHM_HEADER_SLOTS,), dtype=np.int64, buffer=shm.buf, offset=0)
+        self.pids = np.ndarray((_SHM_PID_SLOTS,), dtype=np.int64, buffer=shm.buf, offset=_SHM_HEADER_SLOTS * 8)
+        self.capacity = int(self.header[_H_CAPACITY])
+        self.n_buckets = int(self.header[_H_BUCKETS])
+        self.bucket_s = int(self.header[_H_BUCKET_US]) / 1e6
+        self.halflife_s = int(self.header[_H_HALFLIFE_US]) / 1e6
+
+        offset = _SHM_HEADER_BYTES
+        self.rows = np.ndarray((self.capacity,), dtype=_SHM_ROW, buffer=shm.buf, offset=offset)
+        offset += self.rows.nbytes
+        for field, dtype in _SHM_BUCKET_ARRAYS:
+            array = np.ndarray((self.capacity, self.n_buckets), dtype=dtype, buffer=shm.buf, offset=offset)
+            setattr(self, field, array)
+            offset += array.nbytes
+        # Column views, so per-sample field access skips the dtype lookup.
+        self.ids = self.rows["id"]
+        self.addresses = self.rows["address"]
+        self.last = self.rows["last"]
+        self.ewma = self.rows["ewma"]
+        self.last_ts = self.rows["last_ts"]
+        self.has_value = self.rows["has_value"]
+
+    def _register_pid(self) -> None:
+        pid = os.getpid()
+        if (self.pids == pid).any():
+            return
+        for slot, other in enumerate(self.pids):
+            if other == 0 or not _pid_alive(int(other)):
+                self.pids[slot] = pid
+                return
+        logger.warning("Shared traffic table %r has no free pid slot; it may be discarded early", self.name)
+
+    def used(self) -> int:
+        return int(self.header[_H_COUNT])
+
+    def generation(self) -> int:
+        return int(self.header[_H_GENERATION])
+
+    def _find(self, key: bytes, stop: int) -> Optional[int]:
+        hits = np.flatnonzero(self.ids[:stop] == key)
+        return int(hits[0]) if hits.size else None
+
+    def _reset_row(self, index: int, key: bytes) -> None:
+        self.has_value[index] = 0
+        self.last[index] = self.ewma[index] = 0.0
+        # Stamped at allocation so a registered but silent row can age out.
+        self.last_ts[index] = time.time()
+        self.addresses[index] = b""
+        self.stamp[index] = -1
+        self.count[index] = 0
+        self.sum[index] = 0.0
+        self.min[index] = np.inf
+        self.max[index] = -np.inf
+        self.ewma_at[index] = 0.0
+        self.ids[index] = key
+
+    def find_or_add(self, segment_id: str) -> int:
+        key = segment_id.encode("utf-8")
+        if len(key) > _SHM_ROW["id"].itemsize:
+            raise ValueError(f"Segment id too long for the shared traffic table: {segment_id!r}")
+        index = self._find(key, self.used())
+        if index is not None:
+            return index
+        with self._flock():
+            count = self.used()
+            index = self._find(key, count)
+            if index is not None:
+                return index
+            if count < self.capacity:
+                index = count
+                self._reset_row(index, key)
+                self.header[_H_COUNT] = count + 1
+                return index
+            stale = np.flatnonzero(self.last_ts < time.time() - self.max_age)
+            if not stale.size:
+                raise RuntimeError(
+                    f"Shared traffic table {self.name!r} is full ({self.capacity} live segments); "
+                    "raise TRAFFIC_SHM_CAPACITY and restart all workers"
+                )
+            index = int(stale[np.argmin(self.last_ts[stale])])
+            self._reset_row(index, key)
+            self.header[_H_GENERATION] += 1
+            return index
+
+    def set_address(self, index: int, address: str) -> None:
+        self.addresses[index] = address.encode("utf-8")[: _SHM_ROW["address"].itemsize]
+
+    def get_address(self, index: int) -> str:
+        return bytes(self.addresses[index]).decode("utf-8", errors="ignore")
+
+    def close(self) -> bool:
+        """Detach this worker; the last one alive unlinks the block.
+
+        Views handed out (SharedSegmentSeries) must be dropped first.
+        Returns True when the block was unlinked.
+        """
+        with self._flock():
+            self.pids[self.pids == os.getpid()] = 0
+            last = not any(pid and _pid_alive(int(pid)) for pid in self.pids)
+            for view in _SHM_VIEWS:
+                setattr(self, view, None)
+            if last:
+                _unlink(self.shm)
+            try:
+                self.shm.close()
+            except BufferError:
+                # A view is still referenced somewhere; the mapping goes away
+                # with the process.
+                pass
+        return last
+
+    def unlink(self) -> None:
+        _unlink(self.shm)
+
+
+class SharedSegmentSeries(SegmentSpeedSeries):
+    """A SegmentSpeedSeries whose buckets and scalars are one table row."""
+
+    def __init__(self, table: SharedSegmentTable, index: int) -> None:
+        self.table = table
+        self.index = index
+        self.bucket_s = table.bucket_s
+        self.size = table.n_buckets
+        self.halflife_s = table.halflife_s
+        for field, _ in _SHM_BUCKET_ARRAYS:
+            setattr(self, field, getattr(table, field)[index])
+
+    # ``last`` is written after ``ewma`` in add(), so flagging the row there
+    # means readers never see a half-written first sample.
+    @property
+    def last(self) -> Optional[float]:
+        if not self.table.has_value[self.index]:
+            return None
+        return float(self.table.last[self.index])
+
+    @last.setter
+    def last(self, value: float) -> None:
+        self.table.last[self.index] = value
+        self.table.has_value[self.index] = 1
+
+    @property
+    def ewma(self) -> Optional[float]:
+        if not self.table.has_value[self.index]:
+            return None
+        return float(self.table.ewma[self.index])
+
+    @ewma.setter
+    def ewma(self, value: float) -> None:
+        self.table.ewma[self.index] = value
+
+    @property
+    def last_ts(self) -> Optional[float]:
+        if not self.table.has_value[self.index]:
+            return None
+        return float(self.table.last_ts[self.index])
+
+    @last_ts.setter
+    def last_ts(self, value: float) -> None:
+        self.table.last_ts[self.index] = value
+
+
+class SharedMemoryTrafficState(TrafficState):
+    """TrafficState backed by a SharedSegmentTable.
+
+    The stripe locks only cover this process: two workers feeding the same
+    segment at the same instant can interleave a bucket update. Each
+    segment is normally fed by a single camera stream, so in practice one
+    worker owns it.
+    """
+
+    def __init__(self, table: Optional[SharedSegmentTable] = None) -> None:
+        super().__init__()
+        self.table = table or SharedSegmentTable()
+        self.max_age = self.table.max_age
+        self._known = (0, 0)
+
+    def _series_map(self) -> Dict[str, SegmentSpeedSeries]:
+        table = self.table
+        if table is not None and (table.used(), table.generation()) != self._known:
+            self._sync()
+        return self._segment_series
+
+    def _sync(self) -> None:
+        with self._lock:
+            table = self.table
+            known_count, known_generation = self._known
+            count, generation = table.used(), table.generation()
+            if generation != known_generation:
+                # A row was reused: rebuild the index from scratch.
+                series, start = {}, 0
+            else:
+                series, start = dict(self._segment_series), known_count
+            for index in range(start, count):
+                segment_id = bytes(table.ids[index]).decode("utf-8")
+                if segment_id not in series:
+                    series[segment_id] = SharedSegmentSeries(table, index)
+            self._segment_series = series
+            self._known = (count, generation)
+
+    def _new_series(self, segment_id: str) -> SegmentSpeedSeries:
+        if self.table is None:
+            return SegmentSpeedSeries()
+        return SharedSegmentSeries(self.table, self.table.find_or_add(segment_id))
+
+    def _is_fresh(self, series: SegmentSpeedSeries) -> bool:
+        last_ts = series.last_ts
+        return last_ts is not None and time.time() - last_ts <= self.max_age
+
+    def _address(self, segment_id: str) -> str:
+        address = self._segment_to_address.get(segment_id)
+        if address is None:
+            series = self._segment_series.get(segment_id)
+            if isinstance(series, SharedSegmentSeries) and self.table is not None:
+                address = self.table.get_address(series.index)
+        return address or f"Đoạn {segment_id}"
+
+    def register_segment(self, segment_id: str, address: str):
+        super().register_segment(segment_id, address)
+        series = self._get_series(str(segment_id), create=True)
+        if isinstance(series, SharedSegmentSeries) and self.table is not None:
+            self.table.set_address(series.index, address)
+
+    def close(self) -> None:
+        # Later updates (streams still draining at shutdown) stay local.
+        with self._lock:
+            table, self.table = self.table, None
+            self._segment_series = {}
+        if table is not None and table.close():
+            logger.info("Removed shared traffic table %r", table.name)
+
+
+def _default_frame_dir() -> str:
+    if TRAFFIC_SHM_FRAME_DIR:
+        return TRAFFIC_SHM_FRAME_DIR
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, f"{TRAFFIC_SHM_NAME}_frames")
+
+
+class SharedFileTrafficMedia(TrafficMedia):
+    """TrafficMedia that also mirrors each stream's latest JPEG to a file.
+
+    Files are written at most every ``interval`` seconds per stream with an
+    atomic rename, so readers in other workers never see a torn image.
+    Files older than ``max_age`` are skipped and deleted by whichever
+    worker scans them; close() removes this worker's own files.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        interval: float = TRAFFIC_SHM_FRAME_INTERVAL,
+        max_age: float = TRAFFIC_STATE_MAX_AGE_S,
+    ) -> None:
+        super().__init__()
+        self.directory = directory or _default_frame_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self.interval = interval
+        self.max_age = max_age
+        self._written: Dict[str, float] = {}
+        # stream_id -> (mtime_ns, ts, bytes) of frames read from other workers
+        self._remote: Dict[str, Tuple[int, float, bytes]] = {}
+
+    def _path(self, stream_id: str) -> str:
+        return os.path.join(self.directory, quote(stream_id, safe="") + ".jpg")
+
+    def update_frame(self, stream_id: str, jpg_bytes: bytes) -> None:
+        super().update_frame(stream_id, jpg_bytes)
+        stream_id = str(stream_id)
+        now = time.monotonic()
+        if now - self._written.get(stream_id, -math.inf) < self.interval:
+            return
+        self._written[stream_id] = now
+        path = self._path(stream_id)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as fh:
+                fh.write(jpg_bytes)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Cannot write shared frame for %s: %s", stream_id, e)
+
+    def _read(self, stream_id: str, entry: os.DirEntry) -> Optional[Tuple[float, bytes]]:
+        try:
+            st = entry.stat()
+            if time.time() - st.st_mtime > self.max_age:
+                self._remote.pop(stream_id, None)
+                os.remove(entry.path)
+                return None
+            cached = self._remote.get(stream_id)
+            if cached is not None and cached[0] == st.st_mtime_ns:
+                return cached[1], cached[2]
+            with open(entry.path, "rb") as fh:
+                data = fh.read()
+        except OSError:
+            return None
+        self._remote[stream_id] = (st.st_mtime_ns, st.st_mtime, data)
+        return st.st_mtime, data
+
+    def _scan(self):
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.name.endswith(".jpg"):
+                yield unquote(entry.name[:-4]), entry
+
+    def get_frame(self, stream_id: str) -> Optional[Tuple[float, bytes]]:
+        frame = super().get_frame(stream_id)
+        if frame is not None:
+            return frame
+        for sid, entry in self._scan():
+            if sid == str(stream_id):
+                return self._read(sid, entry)
+        return None
+
+    def snapshot(self):
+        result = super().snapshot()
+        for sid, entry in self._scan():
+            if sid in result:
+                continue
+            frame = self._read(sid, entry)
+            if frame is not None:
+                result[sid] = {"ts": frame[0], "image_base64": self._base64(sid, frame[1])}
+        return result
+
+    def close(self) -> None:
+        for stream_id in list(self._written):
+            try:
+                os.remove(self._path(stream_id))
+            except OSError:
+                pass
+        self._written.clear()
+        try:
+            os.rmdir(self.directory)
+        except OSError:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# Redis
+# ---------------------------------------------------------------------------
+
+_redis_clients: Dict[str, Any] = {}
+
+
+def _redis_client():
+    if redis is None:
+        raise RuntimeError("TRAFFIC_STATE_BACKEND=redis requires the redis package")
+    client = _redis_clients.get("default")
+    if client is None:
+        # Short timeouts: everything below runs on background threads, but a
+        # dead server must still fail fast enough for the fallback and for
+        # the history endpoint.
+        client = _redis_clients["default"] = redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            username=os.getenv("REDIS_USERNAME", None),
+            password=os.getenv("REDIS_PASSWORD", None),
+            decode_responses=False,
+            socket_timeout=TRAFFIC_REDIS_TIMEOUT,
+            socket_connect_timeout=TRAFFIC_REDIS_TIMEOUT,
+            retry=Retry(NoBackoff(), 1),
+        )
+    return client
+
+
+def _ttl(seconds: float) -> int:
+    return max(1, int(math.ceil(seconds)))
+
+
+class RedisWriter:
+    """Coalesces writes and flushes them in one pipeline every interval.
+
+    Hash fields are last-write-wins, so a segment updated 30 times between
+    flushes costs one HSET field. Keys given a ttl are re-expired on every
+    flush that touches them, so they vanish once no worker writes them. A
+    failed flush is logged and dropped: the next update carries the current
+    value again.
+    """
+
+    def __init__(self, client, interval_ms: float = TRAFFIC_REDIS_FLUSH_MS) -> None:
+        self.client = client
+        self.interval = max(1.0, interval_ms) / 1000.0
+        self._lock = threading.Lock()
+        self._hashes: Dict[str, Dict[str, Any]] = {}
+        self._deletes: Dict[str, set] = {}
+        self._ttls: Dict[str, int] = {}
+        self.flushes = 0
+        self.commands = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._thread = threading.Thread(target=self._run, name="traffic-redis-writer", daemon=True)
+        self._thread.start()
+
+    def hset(self, key: str, field: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._hashes.setdefault(key, {})[field] = value
+            if ttl is not None:
+                self._ttls[key] = _ttl(ttl)
+
+    def hdel(self, key: str, *fields: str) -> None:
+        with self._lock:
+            self._deletes.setdefault(key, set()).update(fields)
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            hashes, deletes, ttls = self._hashes, self._deletes, self._ttls
+            self._hashes, self._deletes, self._ttls = {}, {}, {}
+        if not hashes and not deletes:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, fields in deletes.items():
+            pipe.hdel(key, *fields)
+        for key, mapping in hashes.items():
+            pipe.hset(key, mapping=mapping)
+        for key, ttl in ttls.items():
+            pipe.expire(key, ttl)
+        try:
+            pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            if str(e) != self.last_error:
+                logger.warning("Traffic state flush to Redis failed: %s", e)
+            self.last_error = str(e)
+            return
+        self.flushes += 1
+        self.commands += len(deletes) + len(hashes) + len(ttls)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "flushes": self.flushes,
+            "commands": self.commands,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
+
+
+_writers: Dict[int, RedisWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_redis_writer(client) -> RedisWriter:
+    with _writers_lock:
+        writer = _writers.get(id(client))
+        if writer is None:
+            writer = _writers[id(client)] = RedisWriter(client)
+        return writer
+
+
+class _RemoteCache:
+    """A value reloaded from Redis by a background thread every ``ttl`` s.
+
+    Readers only ever take the last loaded value, so no request waits on
+    Redis. With ``idle_s`` set, polling pauses once nobody has read for that
+    long and resumes on the next read. With ``max_age`` set, the value falls
+    back to ``empty`` once reloads have failed for that long.
+    """
+
+    def __init__(self, name: str, load: Callable[[Any], Any], ttl: float, empty: Any,
+                 idle_s: Optional[float] = None, max_age: Optional[float] = None) -> None:
+        self.value = empty
+        self._empty = empty
+        self._load = load
+        self.ttl = max(0.05, ttl)
+        self.idle_s = idle_s
+        self.max_age = max_age
+        self.last_error: Optional[str] = None
+        self._loaded_at = time.monotonic()
+        self._read_at = time.monotonic()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def get(self) -> Any:
+        self._read_at = time.monotonic()
+        if not self._wake.is_set():
+            self._wake.set()
+        return self.value
+
+    def refresh(self) -> None:
+        try:
+            self.value = self._load(self.value)
+            self._loaded_at = time.monotonic()
+            self.last_error = None
+        except Exception as e:
+            if str(e) != self.last_error:
+                logger.warning("Traffic state read from Redis failed: %s", e)
+            self.last_error = str(e)
+            if self.max_age is not None and time.monotonic() - self._loaded_at > self.max_age:
+                self.value = self._empty
+
+    def _run(self) -> None:
+        while True:
+            if self.idle_s is not None and time.monotonic() - self._read_at > self.idle_s:
+                self._wake.clear()
+                if time.monotonic() - self._read_at > self.idle_s:
+                    self._wake.wait()
+            self.refresh()
+            time.sleep(self.ttl)
+
+
+def _float_or_none(value: str) -> Optional[float]:
+    return None if value == "None" else float(value)
+
+
+class RedisTrafficState(TrafficState):
+    """TrafficState that publishes to Redis and reads other workers from it.
+
+    Keys under ``TRAFFIC_REDIS_PREFIX``:
+
+    * ``:speed``: hash of ``last,ewma,ts`` per segment; expires with
+      ``max_age`` once no worker writes, and readers drop older fields.
+    * ``:addresses``: hash of segment addresses.
+    * ``:buckets:<segment>``: hash of ``count,sum,min,max,ewma_at`` per
+      bucket number, the same aggregates the owning worker keeps, so a
+      history read elsewhere returns what the owner would.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        prefix: str = TRAFFIC_REDIS_PREFIX,
+        cache_ttl: float = TRAFFIC_REDIS_CACHE_TTL,
+        max_age: float = TRAFFIC_STATE_MAX_AGE_S,
+    ) -> None:
+        super().__init__()
+        self.client = client if client is not None else _redis_client()
+        # Fail here, so create_traffic_state() can fall back to local.
+        self.client.ping()
+        self.writer = get_redis_writer(self.client)
+        self.prefix = prefix
+        self.max_age = max_age
+        self._remote = _RemoteCache("traffic-redis-state", self._load_remote, cache_ttl, ({}, {}),
+                                   max_age=max_age)
+        self._remote.refresh()
+
+    def _load_remote(self, previous):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(f"{self.prefix}:speed")
+        pipe.hgetall(f"{self.prefix}:addresses")
+        speeds, addresses = pipe.execute()
+        oldest = time.time() - self.max_age
+        parsed: Dict[str, Tuple[float, Optional[float], float]] = {}
+        stale: List[str] = []
+        for key, value in speeds.items():
+            try:
+                last, ewma, ts = value.decode().split(",")
+                record = (float(last), _float_or_none(ewma), float(ts))
+            except ValueError:
+                continue
+            if record[2] < oldest:
+                stale.append(key.decode())
+            else:
+                parsed[key.decode()] = record
+        if stale:
+            self.writer.hdel(f"{self.prefix}:speed", *stale)
+        return parsed, {k.decode(): v.decode() for k, v in addresses.items()}
+
+    def _address(self, segment_id: str) -> str:
+        address = self._segment_to_address.get(segment_id)
+        if address is None:
+            address = self._remote.value[1].get(segment_id)
+        return address or f"Đoạn {segment_id}"
+
+    def register_segment(self, segment_id: str, address: str):
+        super().register_segment(segment_id, address)
+        self.writer.hset(f"{self.prefix}:addresses", str(segment_id), address)
+
+    def update_segment_speed(self, segment_id: str, speed_kmh: float, ts: Optional[float] = None):
+        if speed_kmh <= 0:
+            return
+        segment_id = str(segment_id)
+        ts = time.time() if ts is None else float(ts)
+        series = self._get_series(segment_id, create=True)
+        bucket = int(ts // series.bucket_s)
+        slot = bucket % series.size
+        with self._stripe(segment_id):
+            evicted = int(series.stamp[slot])
+            series.add(speed_kmh, ts)
+            latest = f"{series.last!r},{series.ewma!r},{series.last_ts!r}"
+            aggregate = None
+            if series.stamp[slot] == bucket:
+                aggregate = (
+                    f"{int(series.count[slot])},{float(series.sum[slot])!r},{float(series.min[slot])!r},"
+                    f"{float(series.max[slot])!r},{float(series.ewma_at[slot])!r}"
+                )
+        self.writer.hset(f"{self.prefix}:speed", segment_id, latest, ttl=self.max_age)
+        if aggregate is not None:
+            key = f"{self.prefix}:buckets:{segment_id}"
+            if evicted >= 0 and evicted != bucket:
+                # The bucket this slot held just left the ring.
+                self.writer.hdel(key, str(evicted))
+            self.writer.hset(key, str(bucket), aggregate, ttl=series.size * series.bucket_s)
+
+    def get_segment_speed(self, segment_id: str, default_speed_kmh: float, smoothed: bool = False) -> float:
+        segment_id = str(segment_id)
+        if segment_id in self._segment_series:
+            return super().get_segment_speed(segment_id, default_speed_kmh, smoothed)
+        remote = self._remote.get()[0].get(segment_id)
+        if remote is None or remote[2] < time.time() - self.max_age:
+            return float(default_speed_kmh)
+        last, ewma, _ = remote
+        value = ewma if smoothed and ewma is not None else last
+        return float(value)
+
+    def get_segment_history(self, segment_id: str, minutes: float = 5.0, percentiles=(50, 90)) -> Optional[Dict[str, Any]]:
+        """As TrafficState; segments owned by another worker are read from
+        their published buckets (one HGETALL, blocking: call it from a
+        thread)."""
+        segment_id = str(segment_id)
+        if segment_id in self._segment_series:
+            return super().get_segment_history(segment_id, minutes, percentiles)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            pipe.hgetall(f"{self.prefix}:buckets:{segment_id}")
+            pipe.hget(f"{self.prefix}:speed", segment_id)
+            buckets, latest = pipe.execute()
+        except Exception as e:
+            logger.warning("Cannot read speed history of %s from Redis: %s", segment_id, e)
+            return None
+        if not buckets:
+            return None
+        series = SegmentSpeedSeries()
+        for field, value in buckets.items():
+            try:
+                bucket = int(field)
+                count, total, lo, hi, ewma_at = value.decode().split(",")
+            except ValueError:
+                continue
+            slot = bucket % series.size
+            if bucket <= series.stamp[slot]:
+                continue
+            series.stamp[slot] = bucket
+            series.count[slot] = int(count)
+            series.sum[slot] = float(total)
+            series.min[slot] = float(lo)
+            series.max[slot] = float(hi)
+            series.ewma_at[slot] = float(ewma_at)
+        if latest is not None:
+            last, ewma, ts = latest.decode().split(",")
+            series.last, series.ewma, series.last_ts = float(last), _float_or_none(ewma), float(ts)
+        return history_summary(series, minutes, percentiles)
+
+    def snapshot(self) -> Dict[str, float]:
+        oldest = time.time() - self.max_age
+        result = {seg_id: last for seg_id, (last, _, ts) in self._remote.get()[0].items() if ts >= oldest}
+        result.update(super().snapshot())
+        return result
+
+    def snapshot_with_addresses(self, smoothed: bool = False) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        oldest = time.time() - self.max_age
+        for seg_id, (last, ewma, ts) in self._remote.get()[0].items():
+            if ts < oldest:
+                continue
+            result[seg_id] = {
+                "speed": ewma if smoothed and ewma is not None else last,
+                "speed_latest": last,
+                "speed_smoothed": ewma,
+                "address": self._address(seg_id)
+            }
+        result.update(super().snapshot_with_addresses(smoothed))
+        return result
+
+    def close(self) -> None:
+        self.writer.flush()
+
+
+class RedisTrafficMedia(TrafficMedia):
+    """TrafficMedia that mirrors each stream's latest JPEG to a Redis hash.
+
+    Frames are published at most every ``interval`` seconds per stream. A
+    background refresh fetches only the frames whose timestamp changed, and
+    pauses while nobody asks for frames.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        prefix: str = TRAFFIC_REDIS_PREFIX,
+        interval: float = TRAFFIC_REDIS_FRAME_INTERVAL,
+        max_age: float = TRAFFIC_STATE_MAX_AGE_S,
+    ) -> None:
+        super().__init__()
+        self.client = client if client is not None else _redis_client()
+        self.client.ping()
+        self.writer = get_redis_writer(self.client)
+        self.prefix = prefix
+        self.interval = interval
+        self.max_age = max_age
+        self._written: Dict[str, float] = {}
+        self._remote = _RemoteCache("traffic-redis-frames", self._load_remote, interval, {}, idle_s=30.0,
+                                   max_age=max_age)
+
+    def update_frame(self, stream_id: str, jpg_bytes: bytes) -> None:
+        super().update_frame(stream_id, jpg_bytes)
+        stream_id = str(stream_id)
+        now = time.monotonic()
+        if now - self._written.get(stream_id, -math.inf) < self.interval:
+            return
+        self._written[stream_id] = now
+        self.writer.hset(f"{self.prefix}:frames", stream_id, jpg_bytes, ttl=self.max_age)
+        self.writer.hset(f"{self.prefix}:frame_ts", stream_id, repr(time.time()), ttl=self.max_age)
+
+    def _load_remote(self, previous: Dict[str, Tuple[float, bytes]]) -> Dict[str, Tuple[float, bytes]]:
+        oldest = time.time() - self.max_age
+        stamps: Dict[str, float] = {}
+        stale: List[str] = []
+        for key, value in self.client.hgetall(f"{self.prefix}:frame_ts").items():
+            ts = float(value)
+            if ts < oldest:
+                stale.append(key.decode())
+            else:
+                stamps[key.decode()] = ts
+        if stale:
+            self.writer.hdel(f"{self.prefix}:frame_ts", *stale)
+            self.writer.hdel(f"{self.prefix}:frames", *stale)
+        frames = {sid: frame for sid, frame in previous.items() if sid in stamps and frame[0] == stamps[sid]}
+        changed = [sid for sid in stamps if sid not in frames]
+        if changed:
+            for sid, data in zip(changed, self.client.hmget(f"{self.prefix}:frames", changed)):
+                if data is not None:
+                    frames[sid] = (stamps[sid], data)
+        return frames
+
+    def get_frame(self, stream_id: str) -> Optional[Tuple[float, bytes]]:
+        frame = super().get_frame(stream_id)
+        if frame is not None:
+            return frame
+        frame = self._remote.get().get(str(stream_id))
+        if frame is None or frame[0] < time.time() - self.max_age:
+            return None
+        return frame
+
+    def snapshot(self):
+        result = super().snapshot()
+        oldest = time.time() - self.max_age
+        for sid, (ts, data) in self._remote.get().items():
+            if sid not in result and ts >= oldest:
+                result[sid] = {"ts": ts, "image_base64": self._base64(sid, data)}
+        return result
+
+    def close(self) -> None:
+        self.writer.flush()
+
+
+# ---------------------------------------------------------------------------
+# Factories
+# ---------------------------------------------------------------------------
+
+_backends: List[Any] = []
+
+
+def create_traffic_state(backend: str = TRAFFIC_STATE_BACKEND) -> TrafficState:
+    try:
+        if backend == "shm":
+            state = SharedMemoryTrafficState()
+        elif backend == "redis":
+            state = RedisTrafficState()
+        else:
+            if backend != "local":
+                logger.warning("Unknown TRAFFIC_STATE_BACKEND %r, using local", backend)
+            return TrafficState()
+    except Exception as e:
+        logger.error("Traffic state backend %r unavailable, falling back to local: %s", backend, e)
+        return TrafficState()
+    _backends.append(state)
+    return state
+
+
+def create_traffic_media(backend: str = TRAFFIC_STATE_BACKEND) -> TrafficMedia:
+    try:
+        if backend == "shm":
+            media = SharedFileTrafficMedia()
+        elif backend == "redis":
+            media = RedisTrafficMedia()
+        else:
+            return TrafficMedia()
+    except Exception as e:
+        logger.error("Traffic media backend %r unavailable, falling back to local: %s", backend, e)
+        return TrafficMedia()
+    _backends.append(media)
+    return media
+
+
+def close_traffic_backends() -> None:
+    """Detach from shared state on shutdown (see SharedSegmentTable.close)."""
+    while _backends:
+        backend = _backends.pop()
+        try:
+            backend.close()
+        except Exception:
+            logger.exception("Closing traffic backend %s failed", type(backend).__name__)
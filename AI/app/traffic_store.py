@@ -0,0 +1,189 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+import base64
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.segment_speed import SegmentSpeedSeries
+
+# Concurrency model shared by both stores: the websocket coroutines write,
+# sync FastAPI handlers in the threadpool and the routing tool read.
+#
+# * Each key maps to a mutable cell (a SegmentSpeedSeries, a _FrameSlot)
+#   that lives as long as the store. Writers update the cell in place;
+#   adding a key copies the dict under the writer lock and swaps the
+#   reference. Since copies share the cells, no update can be lost to a
+#   concurrent swap, and a published dict is never resized: readers take
+#   the current reference and iterate it without any lock, so they never
+#   block writers.
+# * Multi-field cell updates (the series buckets) run under one of a few
+#   striped locks, so writers of different segments do not contend.
+
+_STRIPES = 16
+
+
+def history_summary(series: SegmentSpeedSeries, minutes: float, percentiles=(50, 90)) -> Optional[Dict[str, Any]]:
+    seconds = minutes * 60.0
+    now = time.time()
+    window = series.window(seconds, now)
+    if window is None:
+        return None
+    return {
+        **window,
+        **series.percentiles(seconds, percentiles, now),
+        "ewma": series.ewma,
+        "bucket_s": series.bucket_s,
+        "buckets": series.buckets(seconds, now),
+    }
+
+
+class _FrameSlot:
+    __slots__ = ("value",)
+
+    def __init__(self, value: Tuple[float, bytes]) -> None:
+        self.value = value
+
+
+class TrafficState:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(_STRIPES)]
+        self._segment_to_address: Dict[str, str] = {}
+        # Latest value and time-bucketed history per segment; see app.segment_speed.
+        self._segment_series: Dict[str, SegmentSpeedSeries] = {}
+
+    def _stripe(self, segment_id: str) -> threading.Lock:
+        return self._stripes[hash(segment_id) % _STRIPES]
+
+    # Backends in app.traffic_backends override these hooks to keep the
+    # series somewhere other processes can see them.
+    def _series_map(self) -> Dict[str, SegmentSpeedSeries]:
+        return self._segment_series
+
+    def _new_series(self, segment_id: str) -> SegmentSpeedSeries:
+        return SegmentSpeedSeries()
+
+    def _get_series(self, segment_id: str, create: bool = False) -> Optional[SegmentSpeedSeries]:
+        series = self._series_map().get(segment_id)
+        if series is None and create:
+            with self._lock:
+                series = self._segment_series.get(segment_id)
+                if series is None:
+                    series = self._new_series(segment_id)
+                    self._segment_series = {**self._segment_series, segment_id: series}
+        return series
+
+    def _is_fresh(self, series: SegmentSpeedSeries) -> bool:
+        return True
+
+    def _address(self, segment_id: str) -> str:
+        return self._segment_to_address.get(segment_id, f"Đoạn {segment_id}")
+
+    def register_segment(self, segment_id: str, address: str):
+        with self._lock:
+            self._segment_to_address = {**self._segment_to_address, str(segment_id): address}
+        print(f"[TrafficState] Registered: segment_id={segment_id} -> address={address}")
+
+    def update_segment_speed(self, segment_id: str, speed_kmh: float, ts: Optional[float] = None):
+        if speed_kmh <= 0:
+            return
+        segment_id = str(segment_id)
+        series = self._get_series(segment_id, create=True)
+        with self._stripe(segment_id):
+            series.add(speed_kmh, ts)
+
+    def get_segment_speed(self, segment_id: str, default_speed_kmh: float, smoothed: bool = False) -> float:
+        series = self._get_series(str(segment_id))
+        if series is None or not self._is_fresh(series):
+            return float(default_speed_kmh)
+        value = series.ewma if smoothed else series.last
+        return float(value if value is not None else default_speed_kmh)
+
+    def get_segment_history(self, segment_id: str, minutes: float = 5.0, percentiles=(50, 90)) -> Optional[Dict[str, Any]]:
+        """Speed over the last ``minutes``: aggregate, percentiles and buckets."""
+        segment_id = str(segment_id)
+        series = self._get_series(segment_id)
+        if series is None or not self._is_fresh(series):
+            return None
+        # Copy under the stripe (a few KiB) and aggregate outside it.
+        with self._stripe(segment_id):
+            series = series.copy()
+        return history_summary(series, minutes, percentiles)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            seg_id: series.last for seg_id, series in self._series_map().items()
+            if series.last is not None and self._is_fresh(series)
+        }
+
+    def snapshot_with_addresses(self, smoothed: bool = False) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for seg_id, series in self._series_map().items():
+            speed, ewma = series.last, series.ewma
+            if speed is None or not self._is_fresh(series):
+                continue
+            result[seg_id] = {
+                "speed": ewma if smoothed and ewma is not None else speed,
+                "speed_latest": speed,
+                "speed_smoothed": ewma,
+                "address": self._address(seg_id)
+            }
+        return result
+
+
+class TrafficMedia:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # stream_id -> slot holding (timestamp, jpg_bytes)
+        self._frames: Dict[str, _FrameSlot] = {}
+        # stream_id -> (jpg_bytes, base64 text); reused while the frame is unchanged
+        self._b64: Dict[str, Tuple[bytes, str]] = {}
+
+    def update_frame(self, stream_id: str, jpg_bytes: bytes) -> None:
+        stream_id = str(stream_id)
+        slot = self._frames.get(stream_id)
+        if slot is not None:
+            slot.value = (time.time(), jpg_bytes)
+            return
+        with self._lock:
+            slot = self._frames.get(stream_id)
+            if slot is not None:
+                slot.value = (time.time(), jpg_bytes)
+            else:
+                self._frames = {**self._frames, stream_id: _FrameSlot((time.time(), jpg_bytes))}
+
+    def get_frame(self, stream_id: str) -> Optional[Tuple[float, bytes]]:
+        slot = self._frames.get(str(stream_id))
+        return slot.value if slot is not None else None
+
+    def _base64(self, stream_id: str, data: bytes) -> str:
+        cached = self._b64.get(stream_id)
+        if cached is not None and cached[0] is data:
+            return cached[1]
+        b64 = base64.b64encode(data).decode("ascii")
+        self._b64[stream_id] = (data, b64)
+        return b64
+
+    def snapshot(self):
+        result: Dict[str, Dict[str, str]] = {}
+        for sid, slot in self._frames.items():
+            ts, data = slot.value
+            result[sid] = {
+                "ts": ts,
+                "image_base64": self._base64(sid, data),
+            }
+        return result
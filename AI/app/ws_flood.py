@@ -15,24 +15,32 @@
 # -----------------------------------------------------------------------------
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 import asyncio
-import base64
 import json
 import time
-import struct
-import numpy as np
-import cv2
 import traceback
 
 from service.flood_stream_service import FloodStreamService
+from app.envelope import FrameEnvelope, dumps_text
+from app.fanout import FanoutHub
+from app.frame_encoding import make_frame_decoder
+from app.stream_pipeline import (
+    STREAM_INGEST_MODE,
+    FrameIngest,
+    StageTimings,
+    finish_frame,
+    run_stage,
+    stop_worker,
+)
+from components.codec.jpeg_codec import JpegCodec
 
 router = APIRouter()
 
 _services_by_stream = {}
-_frontend_clients_by_stream = {}
-_global_frontend_clients = set()
+_frontend_hub = FanoutHub("flood")
+_timings_by_stream = {}
+_ingest_by_stream = {}
 
 _services_lock = asyncio.Lock()
-_clients_lock = asyncio.Lock()
 
 
 async def get_or_create_flood_service(stream_id: str) -> FloodStreamService:
@@ -44,17 +52,21 @@ async def get_or_create_flood_service(stream_id: str) -> FloodStreamService:
         return svc
 
 
-def _safe_discard(ws_set, ws):
+def _decode_frame(decode, payload: bytes):
     try:
-        ws_set.discard(ws)
-    except Exception:
-        pass
+        frame, _ = decode(payload)
+        return frame
+
+    except Exception as e:
+        print(f"Failed to decode frame: {e}")
+        return None
 
 
 @router.websocket("/ws/flood/frontend")
 async def flood_frontend_ws(websocket: WebSocket):
     await websocket.accept()
     stream_id = None
+    max_fps = max_width = envelope = None
 
     try:
         try:
@@ -62,33 +74,24 @@ async def flood_frontend_ws(websocket: WebSocket):
             j = json.loads(raw)
             if j.get("action") == "subscribe":
                 stream_id = j.get("stream_id")
+                max_fps, max_width = j.get("max_fps"), j.get("max_width")
+                envelope = j.get("envelope")
         except:
             stream_id = None
 
-        async with _clients_lock:
-            if stream_id:
-                _frontend_clients_by_stream.setdefault(stream_id, set()).add(websocket)
-            else:
-                _global_frontend_clients.add(websocket)
+        # Optional "max_fps" / "max_width" pick a lighter rendition of the stream,
+        # "envelope": "binary" the fixed-header framing from app.envelope.
+        _frontend_hub.subscribe(websocket, stream_id, max_fps, max_width, envelope)
 
         while True:
             msg = await websocket.receive_text()
             try:
                 j = json.loads(msg)
                 if j.get("action") == "subscribe":
-                    new_stream = j.get("stream_id")
-
-                    async with _clients_lock:
-                        if stream_id and websocket in _frontend_clients_by_stream.get(stream_id, set()):
-                            _frontend_clients_by_stream[stream_id].discard(websocket)
-                        if websocket in _global_frontend_clients:
-                            _global_frontend_clients.discard(websocket)
-
-                        stream_id = new_stream
-                        if stream_id:
-                            _frontend_clients_by_stream.setdefault(stream_id, set()).add(websocket)
-                        else:
-                            _global_frontend_clients.add(websocket)
+                    stream_id = j.get("stream_id")
+                    _frontend_hub.subscribe(
+                        websocket, stream_id, j.get("max_fps"), j.get("max_width"), j.get("envelope")
+                    )
 
             except:
                 await asyncio.sleep(0.1)
@@ -97,11 +100,7 @@ async def flood_frontend_ws(websocket: WebSocket):
         pass
 
     finally:
-        async with _clients_lock:
-            if stream_id:
-                _safe_discard(_frontend_clients_by_stream.get(stream_id, set()), websocket)
-            else:
-                _safe_discard(_global_frontend_clients, websocket)
+        _frontend_hub.unsubscribe(websocket)
 
 
 @router.websocket("/ws/process/flood")
@@ -130,95 +129,104 @@ async def flood_process_ws(websocket: WebSocket):
             await websocket.close(code=1011)
             return
 
-        async with _clients_lock:
-            _frontend_clients_by_stream.setdefault(stream_id, set())
-
         print(f"Flood stream '{stream_id}' initialized and ready")
 
-        while True:
-            msg = await websocket.receive()
-            msg_type = msg.get("type")
+        timings = StageTimings()
+        ingest = FrameIngest(cfg.get("ingest_mode") or STREAM_INGEST_MODE)
+        _timings_by_stream[stream_id] = timings
+        _ingest_by_stream[stream_id] = ingest
+        codec = JpegCodec.from_stream_config(cfg)
+        frame_envelope = FrameEnvelope(stream_id)
+        try:
+            decode_payload = make_frame_decoder(
+                cfg.get("frame_encoding"), codec, 1, cfg.get("frame_width"), cfg.get("frame_height")
+            )
+        except ValueError as e:
+            print(f"Rejecting flood stream '{stream_id}': {e}")
+            await websocket.close(code=1003)
+            return
 
-            if msg_type == "websocket.disconnect":
-                raise WebSocketDisconnect()
+        async def _handle_frame(payload: bytes):
+            with timings.measure("decode"):
+                frame = await run_stage(_decode_frame, decode_payload, payload)
 
-            if msg_type == "websocket.receive":
+            if frame is None:
+                return
 
-                if "bytes" in msg:
-                    payload = msg["bytes"]
+            try:
+                with timings.measure("infer"):
+                    annotated_frame, metrics = await run_stage(svc.process_frame, frame)
+            except Exception as e:
+                print(f"Failed to process frame: {e}")
+                return
 
-                    try:
-                        try:
-                            b64text = payload.decode("utf-8")
-                            jpg_bytes = base64.b64decode(b64text)
-                        except Exception:
-                            jpg_bytes = payload
-
-                        arr = np.frombuffer(jpg_bytes, dtype=np.uint8)
-                        frame = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-
-                    except Exception as e:
-                        print(f"Failed to decode frame: {e}")
-                        frame = None
-
-                    if frame is None:
-                        continue
-
-                    try:
-                        annotated_frame, metrics = svc.process_frame(frame)
-                    except Exception as e:
-                        print(f"Failed to process frame: {e}")
-                        continue
-
-                    ok, encoded = cv2.imencode(".jpg", annotated_frame)
-                    if not ok:
-                        continue
-
-                    jpg_out = encoded.tobytes()
-
-                    try:
-                        await websocket.send_text(json.dumps({
-                            "type": "ack",
-                            "metrics": {
-                                "stream_id": stream_id,
-                                "ts": int(time.time() * 1000),
-                                "metrics": metrics
-                            }
-                        }))
-                    except Exception as e:
-                        print(f"Failed to send ack: {e}")
-
-                    meta = {
-                        "type": "frame",
+            with timings.measure("encode"):
+                jpg_out = await run_stage(codec.encode, annotated_frame)
+            if jpg_out is None:
+                return
+
+            try:
+                await websocket.send_text(dumps_text({
+                    "type": "ack",
+                    "metrics": {
                         "stream_id": stream_id,
                         "ts": int(time.time() * 1000),
                         "metrics": metrics
-                    }
-                    meta_bytes = json.dumps(meta).encode("utf-8")
-                    header = struct.pack(">I", len(meta_bytes))
-                    combined_payload = header + meta_bytes + jpg_out
-
-                    async with _clients_lock:
-                        recipients = (
-                            list(_frontend_clients_by_stream.get(stream_id, set())) +
-                            list(_global_frontend_clients)
-                        )
-
-                    for client in recipients:
+                    },
+                    "flow": ingest.flow_signal(timings),
+                }))
+            except Exception as e:
+                print(f"Failed to send ack: {e}")
+
+            with timings.measure("fanout"):
+                ts_ms = int(time.time() * 1000)
+                tiers = {None: jpg_out}
+
+                async def _render(width, envelope):
+                    if width not in tiers:
+                        tiers[width] = await run_stage(codec.encode_scaled, annotated_frame, width)
+                    if not tiers[width]:
+                        return None
+                    return frame_envelope.pack(envelope, ts_ms, metrics, tiers[width])
+
+                await _frontend_hub.publish(stream_id, _render, annotated_frame.shape[1])
+
+            timings.frame_done()
+
+        async def _frame_worker():
+            while True:
+                payload = await ingest.get()
+                try:
+                    await finish_frame(_handle_frame(payload))
+                except Exception as e:
+                    print(f"Error handling flood frame: {e}")
+                    traceback.print_exc()
+
+        worker = asyncio.create_task(_frame_worker())
+
+        try:
+            while True:
+                msg = await websocket.receive()
+                msg_type = msg.get("type")
+
+                if msg_type == "websocket.disconnect":
+                    raise WebSocketDisconnect()
+
+                if msg_type == "websocket.receive":
+
+                    if "bytes" in msg:
+                        await ingest.put(msg["bytes"])
+
+                    elif "text" in msg:
                         try:
-                            await client.send_bytes(combined_payload)
-                        except Exception:
-                            _safe_discard(_frontend_clients_by_stream.get(stream_id, set()), client)
-                            _safe_discard(_global_frontend_clients, client)
-
-                elif "text" in msg:
-                    try:
-                        cmd = json.loads(msg["text"])
-                        if cmd.get("action") == "stop":
-                            print(f"Stop command received for '{stream_id}'")
-                            break
-                    except:
-                        pass
+                            cmd = json.loads(msg["text"])
+                            if cmd.get("action") == "stop":
+                                print(f"Stop command received for '{stream_id}'")
+                                break
+                        except:
+                            pass
+        finally:
+            await stop_worker(worker)
 
     except WebSocketDisconnect:
         print(f"Client disconnected from flood stream '{stream_id}'")
@@ -227,9 +235,8 @@ async def flood_process_ws(websocket: WebSocket):
         traceback.print_exc()
 
     finally:
-        async with _clients_lock:
-            _safe_discard(_frontend_clients_by_stream.get(stream_id, set()), websocket)
-
+        _timings_by_stream.pop(stream_id, None)
+        _ingest_by_stream.pop(stream_id, None)
         print(f"Flood stream '{stream_id}' connection closed")
 
 
@@ -238,3 +245,17 @@ async def list_active_flood_streams():
     async with _services_lock:
         keys = list(_services_by_stream.keys())
     return {"streams": keys}
+
+
+@router.get("/ws/flood/stream_stats")
+async def flood_stream_stats():
+    result = {}
+    for sid, t in list(_timings_by_stream.items()):
+        ingest = _ingest_by_stream.get(sid)
+        result[sid] = {**t.snapshot(), "ingest": ingest.stats() if ingest else None}
+    return result
+
+
+@router.get("/ws/flood/fanout_stats")
+async def flood_fanout_stats():
+    return _frontend_hub.stats()
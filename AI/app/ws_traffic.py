@@ -15,19 +15,32 @@
 # -----------------------------------------------------------------------------
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 import asyncio
-import base64
 import json
+import math
 import traceback
-from typing import Dict, Set, Optional, Any
+from typing import Dict, Set, Optional, Any, Tuple
 import numpy as np
-import cv2
 import time
 
 from service.vehicle_speed_stream_service import VehicleSpeedStreamService
 from components.logging import logger
-from app.utils import publish_to_orion_ld
+from app.utils import submit_to_orion_ld
 from app.utils import traffic_state
 from app.utils import traffic_media
+from app.envelope import FrameEnvelope, dumps_text
+from app.fanout import FanoutHub
+from app.frame_encoding import RAW_ENCODINGS, FrameDecoder, make_frame_decoder, split_capture_ts
+from app.stream_pipeline import (
+    STREAM_INGEST_MODE,
+    FrameIngest,
+    StageTimings,
+    finish_frame,
+    run_stage,
+    stop_worker,
+)
+from components.codec.jpeg_codec import JpegCodec, parse_decode_scale
+from components.tools.traffic_monitor.inference_server import list_inference_servers
+from service.orion_publisher import ORION_FLUSH_INTERVAL, list_orion_publishers
 
 logger = logger.setup_logger("ws_traffic")
 
@@ -35,9 +48,10 @@ router = APIRouter()
 
 _services_by_stream: Dict[str, VehicleSpeedStreamService] = {}
 _process_clients_by_stream: Dict[str, Set[WebSocket]] = {}
-_frontend_clients_by_stream: Dict[str, Set[WebSocket]] = {}
-_global_frontend_clients: Set[WebSocket] = set()
+_frontend_hub = FanoutHub("traffic")
 _segments_by_stream: Dict[str, list] = {}
+_timings_by_stream: Dict[str, StageTimings] = {}
+_ingest_by_stream: Dict[str, FrameIngest] = {}
 
 _services_lock = asyncio.Lock()
 _clients_lock = asyncio.Lock()
@@ -62,6 +76,42 @@ def _safe_discard(ws_set: Set[WebSocket], ws: WebSocket):
         pass
 
 
+_default_codec = JpegCodec()
+
+
+def _decode_frame(decode: FrameDecoder, payload: bytes) -> Tuple[Optional[np.ndarray], Optional[bytes]]:
+    try:
+        return decode(payload)
+    except Exception:
+        return None, None
+
+
+def _decode_stamped(
+    decode: FrameDecoder, payload: bytes
+) -> Tuple[Optional[float], Optional[np.ndarray], Optional[bytes]]:
+    captured_at, payload = split_capture_ts(payload)
+    if captured_at is None:
+        # Mixing producer and server clocks would wreck the speed estimate.
+        return None, None, None
+    return (captured_at,) + _decode_frame(decode, payload)
+
+
+def _metrics_interval(value: Any, default: float = 5.0) -> float:
+    # Client-supplied; publishing faster than the Orion publisher flushes only
+    # overwrites the pending entity, so that is the floor.
+    try:
+        interval = float(value) if value is not None else default
+    except (TypeError, ValueError):
+        interval = default
+    if not math.isfinite(interval):
+        interval = default
+    return max(ORION_FLUSH_INTERVAL, interval)
+
+
+def _encode_frame(frame: np.ndarray, codec: Optional[JpegCodec] = None) -> Optional[bytes]:
+    return (codec or _default_codec).encode(frame)
+
+
 
 
 
@@ -70,48 +120,38 @@ def _safe_discard(ws_set: Set[WebSocket], ws: WebSocket):
 async def frontend_ws(websocket: WebSocket):
     await websocket.accept()
     stream_id: Optional[str] = None
+    max_fps = max_width = envelope = None
     try:
         try:
             raw = await asyncio.wait_for(websocket.receive_text(), timeout=5.0)
             j = json.loads(raw)
             if j.get("action") == "subscribe":
                 stream_id = j.get("stream_id")
+                max_fps, max_width = j.get("max_fps"), j.get("max_width")
+                envelope = j.get("envelope")
         except:
             stream_id = None
 
-        async with _clients_lock:
-            if stream_id:
-                _frontend_clients_by_stream.setdefault(stream_id, set()).add(websocket)
-            else:
-                _global_frontend_clients.add(websocket)
+        # Optional "max_fps" / "max_width" pick a lighter rendition of the stream,
+        # "envelope": "binary" the fixed-header framing from app.envelope.
+        _frontend_hub.subscribe(websocket, stream_id, max_fps, max_width, envelope)
 
         while True:
             msg = await websocket.receive_text()
             try:
                 j = json.loads(msg)
                 if j.get("action") == "subscribe":
-                    new_stream = j.get("stream_id")
-                    async with _clients_lock:
-                        if stream_id and websocket in _frontend_clients_by_stream.get(stream_id, set()):
-                            _frontend_clients_by_stream[stream_id].discard(websocket)
-                        if websocket in _global_frontend_clients:
-                            _global_frontend_clients.discard(websocket)
-                        stream_id = new_stream
-                        if stream_id:
-                            _frontend_clients_by_stream.setdefault(stream_id, set()).add(websocket)
-                        else:
-                            _global_frontend_clients.add(websocket)
+                    stream_id = j.get("stream_id")
+                    _frontend_hub.subscribe(
+                        websocket, stream_id, j.get("max_fps"), j.get("max_width"), j.get("envelope")
+                    )
             except:
                 await asyncio.sleep(0.1)
 
     except WebSocketDisconnect:
         pass
     finally:
-        async with _clients_lock:
-            if stream_id:
-                _safe_discard(_frontend_clients_by_stream.get(stream_id, set()), websocket)
-            else:
-                _safe_discard(_global_frontend_clients, websocket)
+        _frontend_hub.unsubscribe(websocket)
 
 
 @router.websocket("/ws/process")
@@ -155,6 +195,11 @@ async def process_ws(websocket: WebSocket):
                 tracker_cfg=cfg.get("tracker_cfg"),
                 yolo_weights=cfg.get("yolo_weights"),
                 fps=cfg.get("fps", 30),
+                batch_inference=cfg.get("batch_inference"),
+                speed_smoothing=cfg.get("speed_smoothing"),
+                ort_profile=cfg.get("ort_profile"),
+                detection_stride=cfg.get("detection_stride"),
+                roi_crop=cfg.get("roi_crop"),
             )
         except:
             traceback.logger.info_exc()
@@ -164,126 +209,170 @@ async def process_ws(websocket: WebSocket):
         async with _clients_lock:
             _process_clients_by_stream.setdefault(stream_id, set()).add(websocket)
 
-        metrics_interval = 5.0
+        metrics_interval = _metrics_interval(cfg.get("metrics_interval"))
         last_metrics_time = 0.0
         last_metrics_data: Optional[Dict[str, Any]] = None
 
-        async def _send_bytes_to_client(client: WebSocket, data: bytes):
+        codec = JpegCodec.from_stream_config(cfg)
+        frame_envelope = FrameEnvelope(stream_id)
+        # Inference frames may be decoded at 1/2, 1/4 or 1/8 size; the tool
+        # maps detections back to the calibrated resolution.
+        frame_encoding = cfg.get("frame_encoding")
+        decode_scale = parse_decode_scale(cfg.get("decode_scale"))
+        if frame_encoding in RAW_ENCODINGS:
+            decode_scale = 1
+        frame_scale = 1.0 / decode_scale
+        frame_timestamps = bool(cfg.get("frame_timestamps"))
+        try:
+            decode_payload = make_frame_decoder(
+                frame_encoding, codec, decode_scale, cfg.get("frame_width"), cfg.get("frame_height")
+            )
+        except ValueError as e:
+            logger.info(f"Rejecting stream {stream_id}: {e}")
+            await websocket.close(code=1003)
+            return
+        logger.info(
+            f"JPEG codec for {stream_id}: {codec.describe()}, decode_scale=1/{decode_scale}, "
+            f"frame_encoding={frame_encoding or 'auto'}, frame_timestamps={frame_timestamps}"
+        )
+
+        timings = StageTimings()
+        _timings_by_stream[stream_id] = timings
+        ingest = FrameIngest(cfg.get("ingest_mode") or STREAM_INGEST_MODE)
+        _ingest_by_stream[stream_id] = ingest
+
+        async def _handle_frame(item: Tuple[float, bytes]):
+            nonlocal last_metrics_time, last_metrics_data
+            # Without producer timestamps, arrival time stands in for capture
+            # time; either stays correct when frames are dropped.
+            arrived_at, payload = item
+
+            with timings.measure("decode"):
+                if frame_timestamps:
+                    captured_at, frame, jpg_in = await run_stage(_decode_stamped, decode_payload, payload)
+                else:
+                    captured_at = arrived_at
+                    frame, jpg_in = await run_stage(_decode_frame, decode_payload, payload)
+
+            if frame is None:
+                return
+
+            try:
+                with timings.measure("infer"):
+                    annotated_frame, metrics = await run_stage(svc.process_frame, frame, captured_at, frame_scale)
+            except Exception:
+                return
             try:
-                await client.send_bytes(data)
+                speed_kmh = None
+                if isinstance(metrics, dict):
+                    if "avg_speed_kmh" in metrics:
+                        speed_kmh = float(metrics["avg_speed_kmh"])
+                    elif "avg_speed_mps" in metrics:
+                        speed_kmh = float(metrics["avg_speed_mps"]) * 3.6
+                    elif "current_avg_speed" in metrics:
+                        speed_kmh = float(metrics["current_avg_speed"])
+
+                if speed_kmh is not None:
+                    seg_ids = _segments_by_stream.get(stream_id, [])
+                    # logger.info(f"[traffic] stream={stream_id} seg_ids={seg_ids} speed_kmh={speed_kmh}")
+                    for seg_id in seg_ids:
+                        traffic_state.update_segment_speed(seg_id, speed_kmh)
             except Exception:
-                async with _clients_lock:
-                    _safe_discard(_frontend_clients_by_stream.get(stream_id, set()), client)
-                    _safe_discard(_global_frontend_clients, client)
+                pass
+
+            # The tool hands back the decoded frame itself when it drew nothing;
+            # the incoming JPEG is then forwarded as-is instead of re-encoded.
+            passthrough = jpg_in is not None and annotated_frame is frame
+            with timings.measure("encode"):
+                if passthrough:
+                    jpg_out = jpg_in
+                else:
+                    jpg_out = await run_stage(_encode_frame, annotated_frame, codec)
+            if jpg_out is None:
+                return
+            traffic_media.update_frame(stream_id, jpg_out)
 
-        while True:
-            msg = await websocket.receive()
-            msg_type = msg.get("type")
+            try:
+                await websocket.send_text(dumps_text({
+                    "type": "ack",
+                    "metrics": {
+                        "stream_id": stream_id,
+                        "ts": int(time.time() * 1000),
+                        "metrics": metrics
+                    },
+                    "flow": ingest.flow_signal(timings),
+                }))
+            except:
+                logger.info("OK")
 
-            if msg_type == "websocket.disconnect":
-                raise WebSocketDisconnect()
+            now = time.time()
 
-            if msg_type == "websocket.receive":
-                if "bytes" in msg:
-                    payload = msg["bytes"]
+            send_new_metrics = (now - last_metrics_time) >= metrics_interval
 
-                    try:
-                        try:
-                            b64text = payload.decode("utf-8")
-                            jpg_bytes = base64.b64decode(b64text)
-                        except Exception:
-                            jpg_bytes = payload
-
-                        arr = np.frombuffer(jpg_bytes, dtype=np.uint8)
-                        frame = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-                    except Exception:
-                        frame = None
-
-                    if frame is None:
-                        continue
-
-                    try:
-                        annotated_frame, metrics = svc.process_frame(frame)
-                    except Exception:
-                        continue
-                    try:
-                        speed_kmh = None
-                        if isinstance(metrics, dict):
-                            if "avg_speed_kmh" in metrics:
-                                speed_kmh = float(metrics["avg_speed_kmh"])
-                            elif "avg_speed_mps" in metrics:
-                                speed_kmh = float(metrics["avg_speed_mps"]) * 3.6
-                            elif "current_avg_speed" in metrics:
-                                speed_kmh = float(metrics["current_avg_speed"])
-
-                        if speed_kmh is not None:
-                            seg_ids = _segments_by_stream.get(stream_id, [])
-                            # logger.info(f"[traffic] stream={stream_id} seg_ids={seg_ids} speed_kmh={speed_kmh}")
-                            for seg_id in seg_ids:
-                                traffic_state.update_segment_speed(seg_id, speed_kmh)
-                    except Exception:
-                        pass
-
-                    ok, encoded = cv2.imencode(".jpg", annotated_frame)
-                    if not ok:
-                        continue
-                    jpg_out = encoded.tobytes()
-                    traffic_media.update_frame(stream_id, jpg_out)
-
-                    try:
-                        await websocket.send_text(json.dumps({
-                            "type": "ack",
-                            "metrics": {
-                                "stream_id": stream_id,
-                                "ts": int(time.time() * 1000),
-                                "metrics": metrics
-                            }
-                        }))
-                    except:
-                        logger.info("OK")
-
-                    now = time.time()
-
-                    send_new_metrics = (now - last_metrics_time) >= metrics_interval
-
-                    if send_new_metrics:
-                        last_metrics_time = now
-                        last_metrics_data = metrics
-                        try:
-                            publish_to_orion_ld(stream_id, metrics)
-                        except Exception:
-                            pass
+            if send_new_metrics:
+                last_metrics_time = now
+                last_metrics_data = metrics
+                # Queued for the background publisher; never blocks the loop.
+                submit_to_orion_ld(stream_id, metrics)
 
-                    metrics_for_frontend = last_metrics_data if last_metrics_data is not None else metrics
+            metrics_for_frontend = last_metrics_data if last_metrics_data is not None else metrics
 
-                    meta = {
-                        "type": "frame",
-                        "stream_id": stream_id,
-                        "ts": int(time.time() * 1000),
-                        "metrics": metrics_for_frontend,
-                    }
+            with timings.measure("fanout"):
+                ts_ms = int(time.time() * 1000)
+                tiers = {None: jpg_out}
 
-                    meta_bytes = json.dumps(meta).encode("utf-8")
-                    import struct
-                    header = struct.pack(">I", len(meta_bytes))
-                    combined_payload = header + meta_bytes + jpg_out
+                async def _render(width: Optional[int], envelope: str) -> Optional[bytes]:
+                    if width not in tiers:
+                        tiers[width] = await run_stage(codec.encode_scaled, annotated_frame, width)
+                    if not tiers[width]:
+                        return None
+                    return frame_envelope.pack(envelope, ts_ms, metrics_for_frontend, tiers[width])
 
-                    async with _clients_lock:
-                        recipients = list(_frontend_clients_by_stream.get(stream_id, set())) + list(_global_frontend_clients)
+                # A pass-through frame is the producer's JPEG, which is
+                # decode_scale times wider than the frame we decoded.
+                full_width = annotated_frame.shape[1] * (decode_scale if passthrough else 1)
+                await _frontend_hub.publish(stream_id, _render, full_width)
 
-                    for client in recipients:
-                        asyncio.create_task(_send_bytes_to_client(client, combined_payload))
+            timings.frame_done(passthrough=passthrough)
 
-                elif "text" in msg:
-                    try:
-                        if json.loads(msg["text"]).get("action") == "stop":
-                            break
-                    except:
-                        pass
+        async def _frame_worker():
+            # Frames of one stream are handled strictly in order so the tracker
+            # state stays consistent; other streams keep running meanwhile.
+            while True:
+                item = await ingest.get()
+                try:
+                    await finish_frame(_handle_frame(item))
+                except Exception:
+                    logger.exception(f"Frame processing failed for stream {stream_id}")
+
+        worker = asyncio.create_task(_frame_worker())
+
+        try:
+            while True:
+                msg = await websocket.receive()
+                msg_type = msg.get("type")
+
+                if msg_type == "websocket.disconnect":
+                    raise WebSocketDisconnect()
+
+                if msg_type == "websocket.receive":
+                    if "bytes" in msg:
+                        await ingest.put((time.monotonic(), msg["bytes"]))
+
+                    elif "text" in msg:
+                        try:
+                            if json.loads(msg["text"]).get("action") == "stop":
+                                break
+                        except:
+                            pass
+        finally:
+            await stop_worker(worker)
 
     except WebSocketDisconnect:
         pass
     finally:
+        _timings_by_stream.pop(stream_id, None)
+        _ingest_by_stream.pop(stream_id, None)
         async with _clients_lock:
             _safe_discard(_process_clients_by_stream.get(stream_id, set()), websocket)
 
@@ -294,3 +383,33 @@ async def list_active_streams():
     async with _services_lock:
         keys = list(_services_by_stream.keys())
     return {"streams": keys}
+
+
+@router.get("/ws/inference_stats")
+async def inference_stats():
+    return {"servers": list_inference_servers()}
+
+
+@router.get("/ws/stream_stats")
+async def stream_stats():
+    result = {}
+    for sid, t in list(_timings_by_stream.items()):
+        ingest = _ingest_by_stream.get(sid)
+        result[sid] = {**t.snapshot(), "ingest": ingest.stats() if ingest else None}
+    return result
+
+
+@router.get("/ws/segment_speed/{segment_id}")
+def segment_speed(segment_id: str, minutes: float = 5.0):
+    history = traffic_state.get_segment_history(segment_id, minutes)
+    return {"segment_id": segment_id, "minutes": minutes, "history": history}
+
+
+@router.get("/ws/orion_stats")
+async def orion_stats():
+    return {"publishers": list_orion_publishers()}
+
+
+@router.get("/ws/fanout_stats")
+async def fanout_stats():
+    return _frontend_hub.stats()
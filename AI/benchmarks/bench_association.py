@@ -0,0 +1,97 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""Per-frame cost of associating display detections with tracked ones.
+
+Compares the former nested-loop IoU matching in VehicleSpeedTool with the
+IoU-matrix + argmax path from geometry.best_match.
+
+    python -m benchmarks.bench_association --vehicles 50 100 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from components.tools.traffic_monitor.geometry import best_match
+
+
+def _iou(box1, box2):
+    x1 = max(box1[0], box2[0]); y1 = max(box1[1], box2[1])
+    x2 = min(box1[2], box2[2]); y2 = min(box1[3], box2[3])
+    if x2 < x1 or y2 < y1:
+        return 0.0
+    inter = (x2 - x1) * (y2 - y1)
+    area1 = max(0.0, (box1[2] - box1[0]) * (box1[3] - box1[1]))
+    area2 = max(0.0, (box2[2] - box2[0]) * (box2[3] - box2[1]))
+    union = area1 + area2 - inter
+    return inter / union if union > 0 else 0.0
+
+
+def loop_match(display, tracked, tracker_ids, thr=0.3):
+    out = []
+    for i in range(len(display)):
+        best_iou, best_tid = 0.0, None
+        for j in range(len(tracked)):
+            iou = _iou(display[i], tracked[j])
+            if iou > best_iou and iou > thr:
+                best_iou, best_tid = iou, int(tracker_ids[j])
+        out.append(best_tid if best_tid is not None else i)
+    return np.array(out, dtype=int)
+
+
+def matrix_match(display, tracked, tracker_ids, thr=0.3):
+    ids = np.arange(len(display))
+    best_j, _ = best_match(display, tracked, iou_threshold=thr)
+    matched = best_j >= 0
+    ids[matched] = tracker_ids[best_j[matched]]
+    return ids
+
+
+def make_boxes(n, rng, width=1920, height=1080):
+    xy = rng.uniform(0, [width - 100, height - 100], (n, 2))
+    wh = rng.uniform(30, 100, (n, 2))
+    return np.concatenate([xy, xy + wh], axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'vehicles':>8} {'loop ms':>9} {'matrix ms':>10} {'speedup':>8}")
+    for n in args.vehicles:
+        tracked = make_boxes(n, rng)
+        display = tracked + rng.normal(0, 2.0, tracked.shape)
+        tracker_ids = rng.permutation(10 * n)[:n]
+
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            a = loop_match(display, tracked, tracker_ids)
+        loop_ms = (time.perf_counter() - t0) * 1000.0 / args.repeat
+
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            b = matrix_match(display, tracked, tracker_ids)
+        matrix_ms = (time.perf_counter() - t0) * 1000.0 / args.repeat
+
+        assert np.array_equal(a, b), "matrix association disagrees with the loop"
+        print(f"{n:>8} {loop_ms:>9.3f} {matrix_ms:>10.3f} {loop_ms / matrix_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""Per-frame serialization cost of the frontend envelopes and the acks.
+
+Replays --streams streams at --fps for --seconds and builds, for every
+frame, the ack sent back to the producer and the payload fanned out to
+frontends. Compared are the former json.dumps + struct.pack + concatenation
+path, the default "json" envelope and the opt-in "binary" envelope from
+app.envelope. Metrics handed to frontends change every --metrics-interval
+seconds as in the routers. Acks use json.dumps versus app.envelope.dumps_text
+(orjson when installed).
+
+    python -m benchmarks.bench_frame_envelope --streams 20 --fps 30
+"""
+import argparse
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from app.envelope import FrameEnvelope, dumps_text, orjson, unpack
+
+
+def make_metrics(i):
+    return {
+        "current_count": int(i % 17),
+        "current_avg_speed": round(float(np.float64(30 + i % 40) + 0.25), 1),
+        "vehicle_counts": {"car": i % 11, "motorcycle": i % 23, "bus": i % 3, "truck": i % 5},
+        "latency_ms": {"detect": 12.5, "track": 0.8, "total": 14.1},
+    }
+
+
+def make_ack(stream_id, metrics, i):
+    return {
+        "type": "ack",
+        "metrics": {"stream_id": stream_id, "ts": 1700000000000 + i, "metrics": metrics},
+        "flow": {"mode": "queue", "received": i, "dropped": 0, "queue_depth": 1,
+                 "capacity_fps": 48.2, "suggested_fps": 43.4},
+    }
+
+
+def legacy_frame(stream_id, metrics, jpg):
+    meta = {"type": "frame", "stream_id": stream_id, "ts": int(time.time() * 1000), "metrics": metrics}
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    header = struct.pack(">I", len(meta_bytes))
+    return header + meta_bytes + jpg
+
+
+def run(name, build, frames):
+    t0 = time.perf_counter()
+    total = 0
+    for i in range(frames):
+        total += len(build(i))
+    elapsed = time.perf_counter() - t0
+    return name, elapsed * 1e6 / frames, total / frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--metrics-interval", type=float, default=5.0)
+    parser.add_argument("--jpeg-kib", type=int, default=120)
+    args = parser.parse_args()
+
+    rate = args.streams * args.fps
+    frames = int(rate * args.seconds)
+    held = max(1, int(args.fps * args.metrics_interval))
+    jpg = os.urandom(args.jpeg_kib * 1024)
+    sids = [f"cam-{k:02d}" for k in range(args.streams)]
+    envelopes = {sid: FrameEnvelope(sid) for sid in sids}
+    # Frontend metrics objects are replaced every metrics interval per stream.
+    metrics_pool = [make_metrics(k) for k in range(frames // held + args.streams + 1)]
+
+    def metrics_at(i):
+        return metrics_pool[(i // args.streams) // held + i % args.streams]
+
+    def envelope_builder(kind):
+        def build(i):
+            sid = sids[i % args.streams]
+            return envelopes[sid].pack(kind, 1700000000000 + i, metrics_at(i), jpg)
+        return build
+
+    results = [
+        run("frame: json.dumps + concat", lambda i: legacy_frame(sids[i % args.streams], metrics_at(i), jpg), frames),
+        run("frame: json envelope", envelope_builder("json"), frames),
+        run("frame: binary envelope", envelope_builder("binary"), frames),
+        run("ack: json.dumps", lambda i: json.dumps(make_ack(sids[i % args.streams], make_metrics(i), i)), frames),
+        run("ack: " + ("orjson" if orjson else "json (orjson missing)"),
+            lambda i: dumps_text(make_ack(sids[i % args.streams], make_metrics(i), i)), frames),
+    ]
+
+    # Both envelopes must round-trip to the same metadata.
+    meta_json, view_json = unpack(envelopes[sids[0]].pack("json", 1, metrics_pool[0], jpg))
+    meta_bin, view_bin = unpack(envelopes[sids[0]].pack("binary", 1, metrics_pool[0], jpg))
+    assert meta_json == meta_bin and bytes(view_json) == bytes(view_bin) == jpg
+
+    print(f"{args.streams} streams x {args.fps:g} fps = {rate:g} frames/s, {frames} frames, "
+          f"JPEG {args.jpeg_kib} KiB\n")
+    print(f"{'path':<30} {'us/frame':>10} {'core %':>8} {'bytes/frame':>12}")
+    for name, us, size in results:
+        print(f"{name:<30} {us:>10.2f} {us * rate / 1e4:>8.2f} {size:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
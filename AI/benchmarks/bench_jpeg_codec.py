@@ -0,0 +1,95 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""JPEG codec benchmark: OpenCV versus libjpeg-turbo.
+
+Decodes one frame at full, 1/2 and 1/4 size (DCT-domain scaling) and
+compares it with a full decode followed by cv2.resize, then encodes at a few
+quality / chroma subsampling settings. Every codec backend available on
+this host is measured; libjpeg-turbo needs PyTurboJPEG and libturbojpeg.
+
+    python -m benchmarks.bench_jpeg_codec --video videos/cam1.mp4 --runs 200
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from components.codec.jpeg_codec import JpegCodec, turbo_available
+
+
+def load_frame(video, width, height):
+    if video:
+        cap = cv2.VideoCapture(video)
+        ret, frame = cap.read()
+        cap.release()
+        if ret:
+            return frame
+        print(f"Cannot read {video}, using a synthetic frame")
+    # Smooth gradients plus texture compress roughly like a road scene.
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([xx / width * 255, yy / height * 255, (xx + yy) / (width + height) * 255], axis=2)
+    noise = np.random.default_rng(0).normal(0, 12, (height, width, 3))
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def timed(fn, runs):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        out = fn()
+    return (time.perf_counter() - t0) * 1000.0 / runs, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", default=None)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--runs", type=int, default=100)
+    args = parser.parse_args()
+
+    frame = load_frame(args.video, args.width, args.height)
+    backends = ["opencv"] + (["turbo"] if turbo_available() else [])
+    if len(backends) == 1:
+        print("libjpeg-turbo not available: only the OpenCV path is measured\n")
+    data = JpegCodec(quality=80, backend="opencv").encode(frame)
+    print(f"frame {frame.shape[1]}x{frame.shape[0]}, source JPEG {len(data) / 1024:.1f} KiB\n")
+
+    print(f"{'backend':>8} {'decode':>18} {'ms':>8} {'output':>11}")
+    for backend in backends:
+        codec = JpegCodec(backend=backend)
+        for scale in (1, 2, 4):
+            ms, out = timed(lambda: codec.decode(data, scale), args.runs)
+            print(f"{backend:>8} {'scaled 1/' + str(scale):>18} {ms:>8.2f} {out.shape[1]:>5}x{out.shape[0]:<5}")
+        for scale in (2, 4):
+            size = (frame.shape[1] // scale, frame.shape[0] // scale)
+            ms, out = timed(
+                lambda: cv2.resize(codec.decode(data), size, interpolation=cv2.INTER_AREA), args.runs
+            )
+            print(f"{backend:>8} {'full+resize 1/' + str(scale):>18} {ms:>8.2f} {out.shape[1]:>5}x{out.shape[0]:<5}")
+
+    print(f"\n{'backend':>8} {'quality':>8} {'subsamp':>8} {'ms':>8} {'KiB':>8}")
+    for backend in backends:
+        for quality in (95, 80, 70):
+            for subsampling in ("444", "420"):
+                codec = JpegCodec(quality=quality, subsampling=subsampling, backend=backend)
+                ms, out = timed(lambda: codec.encode(frame), args.runs)
+                print(f"{backend:>8} {quality:>8} {subsampling:>8} {ms:>8.2f} {len(out) / 1024:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""Compare the legacy per-row ONNX output decoder with the vectorized one.
+
+Record real output tensors once from a clip:
+
+    python -m benchmarks.bench_onnx_decode --record video1.mp4 \
+        --weights models/yolo_nas_s_fp16.onnx --out decode_outputs.npz
+
+then benchmark on them (without --outputs a synthetic YOLO raw head is used):
+
+    python -m benchmarks.bench_onnx_decode --outputs decode_outputs.npz
+"""
+import argparse
+import time
+
+import numpy as np
+import cv2 as cv
+
+from components.tools.traffic_monitor.onnx_utils import (
+    _nms,
+    decode_outputs,
+    letterbox,
+    load_onnx,
+)
+
+
+def legacy_decode(outs, r, pad_x, pad_y, frame_shape, conf_thres=0.4):
+    h, w = frame_shape[:2]
+    if len(outs) == 4:
+        num_dets = int(outs[0][0][0]) if outs[0].size > 0 else 0
+        boxes_raw = outs[1][0][:num_dets]
+        scores_raw = outs[2][0][:num_dets]
+        classes_raw = outs[3][0][:num_dets]
+        boxes, scores, classes = [], [], []
+        for i in range(num_dets):
+            score = float(scores_raw[i])
+            if score < conf_thres: continue
+            x1, y1, x2, y2 = boxes_raw[i]
+            x1 = max(0.0, min((x1 - pad_x) / r, w - 1))
+            x2 = max(0.0, min((x2 - pad_x) / r, w - 1))
+            y1 = max(0.0, min((y1 - pad_y) / r, h - 1))
+            y2 = max(0.0, min((y2 - pad_y) / r, h - 1))
+            boxes.append([x1, y1, x2, y2]); scores.append(score); classes.append(int(classes_raw[i]))
+    else:
+        out = np.array(outs[0])
+        if out.ndim == 3:
+            out = out[0]
+        if out.ndim == 2 and out.shape[0] < out.shape[1] and out.shape[0] < 100:
+            out = out.T
+        boxes, scores, classes = [], [], []
+        for det in out:
+            x, y, bw, bh = float(det[0]), float(det[1]), float(det[2]), float(det[3])
+            conf = float(det[4])
+            if len(det) > 5:
+                cls_probs = det[5:]
+                cls = int(np.argmax(cls_probs))
+                score = float(conf * float(cls_probs[cls]))
+            else:
+                cls = 0; score = conf
+            if score >= conf_thres:
+                x1 = max(0.0, min((x - bw / 2.0 - pad_x) / r, w - 1))
+                x2 = max(0.0, min((x + bw / 2.0 - pad_x) / r, w - 1))
+                y1 = max(0.0, min((y - bh / 2.0 - pad_y) / r, h - 1))
+                y2 = max(0.0, min((y + bh / 2.0 - pad_y) / r, h - 1))
+                boxes.append([x1, y1, x2, y2]); scores.append(score); classes.append(cls)
+    if len(boxes) == 0:
+        return np.zeros((0, 4)), np.zeros((0,)), np.zeros((0,), dtype=int)
+    boxes = np.array(boxes, dtype=float); scores = np.array(scores, dtype=float); classes = np.array(classes, dtype=int)
+    keep = _nms(boxes, scores, iou_threshold=0.45)
+    return boxes[keep], scores[keep], classes[keep]
+
+
+def synthetic_outputs(n_frames=20, n_rows=8400, n_classes=80, seed=0):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(n_frames):
+        xy = rng.uniform(0, 640, (n_rows, 2))
+        wh = rng.uniform(8, 120, (n_rows, 2))
+        obj = rng.beta(0.5, 1.5, (n_rows, 1))
+        cls = rng.dirichlet(np.full(n_classes, 0.1), n_rows)
+        head = np.concatenate([xy, wh, obj, cls], axis=1).astype(np.float32)
+        # Ultralytics-style layout: (1, 4 + 1 + C, N)
+        frames.append([head.T[None, ...]])
+    return frames, (720, 1280)
+
+
+def load_recorded(path):
+    data = np.load(path)
+    n_frames = int(data["n_frames"])
+    n_outs = int(data["n_outs"])
+    frames = [[data[f"f{i}_o{j}"] for j in range(n_outs)] for i in range(n_frames)]
+    return frames, tuple(int(v) for v in data["frame_shape"])
+
+
+def record(video_path, weights, out_path, n_frames, imgsz=(640, 640)):
+    sess = load_onnx(weights)
+    meta = sess.get_inputs()[0]
+    need_uint8 = "uint8" in str(getattr(meta, "type", "")).lower()
+    cap = cv.VideoCapture(video_path)
+    arrays = {}
+    frame_shape = None
+    n = 0
+    while n < n_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frame_shape = frame.shape[:2]
+        img, _, _, _ = letterbox(frame, new_shape=imgsz)
+        img = cv.cvtColor(img, cv.COLOR_BGR2RGB)
+        inp = img if need_uint8 else img.astype(np.float32) / 255.0
+        inp = np.expand_dims(np.transpose(inp, (2, 0, 1)), axis=0)
+        outs = sess.run(None, {meta.name: inp})
+        for j, o in enumerate(outs):
+            arrays[f"f{n}_o{j}"] = np.asarray(o)
+        n += 1
+    cap.release()
+    np.savez_compressed(
+        out_path,
+        n_frames=n,
+        n_outs=len(outs) if n else 0,
+        frame_shape=np.array(frame_shape or (0, 0)),
+        **arrays,
+    )
+    print(f"Recorded {n} frames of raw outputs to {out_path}")
+
+
+def bench(frames, frame_shape, conf_thres, repeat):
+    h, w = frame_shape
+    r = min(640 / h, 640 / w)
+    pad_x = (640 - int(round(w * r))) / 2
+    pad_y = (640 - int(round(h * r))) / 2
+
+    results = {}
+    for name, fn in (("legacy", legacy_decode), ("vectorized", decode_outputs)):
+        n_dets = 0
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for outs in frames:
+                boxes, _, _ = fn(outs, r, pad_x, pad_y, frame_shape, conf_thres=conf_thres)
+                n_dets += len(boxes)
+        elapsed = time.perf_counter() - t0
+        per_frame_ms = elapsed * 1000.0 / (repeat * len(frames))
+        results[name] = per_frame_ms
+        print(f"{name:>10}: {per_frame_ms:8.3f} ms/frame  ({n_dets / repeat / len(frames):.1f} dets/frame)")
+    print(f"speedup: {results['legacy'] / results['vectorized']:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--outputs", help="npz file produced with --record")
+    parser.add_argument("--record", help="video to record raw model outputs from")
+    parser.add_argument("--weights", default="models/yolo_nas_s_fp16.onnx")
+    parser.add_argument("--out", default="decode_outputs.npz")
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--conf", type=float, default=0.35)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record, args.weights, args.out, args.frames)
+        return
+
+    if args.outputs:
+        frames, frame_shape = load_recorded(args.outputs)
+    else:
+        frames, frame_shape = synthetic_outputs()
+    bench(frames, frame_shape, args.conf, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
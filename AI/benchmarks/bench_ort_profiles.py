@@ -0,0 +1,100 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""ONNX Runtime session profile benchmark.
+
+For every profile the script reports session creation time (cold, and warm
+when the profile serializes a pre-optimized model), median and p95 latency
+of a full run_onnx call on a synthetic frame, and the process RSS growth
+after loading. It then runs the thread-layout autotune used by the "auto"
+profile and prints every candidate layout.
+
+    python -m benchmarks.bench_ort_profiles --weights models/yolo_nas_s_fp16.onnx --runs 50
+"""
+import argparse
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from components.tools.traffic_monitor import ort_profiles
+from components.tools.traffic_monitor.onnx_utils import load_onnx, run_onnx
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+    except OSError:
+        # Peak rather than current RSS, in kilobytes on Linux and bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def time_profile(weights, profile, frame, runs):
+    rss_before = rss_mb()
+    t0 = time.perf_counter()
+    sess = load_onnx(weights, profile=profile)
+    load_ms = (time.perf_counter() - t0) * 1000.0
+
+    warm_ms = None
+    if ort_profiles.optimized_model_path(weights, ort_profiles.get_profile(profile)):
+        t0 = time.perf_counter()
+        load_onnx(weights, profile=profile)
+        warm_ms = (time.perf_counter() - t0) * 1000.0
+
+    run_onnx(sess, frame)
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        run_onnx(sess, frame)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return load_ms, warm_ms, float(np.median(times)), float(np.percentile(times, 95)), rss_mb() - rss_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", required=True)
+    parser.add_argument("--profiles", nargs="+", default=["default", "latency", "multi_stream", "low_memory"])
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    args = parser.parse_args()
+
+    frame = np.random.default_rng(0).integers(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+    opt_dir = tempfile.mkdtemp(prefix="ort-opt-")
+    ort_profiles.ORT_OPTIMIZED_DIR = opt_dir
+    try:
+        print(f"{'profile':>12} {'load_ms':>9} {'warm_ms':>9} {'p50_ms':>8} {'p95_ms':>8} {'rss_mb':>8}")
+        for profile in args.profiles:
+            load_ms, warm_ms, p50, p95, rss = time_profile(args.weights, profile, frame, args.runs)
+            warm = f"{warm_ms:>9.1f}" if warm_ms is not None else f"{'-':>9}"
+            print(f"{profile:>12} {load_ms:>9.1f} {warm} {p50:>8.2f} {p95:>8.2f} {rss:>8.1f}")
+    finally:
+        shutil.rmtree(opt_dir, ignore_errors=True)
+
+    tuned = ort_profiles.autotune_thread_layout(args.weights, runs=args.runs, force=True)
+    print(f"\nthread layouts on {tuned['cores']} cores")
+    print(f"{'intra':>6} {'inter':>6} {'mode':>11} {'p50_ms':>8} {'p95_ms':>8}")
+    for r in tuned["results"]:
+        print(f"{r['intra_op_threads']:>6} {r['inter_op_threads']:>6} {r['execution_mode']:>11} "
+              f"{r['median_ms']:>8.2f} {r['p95_ms']:>8.2f}")
+    print(f"best: {tuned['best']}")
+
+
+if __name__ == "__main__":
+    main()
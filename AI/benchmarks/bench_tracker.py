@@ -0,0 +1,101 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""Tracker benchmark on synthetic crowded scenes.
+
+Vehicles drive in parallel lanes with jittered boxes, missed detections and
+mixed confidences. For each tracker the script reports time per update, ID
+switches (a ground-truth vehicle changing its track id between detections)
+and how many ids were created.
+
+    python -m benchmarks.bench_tracker --vehicles 50 100 200 --frames 300
+"""
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from components.tools.traffic_monitor.simple_tracker import SimpleTracker
+from components.tools.traffic_monitor.byte_tracker import ByteTracker
+
+
+def make_scene(n_vehicles, n_frames, width=1920, height=1080, miss_rate=0.1, jitter=3.0, seed=0):
+    rng = np.random.default_rng(seed)
+    lanes = max(4, n_vehicles // 8)
+    lane_h = height / lanes
+    lane = rng.integers(0, lanes, n_vehicles)
+    size = rng.uniform(40, 90, (n_vehicles, 2))
+    size[:, 1] = np.minimum(size[:, 1], lane_h * 0.9)
+    x0 = rng.uniform(-width * 0.5, width, n_vehicles)
+    speed = rng.uniform(4, 14, n_vehicles) * np.where(lane % 2 == 0, 1, -1)
+    y = (lane + 0.5) * lane_h
+
+    frames = []
+    for t in range(n_frames):
+        x = (x0 + speed * t) % (width * 1.5) - width * 0.25
+        cx = x + rng.normal(0, jitter, n_vehicles)
+        cy = y + rng.normal(0, jitter, n_vehicles)
+        w = size[:, 0] + rng.normal(0, jitter, n_vehicles)
+        h = size[:, 1] + rng.normal(0, jitter, n_vehicles)
+        visible = (x > 0) & (x < width) & (rng.random(n_vehicles) > miss_rate)
+        gt = np.nonzero(visible)[0]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)[gt]
+        scores = rng.uniform(0.35, 0.95, len(gt))
+        order = rng.permutation(len(gt))
+        frames.append((boxes[order], scores[order], gt[order]))
+    return frames
+
+
+def run(tracker, frames):
+    last_id = {}
+    switches = 0
+    created = set()
+    elapsed = 0.0
+    for boxes, scores, gt in frames:
+        t0 = time.perf_counter()
+        ids = tracker.update(boxes, scores)
+        elapsed += time.perf_counter() - t0
+        for g, tid in zip(gt, ids):
+            tid = int(tid)
+            if tid < 0:
+                continue
+            created.add(tid)
+            if g in last_id and last_id[g] != tid:
+                switches += 1
+            last_id[g] = tid
+    return elapsed * 1000.0 / len(frames), switches, len(created)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--miss-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    print(f"{'vehicles':>8} {'tracker':>8} {'ms/frame':>9} {'id_switches':>12} {'ids':>6}")
+    for n in args.vehicles:
+        frames = make_scene(n, args.frames, miss_rate=args.miss_rate)
+        for name, tracker in (
+            ("simple", SimpleTracker(iou_threshold=0.3, max_lost=5)),
+            ("byte", ByteTracker(high_thresh=0.5, max_lost=30)),
+        ):
+            ms, switches, ids = run(tracker, frames)
+            print(f"{n:>8} {name:>8} {ms:>9.3f} {switches:>12} {ids:>6}")
+
+
+if __name__ == "__main__":
+    main()
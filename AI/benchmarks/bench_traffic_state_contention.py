@@ -0,0 +1,156 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""Contention benchmark for TrafficState / TrafficMedia.
+
+--writers threads play the websocket workers: each owns its segments and a
+stream, and updates a speed plus a frame at --write-hz. --readers threads
+play /rag/chat and the router: they loop over snapshot_with_addresses,
+per-edge get_segment_speed lookups, a history query and the media snapshot.
+The store in app.traffic_store is compared with the same store behind a
+single global lock (the obvious way to make the old dicts thread-safe),
+where every reader blocks every writer.
+
+    python -m benchmarks.bench_traffic_state_contention --writers 50 --readers 8 --seconds 5
+"""
+import argparse
+import os
+import random
+import threading
+import time
+
+import numpy as np
+
+from app.traffic_store import TrafficMedia, TrafficState
+
+
+class GlobalLockState(TrafficState):
+    def __init__(self):
+        super().__init__()
+        self._global = threading.RLock()
+
+    def update_segment_speed(self, *args, **kwargs):
+        with self._global:
+            return super().update_segment_speed(*args, **kwargs)
+
+    def get_segment_speed(self, *args, **kwargs):
+        with self._global:
+            return super().get_segment_speed(*args, **kwargs)
+
+    def get_segment_history(self, *args, **kwargs):
+        with self._global:
+            return super().get_segment_history(*args, **kwargs)
+
+    def snapshot_with_addresses(self, *args, **kwargs):
+        with self._global:
+            return super().snapshot_with_addresses(*args, **kwargs)
+
+
+class GlobalLockMedia(TrafficMedia):
+    def __init__(self):
+        super().__init__()
+        self._global = threading.RLock()
+
+    def update_frame(self, *args, **kwargs):
+        with self._global:
+            return super().update_frame(*args, **kwargs)
+
+    def snapshot(self):
+        with self._global:
+            return super().snapshot()
+
+
+def percentiles_us(samples):
+    if not samples:
+        return "n/a"
+    arr = np.asarray(samples) * 1e6
+    p50, p99 = np.percentile(arr, [50, 99])
+    return f"p50 {p50:7.1f}  p99 {p99:8.1f}  max {arr.max():9.1f}"
+
+
+def run(state, media, args):
+    segments_per_writer = args.segments_per_writer
+    all_segments = [f"seg-{w}-{k}" for w in range(args.writers) for k in range(segments_per_writer)]
+    for seg in all_segments:
+        state.register_segment(seg, f"Street {seg}")
+    frame = os.urandom(args.frame_kib * 1024)
+    stop = threading.Event()
+    write_lat = [[] for _ in range(args.writers)]
+    read_lat = [[] for _ in range(args.readers)]
+
+    def writer(w):
+        rng = random.Random(w)
+        interval = 1.0 / args.write_hz
+        next_at = time.perf_counter()
+        lat = write_lat[w]
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            for k in range(segments_per_writer):
+                state.update_segment_speed(f"seg-{w}-{k}", rng.uniform(5, 60))
+            media.update_frame(f"cam-{w}", frame)
+            lat.append(time.perf_counter() - t0)
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def reader(r):
+        rng = random.Random(1000 + r)
+        lat = read_lat[r]
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            state.snapshot_with_addresses(smoothed=True)
+            for seg in rng.sample(all_segments, min(200, len(all_segments))):
+                state.get_segment_speed(seg, 40.0, smoothed=True)
+            state.get_segment_history(rng.choice(all_segments), 5)
+            media.snapshot()
+            lat.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(r,)) for r in range(args.readers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    writes = [x for lat in write_lat for x in lat]
+    reads = [x for lat in read_lat for x in lat]
+    return writes, reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=50)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--segments-per-writer", type=int, default=2)
+    parser.add_argument("--write-hz", type=float, default=30.0)
+    parser.add_argument("--frame-kib", type=int, default=100)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers x {args.write_hz:g} Hz, {args.readers} readers, {args.seconds:g}s\n")
+    for name, state, media in (
+        ("global lock", GlobalLockState(), GlobalLockMedia()),
+        ("traffic_store", TrafficState(), TrafficMedia()),
+    ):
+        writes, reads = run(state, media, args)
+        print(f"{name:<14} writes {len(writes) / args.seconds:8.0f}/s  write us: {percentiles_us(writes)}")
+        print(f"{'':<14} reads  {len(reads) / args.seconds:8.0f}/s  read us:  {percentiles_us(reads)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""Accuracy, latency and memory comparison of detector variants.
+
+Runs a reference model (normally the FP model shipped today) and one or more
+candidates (for example INT8 variants from
+``components.tools.traffic_monitor.quantize``) over the same recorded clip
+through ``run_onnx``. Each model runs in its own process so RSS numbers are
+not polluted by the others.
+
+Accuracy is reported against the reference: its detections above ``--conf``
+serve as ground truth, and each candidate's detections above ``--eval-conf``
+are scored with COCO-style mAP@0.5 and mAP@0.5:0.95. Drift is 1 - mAP@0.5:0.95,
+so the reference itself scores 0.
+
+    python -m benchmarks.compare_detectors --video videos/cam1.mp4 \\
+        --reference models/yolo_nas_s_fp16.onnx \\
+        --candidates models/yolo_nas_s_int8.onnx --frames 300
+"""
+import argparse
+import multiprocessing as mp
+import os
+import time
+from collections import defaultdict
+
+import cv2 as cv
+import numpy as np
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+
+
+def read_frames(video, n_frames):
+    cap = cv.VideoCapture(video)
+    frames = []
+    while len(frames) < n_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run_model(weights, video, n_frames, conf, profile, imgsz):
+    # Imported in the worker so the parent never loads onnxruntime itself.
+    from components.tools.traffic_monitor.onnx_utils import load_onnx, run_onnx
+
+    frames = read_frames(video, n_frames)
+    rss_start = rss_mb()
+    t0 = time.perf_counter()
+    sess = load_onnx(weights, profile=profile, imgsz=imgsz)
+    load_ms = (time.perf_counter() - t0) * 1000.0
+    rss_loaded = rss_mb()
+
+    if frames:
+        run_onnx(sess, frames[0], imgsz=imgsz, conf_thres=conf)
+    detections, times, rss_peak = [], [], rss_loaded
+    for frame in frames:
+        t0 = time.perf_counter()
+        detections.append(run_onnx(sess, frame, imgsz=imgsz, conf_thres=conf))
+        times.append((time.perf_counter() - t0) * 1000.0)
+        rss_peak = max(rss_peak, rss_mb())
+
+    times = np.array(times) if times else np.zeros(1)
+    return {
+        "weights": weights,
+        "frames": len(frames),
+        "load_ms": load_ms,
+        "mean_ms": float(times.mean()),
+        "p50_ms": float(np.percentile(times, 50)),
+        "p95_ms": float(np.percentile(times, 95)),
+        "rss_model_mb": rss_loaded - rss_start,
+        "rss_peak_mb": rss_peak - rss_start,
+        "detections": detections,
+    }
+
+
+def _box_iou(a, b):
+    from components.tools.traffic_monitor.geometry import iou_matrix
+    return iou_matrix(a, b)
+
+
+def _average_precision(tp, scores, n_gt):
+    if n_gt == 0:
+        return None
+    if len(scores) == 0:
+        return 0.0
+    order = np.argsort(-scores, kind="stable")
+    tp = tp[order]
+    tp_cum = np.cumsum(tp)
+    fp_cum = np.cumsum(1 - tp)
+    recall = tp_cum / n_gt
+    precision = tp_cum / np.maximum(tp_cum + fp_cum, 1e-9)
+    # Precision envelope sampled at 101 recall points, as in COCO.
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    points = np.linspace(0, 1, 101)
+    idx = np.searchsorted(recall, points, side="left")
+    sampled = np.where(idx < len(precision), precision[np.minimum(idx, len(precision) - 1)], 0.0)
+    return float(sampled.mean())
+
+
+def mean_average_precision(preds, gts, iou_thresholds=IOU_THRESHOLDS):
+    """mAP of ``preds`` against ``gts``; both are per-frame (boxes, scores, classes)."""
+    per_class = defaultdict(lambda: {"tp": [[] for _ in iou_thresholds], "scores": [], "n_gt": 0})
+    for (pb, ps, pc), (gb, _, gc) in zip(preds, gts):
+        for c in set(np.asarray(pc).tolist()) | set(np.asarray(gc).tolist()):
+            p_mask = pc == c
+            g_mask = gc == c
+            boxes, scores, gt_boxes = pb[p_mask], ps[p_mask], gb[g_mask]
+            entry = per_class[c]
+            entry["n_gt"] += len(gt_boxes)
+            entry["scores"].extend(scores.tolist())
+            order = np.argsort(-scores, kind="stable")
+            ious = _box_iou(boxes[order], gt_boxes) if len(boxes) and len(gt_boxes) else None
+            for t, thr in enumerate(iou_thresholds):
+                tp = np.zeros(len(boxes))
+                if ious is not None:
+                    taken = np.zeros(len(gt_boxes), dtype=bool)
+                    for rank, i in enumerate(order):
+                        cand = np.where(~taken & (ious[rank] >= thr), ious[rank], -1.0)
+                        j = int(np.argmax(cand))
+                        if cand[j] >= thr:
+                            taken[j] = True
+                            tp[i] = 1.0
+                entry["tp"][t].extend(tp.tolist())
+
+    aps = np.full((len(per_class), len(iou_thresholds)), np.nan)
+    for k, entry in enumerate(per_class.values()):
+        scores = np.array(entry["scores"])
+        for t in range(len(iou_thresholds)):
+            ap = _average_precision(np.array(entry["tp"][t]), scores, entry["n_gt"])
+            if ap is not None:
+                aps[k, t] = ap
+    if np.all(np.isnan(aps)):
+        return 0.0, 0.0
+    return float(np.nanmean(aps[:, 0])), float(np.nanmean(aps))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", required=True)
+    parser.add_argument("--reference", required=True)
+    parser.add_argument("--candidates", nargs="+", required=True)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--conf", type=float, default=0.4, help="reference threshold for ground truth")
+    parser.add_argument("--eval-conf", type=float, default=0.05, help="candidate threshold for scoring")
+    parser.add_argument("--profile", default=None, help="ONNX Runtime session profile")
+    parser.add_argument("--imgsz", type=int, nargs=2, default=[640, 640])
+    args = parser.parse_args()
+
+    imgsz = tuple(args.imgsz)
+    ctx = mp.get_context("spawn")
+    results = []
+    for weights in [args.reference] + args.candidates:
+        with ctx.Pool(1) as pool:
+            results.append(pool.apply(
+                run_model, (weights, args.video, args.frames, args.eval_conf, args.profile, imgsz)
+            ))
+
+    reference = results[0]
+    gts = [
+        (b[s >= args.conf], s[s >= args.conf], c[s >= args.conf])
+        for b, s, c in reference["detections"]
+    ]
+    n_gt = sum(len(g[0]) for g in gts)
+    print(f"{reference['frames']} frames, {n_gt} reference detections at conf >= {args.conf}\n")
+    print(f"{'model':>28} {'load_ms':>8} {'mean_ms':>8} {'p50_ms':>7} {'p95_ms':>7} "
+          f"{'rss_model':>9} {'rss_peak':>8} {'mAP50':>6} {'mAP50-95':>8} {'drift':>6}")
+    for res in results:
+        map50, map5095 = mean_average_precision(res["detections"], gts)
+        name = os.path.basename(res["weights"])
+        print(f"{name[-28:]:>28} {res['load_ms']:>8.1f} {res['mean_ms']:>8.2f} {res['p50_ms']:>7.2f} "
+              f"{res['p95_ms']:>7.2f} {res['rss_model_mb']:>9.1f} {res['rss_peak_mb']:>8.1f} "
+              f"{map50:>6.3f} {map5095:>8.3f} {1.0 - map5095:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""Load generator for the ws_traffic -> Orion-LD publishing path.
+
+Drives /ws/process with --streams synthetic camera streams and reports the
+upsert throughput and latency distribution seen by an Orion-LD stand-in
+(benchmarks.orion_standin), plus the publisher's own queue metrics.
+
+By default everything runs in this process: the stand-in, the ws_traffic
+router (with a synthetic detector, so no model is needed) and the
+producers. Point --ws-url at a running AI service and --orion-url at a
+stand-in it publishes to in order to measure the real pipeline instead.
+
+    python -m benchmarks.load_ws_traffic --streams 50 --fps 10 --seconds 30 --metrics-interval 1
+    python -m benchmarks.load_ws_traffic --ws-url ws://localhost:8000/ws/process --orion-url http://localhost:1026
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import cv2
+import httpx
+import numpy as np
+import websockets
+
+
+class SyntheticSpeedService:
+    """Stands in for VehicleSpeedStreamService: fixed cost, random metrics."""
+
+    def __init__(self, infer_ms=2.0):
+        self.infer_ms = infer_ms
+        self.initialized = False
+
+    def init_stream(self, **kwargs):
+        self.initialized = True
+
+    def process_frame(self, frame_bgr, timestamp=None, frame_scale=1.0):
+        time.sleep(self.infer_ms / 1000.0)
+        return frame_bgr, {
+            "current_count": random.randint(0, 20),
+            "current_avg_speed": round(random.uniform(5, 60), 1),
+        }
+
+    def get_metrics(self):
+        return {}
+
+
+def synthetic_jpeg(width, height):
+    rng = np.random.default_rng(0)
+    frame = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (9, 9), 0)
+    return cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])[1].tobytes()
+
+
+async def producer(url, stream_id, jpg, fps, seconds, metrics_interval, counters):
+    async with websockets.connect(url, max_size=None, ping_interval=None) as ws:
+        await ws.send(json.dumps({
+            "stream_id": stream_id,
+            "segment_ids": [stream_id],
+            "address": f"Synthetic {stream_id}",
+            "fps": fps,
+            "frame_encoding": "jpeg",
+            "ingest_mode": "latest",
+            "metrics_interval": metrics_interval,
+        }))
+
+        async def drain():
+            async for _ in ws:
+                counters["acks"] += 1
+
+        reader = asyncio.create_task(drain())
+        interval = 1.0 / fps
+        next_at = time.perf_counter()
+        deadline = next_at + seconds
+        try:
+            while next_at < deadline:
+                await ws.send(jpg)
+                counters["frames"] += 1
+                next_at += interval
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            await ws.send(json.dumps({"action": "stop"}))
+        finally:
+            reader.cancel()
+
+
+async def start_server(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+def print_dist(name, dist, unit):
+    if not dist.get("n"):
+        print(f"  {name:<22} no samples")
+        return
+    print(f"  {name:<22} n={dist['n']:<7} mean={dist['mean']:<9} p50={dist['p50']:<9} "
+          f"p95={dist['p95']:<9} p99={dist['p99']:<9} max={dist['max']} {unit}")
+
+
+async def run(args):
+    servers = []
+    orion_url = args.orion_url
+    if orion_url is None:
+        from benchmarks.orion_standin import create_standin_app
+
+        standin = create_standin_app(args.orion_latency_ms, args.orion_jitter_ms, args.orion_error_rate)
+        servers.append(await start_server(standin, args.orion_port))
+        orion_url = f"http://127.0.0.1:{args.orion_port}"
+
+    ws_url = args.ws_url
+    stream_ids = [f"load-{i:03d}" for i in range(args.streams)]
+    if ws_url is None:
+        # The publisher reads ORION_URL at import time.
+        os.environ["ORION_URL"] = orion_url
+        from fastapi import FastAPI
+
+        import app.ws_traffic as ws_traffic
+
+        for sid in stream_ids:
+            ws_traffic._services_by_stream[sid] = SyntheticSpeedService(args.infer_ms)
+        ai_app = FastAPI()
+        ai_app.include_router(ws_traffic.router)
+        servers.append(await start_server(ai_app, args.ws_port))
+        ws_url = f"ws://127.0.0.1:{args.ws_port}/ws/process"
+    http_base = ws_url.replace("ws://", "http://").replace("wss://", "https://").rsplit("/ws/", 1)[0]
+
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        await client.post(orion_url + "/standin/reset")
+
+        jpg = synthetic_jpeg(args.width, args.height)
+        counters = {"frames": 0, "acks": 0}
+        print(f"{args.streams} streams x {args.fps:g} fps for {args.seconds:g}s -> {ws_url}, Orion {orion_url}")
+        t0 = time.perf_counter()
+        await asyncio.gather(*(
+            producer(ws_url, sid, jpg, args.fps, args.seconds, args.metrics_interval, counters)
+            for sid in stream_ids
+        ))
+        sent_s = time.perf_counter() - t0
+        # Give the publisher time to flush what is still queued.
+        await asyncio.sleep(args.drain)
+
+        standin_stats = (await client.get(orion_url + "/standin/stats")).json()
+        try:
+            publishers = (await client.get(http_base + "/ws/orion_stats")).json().get("publishers", [])
+        except Exception:
+            publishers = []
+
+    for server, task in reversed(servers):
+        server.should_exit = True
+        await task
+
+    print(f"\nproducers: {counters['frames']} frames in {sent_s:.1f}s "
+          f"({counters['frames'] / sent_s:.1f} fps), {counters['acks']} acks")
+    print(f"orion: {standin_stats['requests']} upserts ({standin_stats['requests_per_s']}/s), "
+          f"{standin_stats['entities_upserted']} entities ({standin_stats['entities_per_s']}/s), "
+          f"status {standin_stats['status_counts']}")
+    print_dist("batch size", standin_stats["batch_size"], "entities")
+    print_dist("entity end-to-end", standin_stats["entity_latency_ms"], "ms")
+    print_dist("stand-in handling", standin_stats["handle_ms"], "ms")
+    for pub in publishers:
+        print(f"publisher: submitted={pub['submitted']} coalesced={pub['coalesced']} "
+              f"rejected={pub['rejected']} batches={pub['batches']} retries={pub['retries']} "
+              f"failed={pub['failed_entities']} pending={pub['pending']} "
+              f"last_flush_lag_ms={pub['last_flush_lag_ms']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--fps", type=float, default=10.0)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--metrics-interval", type=float, default=5.0,
+                        help="seconds between Orion publishes per stream (floored at ORION_FLUSH_INTERVAL)")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--infer-ms", type=float, default=2.0, help="synthetic detector cost (in-process only)")
+    parser.add_argument("--drain", type=float, default=3.0)
+    parser.add_argument("--ws-url", default=None, help="external /ws/process endpoint")
+    parser.add_argument("--ws-port", type=int, default=8765)
+    parser.add_argument("--orion-url", default=None, help="external stand-in base URL")
+    parser.add_argument("--orion-port", type=int, default=18026)
+    parser.add_argument("--orion-latency-ms", type=float, default=20.0)
+    parser.add_argument("--orion-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--orion-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
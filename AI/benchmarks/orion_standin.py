@@ -0,0 +1,191 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""In-process Orion-LD stand-in for load-testing the publishing path.
+
+Implements the subset of NGSI-LD the AI service uses:
+
+    POST /ngsi-ld/v1/entityOperations/upsert   201 (ids created) or 204
+    GET  /ngsi-ld/v1/entities/{id}
+    GET  /ngsi-ld/v1/entities?type=...
+
+Every upsert can be delayed (--latency-ms, --jitter-ms) or failed with
+--error-status at --error-rate. GET /standin/stats reports request and
+entity throughput, batch sizes, status codes and the end-to-end latency of
+each entity, measured from its observedAt / dateObserved to its arrival.
+POST /standin/reset clears the counters.
+
+    python -m benchmarks.orion_standin --port 1026 --latency-ms 20 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+MAX_SAMPLES = 200000
+
+
+def _observed_at(entity: Dict[str, Any]) -> Optional[float]:
+    for attr in ("dateObserved", "averageVehicleSpeed", "intensity"):
+        prop = entity.get(attr)
+        if isinstance(prop, dict):
+            stamp = prop.get("observedAt") or prop.get("value")
+            if isinstance(stamp, str):
+                try:
+                    return datetime.fromisoformat(stamp.replace("Z", "+00:00")).timestamp()
+                except ValueError:
+                    continue
+    return None
+
+
+def _percentiles(samples) -> Dict[str, Any]:
+    if not samples:
+        return {"n": 0}
+    arr = np.fromiter(samples, dtype=np.float64)
+    p50, p90, p95, p99 = np.percentile(arr, [50, 90, 95, 99])
+    return {
+        "n": int(arr.size),
+        "mean": round(float(arr.mean()), 2),
+        "p50": round(float(p50), 2),
+        "p90": round(float(p90), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2),
+        "max": round(float(arr.max()), 2),
+    }
+
+
+class StandinState:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.entities: Dict[str, Dict[str, Any]] = {}
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.time()
+        self.requests = 0
+        self.upserted = 0
+        self.status_counts: Dict[int, int] = {}
+        self.batch_sizes = deque(maxlen=MAX_SAMPLES)
+        self.entity_latency_ms = deque(maxlen=MAX_SAMPLES)
+        self.handle_ms = deque(maxlen=MAX_SAMPLES)
+
+    def stats(self) -> Dict[str, Any]:
+        elapsed = max(time.time() - self.started_at, 1e-6)
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": self.requests,
+            "requests_per_s": round(self.requests / elapsed, 2),
+            "entities_upserted": self.upserted,
+            "entities_per_s": round(self.upserted / elapsed, 2),
+            "distinct_entities": len(self.entities),
+            "status_counts": {str(k): v for k, v in sorted(self.status_counts.items())},
+            "batch_size": _percentiles(self.batch_sizes),
+            "entity_latency_ms": _percentiles(self.entity_latency_ms),
+            "handle_ms": _percentiles(self.handle_ms),
+        }
+
+
+def create_standin_app(latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503) -> FastAPI:
+    state = StandinState(latency_ms, jitter_ms, error_rate, error_status)
+    app = FastAPI(title="Orion-LD stand-in")
+    app.state.standin = state
+
+    def _done(status: int, t0: float) -> None:
+        state.status_counts[status] = state.status_counts.get(status, 0) + 1
+        state.handle_ms.append((time.perf_counter() - t0) * 1000.0)
+
+    @app.post("/ngsi-ld/v1/entityOperations/upsert")
+    async def upsert(request: Request):
+        t0 = time.perf_counter()
+        arrived = time.time()
+        state.requests += 1
+        delay = state.latency_ms + random.uniform(0, state.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+        if state.error_rate > 0 and random.random() < state.error_rate:
+            _done(state.error_status, t0)
+            return JSONResponse({"title": "Injected error"}, status_code=state.error_status)
+
+        body = await request.json()
+        entities = body if isinstance(body, list) else [body]
+        created = []
+        for entity in entities:
+            entity_id = str(entity.get("id"))
+            if entity_id not in state.entities:
+                created.append(entity_id)
+            state.entities[entity_id] = entity
+            observed = _observed_at(entity)
+            if observed is not None:
+                state.entity_latency_ms.append((arrived - observed) * 1000.0)
+        state.upserted += len(entities)
+        state.batch_sizes.append(len(entities))
+        if created:
+            _done(201, t0)
+            return JSONResponse(created, status_code=201)
+        _done(204, t0)
+        return Response(status_code=204)
+
+    @app.get("/ngsi-ld/v1/entities/{entity_id}")
+    async def get_entity(entity_id: str):
+        entity = state.entities.get(entity_id)
+        if entity is None:
+            return JSONResponse({"title": "Entity Not Found", "detail": entity_id}, status_code=404)
+        return entity
+
+    @app.get("/ngsi-ld/v1/entities")
+    async def query_entities(type: Optional[str] = None, limit: int = 100):
+        found = [e for e in state.entities.values() if type is None or e.get("type") == type]
+        return found[:limit]
+
+    @app.get("/standin/stats")
+    async def standin_stats():
+        return state.stats()
+
+    @app.post("/standin/reset")
+    async def standin_reset():
+        state.reset()
+        return {"ok": True}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1026)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    app = create_standin_app(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
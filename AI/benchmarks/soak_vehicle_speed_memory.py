@@ -0,0 +1,97 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""Long-run memory soak for VehicleSpeedTool.
+
+Drives process_frame with a synthetic detector: vehicles keep entering,
+crossing and leaving the zone, so track ids grow without bound exactly as on
+a camera running for days. Python heap usage (tracemalloc) and the size of
+the per-track state are printed at regular checkpoints; both should plateau.
+
+    python -m benchmarks.soak_vehicle_speed_memory --frames 200000 --every 20000
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+import components.tools.traffic_monitor.vehicle_speed_tool as vst
+
+
+class SyntheticTraffic:
+    def __init__(self, width=640, height=480, lanes=6, per_lane=5, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.width, self.height = width, height
+        self.lane_y = (np.arange(lanes) + 0.5) * height / lanes
+        n = lanes * per_lane
+        self.lane = np.repeat(np.arange(lanes), per_lane)
+        self.x = self.rng.uniform(-width, width, n)
+        self.speed = self.rng.uniform(3, 9, n)
+
+    def step(self):
+        self.x += self.speed
+        wrapped = self.x > self.width + 40
+        self.x[wrapped] = -40 - self.rng.uniform(0, self.width, wrapped.sum())
+        visible = (self.x > 0) & (self.x < self.width - 40)
+        cx = self.x[visible]
+        cy = self.lane_y[self.lane[visible]]
+        boxes = np.stack([cx - 18, cy - 12, cx + 18, cy + 12], axis=1)
+        scores = self.rng.uniform(0.5, 0.95, len(boxes))
+        classes = np.full(len(boxes), 2, dtype=int)
+        return boxes, scores, classes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=100000)
+    parser.add_argument("--every", type=int, default=10000)
+    parser.add_argument("--tracker", default="bytetrack.yaml")
+    args = parser.parse_args()
+
+    # No model file is needed: detections come from SyntheticTraffic.
+    vst.load_onnx = lambda path, **kwargs: None
+    traffic = SyntheticTraffic()
+    tool = vst.VehicleSpeedTool()
+    tool._detect = lambda sess, server, frame, imgsz: traffic.step()
+    w, h = traffic.width, traffic.height
+    ok = tool.init_stream_mode(
+        image_pts=[[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]],
+        world_pts=[[0, 0], [40, 0], [40, 30], [0, 30]],
+        tracker_cfg=args.tracker,
+        fps_override=10,
+    )
+    if not ok:
+        raise SystemExit("init_stream_mode failed")
+
+    frame = np.zeros((h, w, 3), dtype=np.uint8)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    print(f"{'frame':>8} {'heap MB':>8} {'peak MB':>8} {'tracked':>8} {'active':>7} {'speedo':>7} {'ms/frame':>9}")
+    for i in range(1, args.frames + 1):
+        tool.process_frame(frame)
+        if i % args.every == 0:
+            cur, peak = tracemalloc.get_traced_memory()
+            ms = (time.perf_counter() - t0) * 1000.0 / args.every
+            print(
+                f"{i:>8} {cur / 1e6:>8.2f} {peak / 1e6:>8.2f} {tool.total_tracked:>8} "
+                f"{len(tool.active_ids):>7} {len(tool.speedometer.speeds):>7} {ms:>9.3f}"
+            )
+            t0 = time.perf_counter()
+    print(tool.get_stream_metrics())
+
+
+if __name__ == "__main__":
+    main()
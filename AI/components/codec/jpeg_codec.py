@@ -0,0 +1,190 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+from typing import Dict, Optional
+import os
+import threading
+
+import cv2
+import numpy as np
+
+try:
+    import turbojpeg as _tj
+except ImportError:
+    _tj = None
+
+# "auto" uses libjpeg-turbo through PyTurboJPEG when the bindings and the
+# shared library are both present, "opencv" always uses cv2.
+JPEG_CODEC = str.lower(os.getenv("JPEG_CODEC", "auto"))
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "95"))
+JPEG_SUBSAMPLING = os.getenv("JPEG_SUBSAMPLING", "420")
+# Decode inference frames at 1/scale of their size in the DCT domain (1, 2, 4 or 8)
+JPEG_DECODE_SCALE = int(os.getenv("JPEG_DECODE_SCALE", "1"))
+
+DECODE_SCALES = (1, 2, 4, 8)
+
+_CV_REDUCED = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+_CV_SAMPLING = {
+    "444": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_444", None),
+    "422": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_422", None),
+    "420": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_420", None),
+    "440": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_440", None),
+    "411": getattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR_411", None),
+}
+
+JPEG_SUBSAMPLINGS = tuple(_CV_SAMPLING) + ("gray",)
+
+
+# Stream configs come from producers as JSON; a bad value falls back to the
+# env default instead of failing the stream.
+def parse_jpeg_quality(value, default: int = JPEG_QUALITY) -> int:
+    try:
+        quality = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        print(f"Ignoring jpeg_quality={value!r}, using {default}")
+        quality = default
+    return min(100, max(1, quality))
+
+
+def parse_jpeg_subsampling(value, default: str = JPEG_SUBSAMPLING) -> str:
+    if value is None:
+        return default
+    subsampling = str(value).replace(":", "")
+    if subsampling not in JPEG_SUBSAMPLINGS:
+        print(f"Ignoring jpeg_subsampling={value!r}, expected one of {JPEG_SUBSAMPLINGS}; using {default}")
+        return default
+    return subsampling
+
+
+def parse_decode_scale(value, default: int = JPEG_DECODE_SCALE) -> int:
+    try:
+        scale = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        print(f"Ignoring decode_scale={value!r}, using {default}")
+        scale = default
+    return scale if scale in DECODE_SCALES else 1
+
+
+_turbo = None
+_turbo_lock = threading.Lock()
+_turbo_failed = False
+
+
+def _get_turbo():
+    global _turbo, _turbo_failed
+    if _tj is None or _turbo_failed:
+        return None
+    if _turbo is None:
+        with _turbo_lock:
+            if _turbo is None and not _turbo_failed:
+                try:
+                    _turbo = _tj.TurboJPEG()
+                except Exception as e:
+                    # Python bindings installed without libturbojpeg.
+                    print(f"libjpeg-turbo unavailable, using OpenCV for JPEG: {e}")
+                    _turbo_failed = True
+    return _turbo
+
+
+def turbo_available() -> bool:
+    return _get_turbo() is not None
+
+
+class JpegCodec:
+    """JPEG decode/encode for one stream.
+
+    ``decode`` can shrink the image by 2, 4 or 8 while decoding (libjpeg
+    scales in the DCT domain, so this is much cheaper than a full decode
+    plus resize); ``encode`` uses the stream's quality and chroma
+    subsampling. Both go through libjpeg-turbo when it is available and
+    through OpenCV otherwise.
+    """
+
+    def __init__(
+        self,
+        quality: Optional[int] = None,
+        subsampling: Optional[str] = None,
+        backend: Optional[str] = None,
+    ) -> None:
+        self.quality = parse_jpeg_quality(quality)
+        self.subsampling = parse_jpeg_subsampling(subsampling)
+        backend = str.lower(backend or JPEG_CODEC)
+        self._turbo = _get_turbo() if backend in ("auto", "turbo") else None
+        if backend == "turbo" and self._turbo is None:
+            print("JPEG_CODEC=turbo requested but libjpeg-turbo is unavailable, using OpenCV")
+        self.backend = "turbo" if self._turbo is not None else "opencv"
+
+        self._cv_params = [int(cv2.IMWRITE_JPEG_QUALITY), self.quality]
+        cv_sampling = _CV_SAMPLING.get(self.subsampling)
+        if cv_sampling is not None and hasattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR"):
+            self._cv_params += [int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR), int(cv_sampling)]
+        if self._turbo is not None:
+            self._tj_subsample = {
+                "444": _tj.TJSAMP_444,
+                "422": _tj.TJSAMP_422,
+                "420": _tj.TJSAMP_420,
+                "440": _tj.TJSAMP_440,
+                "411": _tj.TJSAMP_411,
+                "gray": _tj.TJSAMP_GRAY,
+            }.get(self.subsampling, _tj.TJSAMP_420)
+
+    @classmethod
+    def from_stream_config(cls, cfg: Dict[str, object]) -> "JpegCodec":
+        """Codec for a producer's init config; bad values fall back to defaults."""
+        return cls(quality=cfg.get("jpeg_quality"), subsampling=cfg.get("jpeg_subsampling"))
+
+    def decode(self, data: bytes, scale: int = 1) -> Optional[np.ndarray]:
+        scale = int(scale) if int(scale) in DECODE_SCALES else 1
+        if self._turbo is not None:
+            try:
+                factor = None if scale == 1 else (1, scale)
+                return self._turbo.decode(data, pixel_format=_tj.TJPF_BGR, scaling_factor=factor)
+            except Exception:
+                # Fall through: OpenCV is more lenient with truncated streams.
+                pass
+        arr = np.frombuffer(data, dtype=np.uint8)
+        return cv2.imdecode(arr, _CV_REDUCED[scale])
+
+    def encode(self, frame: np.ndarray) -> Optional[bytes]:
+        if self._turbo is not None:
+            try:
+                return self._turbo.encode(
+                    frame,
+                    quality=self.quality,
+                    pixel_format=_tj.TJPF_BGR,
+                    jpeg_subsample=self._tj_subsample,
+                )
+            except Exception:
+                pass
+        ok, encoded = cv2.imencode(".jpg", frame, self._cv_params)
+        if not ok:
+            return None
+        return encoded.tobytes()
+
+    def encode_scaled(self, frame: np.ndarray, max_width: Optional[int] = None) -> Optional[bytes]:
+        h, w = frame.shape[:2]
+        if max_width and 0 < max_width < w:
+            size = (int(max_width), max(1, int(round(h * max_width / w))))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return self.encode(frame)
+
+    def describe(self) -> Dict[str, object]:
+        return {"backend": self.backend, "quality": self.quality, "subsampling": self.subsampling}
@@ -148,7 +148,7 @@ def _compute_edge_travel_times(
 
         if use_traffic and segment_id is not None:
             from app.utils import traffic_state
-            speed_kmh = traffic_state.get_segment_speed(segment_id, base_speed_kmh)
+            speed_kmh = traffic_state.get_segment_speed(segment_id, base_speed_kmh, smoothed=True)
         else:
             speed_kmh = base_speed_kmh
 
@@ -0,0 +1,196 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+from typing import List, Optional, Tuple
+import numpy as np
+
+from .geometry import iou_matrix
+from .kalman_filter import BoxKalmanFilter, cxcywh_to_xyxy, xyxy_to_cxcywh
+
+try:
+    from scipy.optimize import linear_sum_assignment as _scipy_lsa
+except ImportError:
+    _scipy_lsa = None
+
+
+def _hungarian(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Kuhn-Munkres with potentials, O(n^2 m); inner loop vectorized over columns.
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            cand = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(cand)) + 1
+            delta = cand[j1 - 1]
+            used_cols = np.nonzero(used)[0]
+            u[p[used_cols]] += delta
+            v[used_cols] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.nonzero(p[1:])[0]
+    rows = p[1:][cols] - 1
+    order = np.argsort(rows)
+    rows, cols = rows[order], cols[order]
+    if transposed:
+        rows, cols = cols, rows
+        order = np.argsort(rows)
+        rows, cols = rows[order], cols[order]
+    return rows, cols
+
+
+def linear_assignment(cost: np.ndarray, thresh: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Optimal assignment; pairs costing more than ``thresh`` are rejected.
+
+    Returns (matches (K, 2), unmatched_rows, unmatched_cols).
+    """
+    n, m = cost.shape
+    if n == 0 or m == 0:
+        return np.zeros((0, 2), dtype=int), np.arange(n), np.arange(m)
+    if _scipy_lsa is not None:
+        rows, cols = _scipy_lsa(cost)
+    else:
+        rows, cols = _hungarian(cost)
+    ok = cost[rows, cols] <= thresh
+    matches = np.stack([rows[ok], cols[ok]], axis=1).astype(int)
+    unmatched_rows = np.setdiff1d(np.arange(n), matches[:, 0])
+    unmatched_cols = np.setdiff1d(np.arange(m), matches[:, 1])
+    return matches, unmatched_rows, unmatched_cols
+
+
+class ByteTracker:
+    """ByteTrack-style tracker with the same contract as SimpleTracker.
+
+    Tracks are Kalman-predicted every frame and matched to detections with an
+    optimal assignment on the IoU matrix, first against high-confidence boxes
+    and then, for tracks still unmatched, against low-confidence ones. Only
+    high-confidence detections start new tracks; low-confidence detections
+    that match nothing get id -1.
+    """
+
+    def __init__(
+        self,
+        high_thresh: float = 0.5,
+        match_iou: float = 0.2,
+        low_match_iou: float = 0.5,
+        max_lost: int = 30,
+    ):
+        self.high_thresh = high_thresh
+        self.match_iou = match_iou
+        self.low_match_iou = low_match_iou
+        self.max_lost = max_lost
+
+        self.kf = BoxKalmanFilter()
+        self.next_id = 0
+        self.ids = np.zeros((0,), dtype=int)
+        self.lost = np.zeros((0,), dtype=int)
+        self.mean = np.zeros((0, 8))
+        self.cov = np.zeros((0, 8, 8))
+        self.removed_ids: List[int] = []
+
+    @property
+    def tracks(self):
+        boxes = cxcywh_to_xyxy(self.mean[:, :4]) if len(self.mean) else np.zeros((0, 4))
+        return {int(tid): tuple(b) for tid, b in zip(self.ids, boxes)}
+
+    def predict(self, dt: float = 1.0) -> np.ndarray:
+        self.mean, self.cov = self.kf.predict(self.mean, self.cov, dt=dt)
+        return cxcywh_to_xyxy(self.mean[:, :4]) if len(self.mean) else np.zeros((0, 4))
+
+    def propagate(self, dt: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+        """Advance every track by ``dt`` frames without a detection.
+
+        Returns ids and predicted boxes of the tracks matched at the last
+        update, for frames on which the detector is skipped.
+        """
+        boxes = self.predict(dt)
+        visible = self.lost == 0
+        return self.ids[visible].copy(), boxes[visible]
+
+    def update(self, boxes: np.ndarray, scores: Optional[np.ndarray] = None, dt: float = 1.0) -> np.ndarray:
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        n_det = len(boxes)
+        scores = np.ones(n_det) if scores is None else np.asarray(scores, dtype=float).reshape(-1)
+        det_ids = np.full(n_det, -1, dtype=int)
+        self.removed_ids = []
+
+        pred_boxes = self.predict(dt)
+        n_trk = len(self.ids)
+
+        high = np.nonzero(scores >= self.high_thresh)[0]
+        low = np.nonzero(scores < self.high_thresh)[0]
+
+        # Stage 1: every track against high-confidence detections.
+        iou_hi = iou_matrix(pred_boxes, boxes[high])
+        m1, unmatched_trk, unmatched_hi = linear_assignment(1.0 - iou_hi, 1.0 - self.match_iou)
+
+        # Stage 2: tracks that were visible last frame against the low ones.
+        recent = unmatched_trk[self.lost[unmatched_trk] == 0]
+        iou_lo = iou_matrix(pred_boxes[recent], boxes[low])
+        m2, _, _ = linear_assignment(1.0 - iou_lo, 1.0 - self.low_match_iou)
+
+        trk_idx = np.concatenate([m1[:, 0], recent[m2[:, 0]]]).astype(int)
+        det_idx = np.concatenate([high[m1[:, 1]], low[m2[:, 1]]]).astype(int)
+
+        if len(trk_idx):
+            mean, cov = self.kf.update(self.mean[trk_idx], self.cov[trk_idx], xyxy_to_cxcywh(boxes[det_idx]))
+            self.mean[trk_idx] = mean
+            self.cov[trk_idx] = cov
+            self.lost[trk_idx] = 0
+            det_ids[det_idx] = self.ids[trk_idx]
+
+        matched = np.zeros(n_trk, dtype=bool)
+        matched[trk_idx] = True
+        self.lost[~matched] += 1
+
+        keep = self.lost <= self.max_lost
+        self.removed_ids = [int(t) for t in self.ids[~keep]]
+        self.ids, self.lost = self.ids[keep], self.lost[keep]
+        self.mean, self.cov = self.mean[keep], self.cov[keep]
+
+        new_det = high[unmatched_hi]
+        if len(new_det):
+            new_ids = np.arange(self.next_id, self.next_id + len(new_det))
+            self.next_id += len(new_det)
+            mean, cov = self.kf.initiate(xyxy_to_cxcywh(boxes[new_det]))
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.lost = np.concatenate([self.lost, np.zeros(len(new_det), dtype=int)])
+            self.mean = np.concatenate([self.mean, mean])
+            self.cov = np.concatenate([self.cov, cov])
+            det_ids[new_det] = new_ids
+
+        return det_ids
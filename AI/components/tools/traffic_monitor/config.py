@@ -13,8 +13,39 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # -----------------------------------------------------------------------------
+import os
+
 MPS_TO_KPH = 3.6
 
 DEFAULT_CLASSES = [2, 3, 5, 7]
 DEFAULT_CONF = 0.4
-DEFAULT_TRACKER = "bytetrack.yaml"
\ No newline at end of file
+DEFAULT_TRACKER = "bytetrack.yaml"
+
+# Cross-camera micro-batching of detector inference
+BATCH_INFERENCE = str.lower(os.getenv("TRAFFIC_BATCH_INFERENCE", "false")) == "true"
+BATCH_MAX_SIZE = int(os.getenv("TRAFFIC_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("TRAFFIC_BATCH_MAX_WAIT_MS", "10"))
+# Seconds a stream waits for its batched result before skipping the frame
+BATCH_INFER_TIMEOUT_S = float(os.getenv("TRAFFIC_BATCH_INFER_TIMEOUT_S", "5"))
+
+# Per-track speed smoothing in Speedometer: "none", "ema" or "kalman"
+SPEED_SMOOTHING = str.lower(os.getenv("TRAFFIC_SPEED_SMOOTHING", "none"))
+
+# ONNX Runtime session profile ("default", "latency", "multi_stream",
+# "low_memory" or "auto"); cameras can override it in their init config
+ORT_PROFILE = str.lower(os.getenv("TRAFFIC_ORT_PROFILE", "default"))
+# Directory for serialized pre-optimized models; empty disables it
+ORT_OPTIMIZED_DIR = os.getenv("TRAFFIC_ORT_OPTIMIZED_DIR", "")
+# JSON file caching the "auto" thread layout per model and core count
+ORT_TUNE_CACHE = os.getenv("TRAFFIC_ORT_TUNE_CACHE", "")
+ORT_TUNE_RUNS = int(os.getenv("TRAFFIC_ORT_TUNE_RUNS", "10"))
+
+# Run the detector every N frames and let the tracker propagate boxes in
+# between; "auto" adapts N to scene density and CPU headroom
+DETECTION_STRIDE = str.lower(os.getenv("TRAFFIC_DETECTION_STRIDE", "1"))
+DETECTION_STRIDE_MAX = int(os.getenv("TRAFFIC_DETECTION_STRIDE_MAX", "4"))
+
+# Run the detector on the zone's bounding box (plus a margin, as a fraction
+# of its size) instead of the full frame
+ROI_CROP = str.lower(os.getenv("TRAFFIC_ROI_CROP", "false")) == "true"
+ROI_MARGIN = float(os.getenv("TRAFFIC_ROI_MARGIN", "0.1"))
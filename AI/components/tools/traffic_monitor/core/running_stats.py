@@ -0,0 +1,82 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+from collections import deque
+from typing import Dict, List, Optional, Sequence
+import math
+import random
+
+
+class RunningStats:
+    """Constant-memory summary of an unbounded stream of values.
+
+    Mean and variance use Welford's online update, percentiles come from a
+    fixed-size uniform reservoir sample, and the most recent values are kept
+    in a ring buffer.
+    """
+
+    def __init__(self, reservoir_size: int = 1024, recent_size: int = 100, seed: Optional[int] = None) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._reservoir_size = reservoir_size
+        self._reservoir: List[float] = []
+        self._recent: deque = deque(maxlen=recent_size)
+        self._rng = random.Random(seed)
+
+    def add(self, value: float) -> None:
+        self._recent.append(value)
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        if len(self._reservoir) < self._reservoir_size:
+            self._reservoir.append(value)
+        else:
+            j = self._rng.randrange(self.count)
+            if j < self._reservoir_size:
+                self._reservoir[j] = value
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    def recent(self) -> List[float]:
+        return list(self._recent)
+
+    def percentiles(self, qs: Sequence[float] = (50, 85, 95)) -> Dict[str, float]:
+        if not self._reservoir:
+            return {f"p{int(q)}": 0.0 for q in qs}
+        data = sorted(self._reservoir)
+        result = {}
+        for q in qs:
+            pos = (len(data) - 1) * q / 100.0
+            lo = int(math.floor(pos))
+            hi = min(lo + 1, len(data) - 1)
+            result[f"p{int(q)}"] = data[lo] + (data[hi] - data[lo]) * (pos - lo)
+        return result
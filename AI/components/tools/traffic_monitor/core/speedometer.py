@@ -14,17 +14,38 @@
 # limitations under the License.
 # -----------------------------------------------------------------------------
 import numpy as np
-from collections import defaultdict
-from numpy.typing import NDArray
+from collections import defaultdict, deque
+from numpy.typing import NDArray, ArrayLike
 from .cam_mapper import Cam2WorldMapper
 from ..config import MPS_TO_KPH
 
 class Speedometer:
-    def __init__(self, mapper: Cam2WorldMapper, fps: int, unit: float = MPS_TO_KPH) -> None:
+    def __init__(
+        self,
+        mapper: Cam2WorldMapper,
+        fps: int,
+        unit: float = MPS_TO_KPH,
+        history: int = 32,
+        window: int | None = None,
+        smoothing: str = "none",
+        ema_alpha: float = 0.3,
+        kalman_q: float = 1.0,
+        kalman_r: float = 16.0,
+    ) -> None:
         self._mapper = mapper
         self._fps = fps
         self._unit = unit
-        self._speeds: defaultdict[int, list[int]] = defaultdict(list)
+        # Same span as the trace used by update_with_trace (fps points).
+        self._window = window or max(1, int(fps) - 1)
+        self._smoothing = smoothing if smoothing in ("ema", "kalman") else "none"
+        self._ema_alpha = ema_alpha
+        self._kalman_q = kalman_q
+        self._kalman_r = kalman_r
+        # Only the latest estimates per track are kept; evict() drops a track.
+        self._speeds: defaultdict[int, deque[int]] = defaultdict(lambda: deque(maxlen=history))
+        self._last_world: dict[int, tuple[NDArray, int | None, float | None]] = {}
+        self._displacements: defaultdict[int, deque] = defaultdict(lambda: deque(maxlen=self._window))
+        self._filter_state: dict[int, tuple[float, float]] = {}
 
     @property
     def speeds(self):
@@ -38,5 +59,75 @@ class Speedometer:
         ds = np.linalg.norm((dx, dy))
         self._speeds[idx].append(int(ds * self._fps * self._unit))
 
+    def update_points(
+        self,
+        ids: ArrayLike,
+        image_points: ArrayLike,
+        frame_idx: int | None = None,
+        timestamp: float | None = None,
+    ) -> None:
+        """Incremental update from the newest image point of each track.
+
+        All points of the frame go through one perspective transform; each
+        track only keeps its last world point and a rolling window of
+        world-space velocities. ``timestamp`` (seconds) gives the true time
+        between two observations, so skipped or dropped frames do not skew
+        the speed; without it ``frame_idx`` spreads the displacement over the
+        frame gap at the nominal fps.
+        """
+        ids = np.asarray(ids).reshape(-1)
+        if len(ids) == 0:
+            return
+        world = self._mapper(image_points)
+        max_gap_s = self._window / float(self._fps)
+        for idx, pt in zip(ids.tolist(), world):
+            last = self._last_world.get(idx)
+            self._last_world[idx] = (pt, frame_idx, timestamp)
+            if last is None:
+                continue
+            last_pt, last_frame, last_ts = last
+            if timestamp is not None and last_ts is not None:
+                elapsed = timestamp - last_ts
+            else:
+                gap = 1 if frame_idx is None or last_frame is None else frame_idx - last_frame
+                elapsed = max(gap, 1) / float(self._fps)
+            window = self._displacements[idx]
+            if elapsed > max_gap_s:
+                window.clear()
+                continue
+            if elapsed <= 0:
+                continue
+            window.append(np.abs(pt - last_pt) / elapsed)
+            dx, dy = np.median(np.asarray(window), axis=0)
+            speed = float(np.hypot(dx, dy)) * self._unit
+            self._speeds[idx].append(int(self._smooth(idx, speed)))
+
+    def _smooth(self, idx: int, speed: float) -> float:
+        if self._smoothing == "ema":
+            prev = self._filter_state.get(idx)
+            value = speed if prev is None else prev[0] + self._ema_alpha * (speed - prev[0])
+            self._filter_state[idx] = (value, 0.0)
+            return value
+        if self._smoothing == "kalman":
+            # Scalar random-walk Kalman filter on the speed itself.
+            prev = self._filter_state.get(idx)
+            if prev is None:
+                self._filter_state[idx] = (speed, self._kalman_r)
+                return speed
+            x, p = prev
+            p += self._kalman_q
+            k = p / (p + self._kalman_r)
+            x += k * (speed - x)
+            self._filter_state[idx] = (x, (1.0 - k) * p)
+            return x
+        return speed
+
     def get_current_speed(self, idx: int) -> int:
-        return self._speeds[idx][-1] if self._speeds[idx] else 0
+        speeds = self._speeds.get(idx)
+        return speeds[-1] if speeds else 0
+
+    def evict(self, idx: int) -> None:
+        self._speeds.pop(idx, None)
+        self._last_world.pop(idx, None)
+        self._displacements.pop(idx, None)
+        self._filter_state.pop(idx, None)
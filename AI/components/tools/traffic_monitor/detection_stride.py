@@ -0,0 +1,129 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+from typing import Any, Dict, Optional, Union
+import math
+import os
+
+from .config import DETECTION_STRIDE, DETECTION_STRIDE_MAX
+
+
+def _host_load() -> float:
+    # One-minute load average per available core; 0 where unsupported.
+    try:
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+        return os.getloadavg()[0] / max(1, cores)
+    except (AttributeError, OSError):
+        return 0.0
+
+
+class DetectionStride:
+    """Decides on which frames a stream runs its detector.
+
+    A fixed stride runs the detector on every Nth frame. In ``auto`` mode N
+    is re-evaluated after every detection:
+
+    * the stream's own budget: N is at least the stride needed for the
+      average detector time to fit ``util_target`` of the frame interval;
+    * scene density: sparse scenes tolerate long propagation, so while the
+      host is busy N may grow up to ``max_stride`` with few tracks and
+      shrinks to 1 as the number of tracks approaches ``dense_tracks``;
+    * host headroom: while the host load per core is below ``busy_load``
+      only the stream's own budget applies and detection runs as often as
+      it can.
+
+    N moves by at most one step per detection so it does not oscillate.
+    Whenever a detection starts new tracks the next frame is detected as
+    well, so those tracks get a velocity before they have to be propagated.
+    """
+
+    def __init__(
+        self,
+        stride: Union[int, str, None] = None,
+        max_stride: int = DETECTION_STRIDE_MAX,
+        fps: float = 30.0,
+        sparse_tracks: int = 5,
+        dense_tracks: int = 30,
+        busy_load: float = 0.7,
+        util_target: float = 0.8,
+        ema_alpha: float = 0.2,
+    ) -> None:
+        stride = DETECTION_STRIDE if stride is None else stride
+        self.adaptive = str(stride).lower() == "auto"
+        self.max_stride = max(1, int(max_stride))
+        self.stride = 1 if self.adaptive else min(self.max_stride, max(1, int(stride)))
+        self.fps = float(fps) if fps else 30.0
+        self.sparse_tracks = sparse_tracks
+        self.dense_tracks = max(sparse_tracks + 1, dense_tracks)
+        self.busy_load = busy_load
+        self.util_target = util_target
+        self.ema_alpha = ema_alpha
+        self.detect_ms: Optional[float] = None
+        self.interval_ms: Optional[float] = None
+        self._countdown = 0
+        self.frames = 0
+        self.detections = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.adaptive or self.stride > 1
+
+    def should_detect(self) -> bool:
+        self.frames += 1
+        self._countdown -= 1
+        if self._countdown > 0:
+            return False
+        self._countdown = self.stride
+        self.detections += 1
+        return True
+
+    def observe_interval(self, interval_s: Optional[float]) -> None:
+        if interval_s is None or interval_s <= 0:
+            return
+        self.interval_ms = self._ema(self.interval_ms, interval_s * 1000.0)
+
+    def observe_detection(self, detect_ms: float, n_tracks: int, new_tracks: int = 0) -> None:
+        self.detect_ms = self._ema(self.detect_ms, detect_ms)
+        if new_tracks:
+            self._countdown = 1
+        if not self.adaptive:
+            return
+        target = self._target_stride(n_tracks)
+        if target > self.stride:
+            self.stride += 1
+        elif target < self.stride:
+            self.stride -= 1
+
+    def _ema(self, prev: Optional[float], value: float) -> float:
+        return value if prev is None else prev + self.ema_alpha * (value - prev)
+
+    def _target_stride(self, n_tracks: int) -> int:
+        interval_ms = self.interval_ms or 1000.0 / self.fps
+        needed = max(1, math.ceil(self.detect_ms / (interval_ms * self.util_target)))
+        if _host_load() < self.busy_load:
+            return min(self.max_stride, needed)
+        span = self.dense_tracks - self.sparse_tracks
+        density = min(1.0, max(0.0, (n_tracks - self.sparse_tracks) / span))
+        allowed = int(round(self.max_stride - density * (self.max_stride - 1)))
+        return min(self.max_stride, max(needed, allowed))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": "auto" if self.adaptive else "fixed",
+            "stride": self.stride,
+            "detect_ratio": round(self.detections / self.frames, 3) if self.frames else 0.0,
+            "avg_detect_ms": round(self.detect_ms, 2) if self.detect_ms is not None else None,
+            "frame_interval_ms": round(self.interval_ms, 2) if self.interval_ms is not None else None,
+        }
@@ -0,0 +1,199 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+from __future__ import annotations
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Dict, List, Optional, Tuple
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from components.logging.logger import setup_logger
+
+from .config import BATCH_INFER_TIMEOUT_S, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, ORT_PROFILE
+from .onnx_utils import (
+    _empty_detections,
+    decode_outputs,
+    load_onnx,
+    supports_batching,
+)
+
+logger = setup_logger("inference_server")
+
+
+class _InferenceRequest:
+    __slots__ = ("frame", "conf_thres", "future", "enqueued_at")
+
+    def __init__(self, frame: np.ndarray, conf_thres: float) -> None:
+        self.frame = frame
+        self.conf_thres = conf_thres
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchedInferenceServer:
+    """One ONNX session per model, shared by every stream.
+
+    Frames submitted from any stream are collected into micro-batches of at
+    most ``max_batch_size`` frames, waiting at most ``max_wait_ms`` after the
+    first frame arrives, and run as a single NCHW batch. Models exported with
+    a fixed batch dimension of 1 still share the session but run frame by
+    frame inside the batch.
+    """
+
+    def __init__(
+        self,
+        weights: str,
+        imgsz: Tuple[int, int] = (640, 640),
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+        profile: Optional[str] = None,
+    ) -> None:
+        self.weights = weights
+        self.imgsz = imgsz
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self.sess = load_onnx(weights, profile=profile, imgsz=imgsz)
+        self.input_name = self.sess.input_name
+        self.batched = supports_batching(self.sess)
+        # The worker thread is the only user of these buffers; every batch is
+        # letterboxed straight into a slice of one preallocated input tensor.
+        self._prep = self.sess.preprocess_context(imgsz)
+        batch_rows = self.max_batch_size if self.batched else 1
+        self._batch_input = np.empty(
+            (batch_rows,) + self._prep.tensor_shape[1:], dtype=self._prep.dtype
+        )
+
+        self._queue: "queue.Queue[_InferenceRequest]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._frames = 0
+        self._total_wait_ms = 0.0
+        self._total_run_ms = 0.0
+
+        self._thread = threading.Thread(
+            target=self._loop, name=f"inference-{os.path.basename(weights)}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, frame_bgr: np.ndarray, conf_thres: float = 0.4) -> Future:
+        req = _InferenceRequest(frame_bgr, conf_thres)
+        self._queue.put(req)
+        return req.future
+
+    def infer(self, frame_bgr: np.ndarray, conf_thres: float = 0.4, timeout: Optional[float] = BATCH_INFER_TIMEOUT_S):
+        try:
+            return self.submit(frame_bgr, conf_thres).result(timeout=timeout)
+        except FutureTimeout:
+            # A wedged session must not pin the caller's stage thread; the
+            # frame is reported with no detections and the stream moves on.
+            logger.warning("Batched inference on %s timed out after %.1fs", self.weights, timeout)
+            return _empty_detections()
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            batches = self._batches
+            return {
+                "weights": self.weights,
+                "ort_profile": self.sess.profile,
+                "batched_input": self.batched,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "queue_depth": self._queue.qsize(),
+                "batches": batches,
+                "frames": self._frames,
+                "avg_batch_size": round(self._frames / batches, 2) if batches else 0.0,
+                "avg_queue_wait_ms": round(self._total_wait_ms / self._frames, 2) if self._frames else 0.0,
+                "avg_batch_run_ms": round(self._total_run_ms / batches, 2) if batches else 0.0,
+            }
+
+    def _collect(self) -> List[_InferenceRequest]:
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                logger.exception("Batched inference error: %s", e)
+                for req in batch:
+                    if not req.future.done():
+                        req.future.set_result(_empty_detections())
+
+    def _run_batch(self, batch: List[_InferenceRequest]) -> None:
+        started = time.perf_counter()
+        n = len(batch)
+        with self._prep.lock:
+            if self.batched:
+                prepped = [
+                    self._prep(req.frame, out=self._batch_input[i:i + 1])[1:]
+                    for i, req in enumerate(batch)
+                ]
+                outs = self.sess.run(None, {self.input_name: self._batch_input[:n]})
+                per_frame = [[o[i:i + 1] for o in outs] for i in range(n)]
+            else:
+                prepped, per_frame = [], []
+                for req in batch:
+                    inp, r, pad_x, pad_y = self._prep(req.frame, out=self._batch_input)
+                    prepped.append((r, pad_x, pad_y))
+                    per_frame.append(self.sess.run(None, {self.input_name: inp}))
+
+        for req, (r, pad_x, pad_y), outs in zip(batch, prepped, per_frame):
+            req.future.set_result(
+                decode_outputs(outs, r, pad_x, pad_y, req.frame.shape, conf_thres=req.conf_thres)
+            )
+
+        finished = time.perf_counter()
+        with self._stats_lock:
+            self._batches += 1
+            self._frames += len(batch)
+            self._total_run_ms += (finished - started) * 1000.0
+            self._total_wait_ms += sum((started - req.enqueued_at) * 1000.0 for req in batch)
+
+
+_servers: Dict[Tuple[str, str], BatchedInferenceServer] = {}
+_servers_lock = threading.Lock()
+
+
+def get_inference_server(weights: str, profile: Optional[str] = None, **kwargs) -> BatchedInferenceServer:
+    key = (os.path.realpath(weights), str.lower(profile or ORT_PROFILE))
+    with _servers_lock:
+        server = _servers.get(key)
+        if server is None:
+            server = BatchedInferenceServer(weights, profile=profile, **kwargs)
+            _servers[key] = server
+        return server
+
+
+def list_inference_servers() -> List[Dict[str, float]]:
+    with _servers_lock:
+        servers = list(_servers.values())
+    return [s.get_stats() for s in servers]
@@ -0,0 +1,101 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+from typing import Tuple
+import numpy as np
+
+# State: (cx, cy, w, h, vcx, vcy, vw, vh), constant velocity per frame.
+_NDIM = 4
+_STD_POS = 1.0 / 20
+_STD_VEL = 1.0 / 160
+
+
+def xyxy_to_cxcywh(boxes: np.ndarray) -> np.ndarray:
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    wh = boxes[:, 2:4] - boxes[:, 0:2]
+    return np.concatenate([boxes[:, 0:2] + wh / 2.0, wh], axis=1)
+
+
+def cxcywh_to_xyxy(boxes: np.ndarray) -> np.ndarray:
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    half = boxes[:, 2:4] / 2.0
+    return np.concatenate([boxes[:, 0:2] - half, boxes[:, 0:2] + half], axis=1)
+
+
+class BoxKalmanFilter:
+    """Constant-velocity Kalman filter over many boxes at once.
+
+    Means are (N, 8) and covariances (N, 8, 8); every call works on the whole
+    batch so predicting all tracks of a frame is a handful of matrix ops.
+    Noise scales with box height as in SORT / ByteTrack.
+    """
+
+    def __init__(self) -> None:
+        self._update_mat = np.eye(_NDIM, 2 * _NDIM)
+
+    @staticmethod
+    def _motion_mat(dt: float) -> np.ndarray:
+        F = np.eye(2 * _NDIM)
+        F[:_NDIM, _NDIM:] = np.eye(_NDIM) * dt
+        return F
+
+    @staticmethod
+    def _scale(h: np.ndarray) -> np.ndarray:
+        return np.maximum(h, 1.0)
+
+    def initiate(self, measurements: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        z = np.asarray(measurements, dtype=float).reshape(-1, _NDIM)
+        mean = np.concatenate([z, np.zeros_like(z)], axis=1)
+        h = self._scale(z[:, 3])[:, None]
+        std = np.concatenate([
+            2 * _STD_POS * h * np.ones((1, _NDIM)),
+            10 * _STD_VEL * h * np.ones((1, _NDIM)),
+        ], axis=1)
+        cov = np.zeros((len(z), 2 * _NDIM, 2 * _NDIM))
+        idx = np.arange(2 * _NDIM)
+        cov[:, idx, idx] = std ** 2
+        return mean, cov
+
+    def predict(self, mean: np.ndarray, cov: np.ndarray, dt: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+        if len(mean) == 0:
+            return mean, cov
+        F = self._motion_mat(dt)
+        h = self._scale(mean[:, 3])[:, None]
+        std = np.concatenate([
+            _STD_POS * dt * h * np.ones((1, _NDIM)),
+            _STD_VEL * dt * h * np.ones((1, _NDIM)),
+        ], axis=1)
+        mean = mean @ F.T
+        cov = F @ cov @ F.T
+        idx = np.arange(2 * _NDIM)
+        cov[:, idx, idx] += std ** 2
+        return mean, cov
+
+    def update(self, mean: np.ndarray, cov: np.ndarray, measurements: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if len(mean) == 0:
+            return mean, cov
+        H = self._update_mat
+        z = np.asarray(measurements, dtype=float).reshape(-1, _NDIM)
+        h = self._scale(mean[:, 3])
+        r = (_STD_POS * h) ** 2
+        S = H @ cov @ H.T
+        idx = np.arange(_NDIM)
+        S[:, idx, idx] += r[:, None]
+        PHt = cov @ H.T                                   # (N, 8, 4)
+        K = np.linalg.solve(S, PHt.transpose(0, 2, 1)).transpose(0, 2, 1)
+        innovation = z - mean @ H.T
+        mean = mean + np.einsum("nij,nj->ni", K, innovation)
+        cov = cov - K @ H @ cov
+        return mean, cov
@@ -13,12 +13,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # -----------------------------------------------------------------------------
-from typing import Tuple
+from typing import Dict, Optional, Tuple
+import threading
 import numpy as np
 import cv2 as cv
-import onnxruntime as ort
 import traceback
 
+from .geometry import iou_matrix
+from .ort_profiles import create_session, get_profile
+
 def letterbox(img, new_shape=(640, 640), color=(114,114,114)):
     h0, w0 = img.shape[:2]
     r = min(new_shape[0] / h0, new_shape[1] / w0)
@@ -31,152 +34,236 @@ def letterbox(img, new_shape=(640, 640), color=(114,114,114)):
     img_padded = cv.copyMakeBorder(img_resized, top, bottom, left, right, cv.BORDER_CONSTANT, value=color)
     return img_padded, r, left, top
 
+class PreprocessContext:
+    """Reusable letterbox + tensor conversion for one session input shape.
+
+    The padded canvas, the channel planes and the model input tensor are
+    allocated once; each frame is resized into the canvas (directly when the
+    letterbox only pads rows, which is the case for landscape cameras) and
+    written into the tensor with the BGR->RGB swap, HWC->CHW layout and 1/255
+    scale fused per channel. Callers that share a context across threads must
+    hold ``lock`` while preprocessing; writing into ``thread_tensor()`` lets
+    them release it before inference.
+    """
+
+    _SCALE = np.float32(1.0 / 255.0)
+
+    def __init__(self, imgsz=(640, 640), nchw=True, need_uint8=False, color=(114,114,114)):
+        self.h, self.w = int(imgsz[0]), int(imgsz[1])
+        self.nchw = nchw
+        self.need_uint8 = need_uint8
+        self.color = color
+        self.dtype = np.uint8 if need_uint8 else np.float32
+        self.tensor_shape = (1, 3, self.h, self.w) if nchw else (1, self.h, self.w, 3)
+        self.tensor = np.empty(self.tensor_shape, dtype=self.dtype)
+        self.canvas = np.empty((self.h, self.w, 3), dtype=np.uint8)
+        self.planes = [np.empty((self.h, self.w), dtype=np.uint8) for _ in range(3)]
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._src_shape = None
+        self._resized = None
+        self._geometry = (1.0, 0, 0, 0, 0)
+
+    def _set_geometry(self, src_shape):
+        h0, w0 = src_shape
+        r = min(self.h / h0, self.w / w0)
+        nw, nh = int(round(w0 * r)), int(round(h0 * r))
+        left = int(round((self.w - nw) / 2 - 0.1))
+        top = int(round((self.h - nh) / 2 - 0.1))
+        self.canvas[:] = self.color
+        if nw == self.w:
+            # Full-width rows are contiguous, so resize can write in place.
+            self._resized = self.canvas[top:top + nh]
+        else:
+            self._resized = np.empty((nh, nw, 3), dtype=np.uint8)
+        self._geometry = (r, left, top, nw, nh)
+        self._src_shape = src_shape
+
+    def thread_tensor(self):
+        """Input tensor owned by the calling thread (allocated on first use)."""
+        tensor = getattr(self._local, "tensor", None)
+        if tensor is None:
+            tensor = self._local.tensor = np.empty(self.tensor_shape, dtype=self.dtype)
+        return tensor
+
+    def __call__(self, frame_bgr, out=None):
+        if frame_bgr.shape[:2] != self._src_shape:
+            self._set_geometry(frame_bgr.shape[:2])
+        r, left, top, nw, nh = self._geometry
+
+        cv.resize(frame_bgr, (nw, nh), dst=self._resized, interpolation=cv.INTER_LINEAR)
+        if nw != self.w:
+            self.canvas[top:top + nh, left:left + nw] = self._resized
+
+        out = self.tensor if out is None else out
+        if self.nchw:
+            cv.split(self.canvas, self.planes)
+            for c in range(3):
+                if self.need_uint8:
+                    np.copyto(out[0, c], self.planes[2 - c])
+                else:
+                    np.multiply(self.planes[2 - c], self._SCALE, out=out[0, c])
+        else:
+            if self.need_uint8:
+                cv.cvtColor(self.canvas, cv.COLOR_BGR2RGB, dst=out[0])
+            else:
+                np.multiply(self.canvas[:, :, ::-1], self._SCALE, out=out[0])
+        return out, r, left, top
+
+class OnnxSession:
+    """InferenceSession plus the input metadata the pipeline needs, read once."""
+
+    def __init__(self, sess, path: Optional[str] = None, profile: str = "default"):
+        self.sess = sess
+        self.path = path
+        self.profile = profile
+        input_meta = sess.get_inputs()[0]
+        self.input_name = input_meta.name
+        self.input_shape = input_meta.shape
+        self.input_type = getattr(input_meta, "type", None)
+
+        shape = self.input_shape
+        self.nchw = True
+        if isinstance(shape, (list, tuple)) and len(shape) == 4 and shape[3] == 3 and shape[1] != 3:
+            self.nchw = False
+        self.need_uint8 = self.input_type is not None and "uint8" in str(self.input_type).lower()
+        # Only a symbolic or unset leading dimension accepts a variable batch size.
+        self.batched = isinstance(shape, (list, tuple)) and len(shape) > 0 and not isinstance(shape[0], int)
+
+        self._contexts: Dict[Tuple[int, int], PreprocessContext] = {}
+        self._contexts_lock = threading.Lock()
+
+    def get_inputs(self):
+        return self.sess.get_inputs()
+
+    def get_outputs(self):
+        return self.sess.get_outputs()
+
+    def run(self, output_names, input_feed, run_options=None):
+        return self.sess.run(output_names, input_feed, run_options)
+
+    def preprocess_context(self, imgsz=(640, 640)) -> PreprocessContext:
+        key = (int(imgsz[0]), int(imgsz[1]))
+        with self._contexts_lock:
+            ctx = self._contexts.get(key)
+            if ctx is None:
+                ctx = PreprocessContext(key, nchw=self.nchw, need_uint8=self.need_uint8)
+                self._contexts[key] = ctx
+            return ctx
+
 def _nms(boxes, scores, iou_threshold=0.45):
     if boxes is None or len(boxes) == 0:
         return []
     boxes = boxes.astype(float)
-    x1 = boxes[:, 0]; y1 = boxes[:, 1]; x2 = boxes[:, 2]; y2 = boxes[:, 3]
-    areas = (x2 - x1) * (y2 - y1)
     order = scores.argsort()[::-1]
     keep = []
     while order.size > 0:
         i = order[0]
         keep.append(i)
-        xx1 = np.maximum(x1[i], x1[order[1:]])
-        yy1 = np.maximum(y1[i], y1[order[1:]])
-        xx2 = np.minimum(x2[i], x2[order[1:]])
-        yy2 = np.minimum(y2[i], y2[order[1:]])
-        w = np.maximum(0.0, xx2 - xx1)
-        h = np.maximum(0.0, yy2 - yy1)
-        inter = w * h
-        ovr = inter / (areas[i] + areas[order[1:]] - inter)
+        ovr = iou_matrix(boxes[i:i + 1], boxes[order[1:]])[0]
         inds = np.where(ovr <= iou_threshold)[0]
         order = order[inds + 1]
     return keep
 
-def load_onnx(path: str):
+def load_onnx(path: str, profile: Optional[str] = None, imgsz=(640, 640)):
     try:
-        sess = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
-        return sess
+        settings = get_profile(profile, model_path=path, imgsz=imgsz)
+        sess = create_session(path, settings)
+        return OnnxSession(sess, path, profile=settings["name"])
     except Exception as e:
         print(f"Failed to load ONNX model {path}: {e}")
         traceback.print_exc()
         raise
 
-def run_onnx(sess, frame_bgr, imgsz=(640,640), conf_thres=0.4):
-    if sess is None:
-        return np.zeros((0,4)), np.zeros((0,)), np.zeros((0,), dtype=int)
-
-    input_meta = sess.get_inputs()[0]
-    input_name = input_meta.name
-    input_shape = input_meta.shape
-    input_type = getattr(input_meta, "type", None)
-
-    img_padded, r, pad_x, pad_y = letterbox(frame_bgr, new_shape=imgsz)
-
-    shape = input_shape
-    nchw = True
-    if isinstance(shape, (list, tuple)):
-        if len(shape) == 4 and shape[1] == 3:
-            nchw = True
-        elif len(shape) == 4 and shape[3] == 3:
-            nchw = False
-        else:
-            nchw = True
-    else:
-        nchw = True
+def _empty_detections():
+    return np.zeros((0,4)), np.zeros((0,)), np.zeros((0,), dtype=int)
+
+def _batched_nms(boxes, scores, classes, iou_threshold=0.45):
+    # Class-aware NMS in a single pass: shift every class into its own
+    # coordinate range so boxes of different classes never overlap.
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0,), dtype=int)
+    offsets = classes.astype(float) * (float(boxes.max()) + 1.0)
+    keep = _nms(boxes + offsets[:, None], scores, iou_threshold=iou_threshold)
+    return np.asarray(keep, dtype=int)
+
+def _scale_boxes(boxes, r, pad_x, pad_y, frame_shape):
+    boxes = np.array(boxes, dtype=float)
+    boxes[:, 0::2] -= pad_x
+    boxes[:, 1::2] -= pad_y
+    boxes /= r
+    h, w = frame_shape[:2]
+    np.clip(boxes[:, 0::2], 0.0, w - 1, out=boxes[:, 0::2])
+    np.clip(boxes[:, 1::2], 0.0, h - 1, out=boxes[:, 1::2])
+    return boxes
 
-    need_uint8 = False
-    if input_type is not None and "uint8" in str(input_type).lower():
-        need_uint8 = True
+def _decode_nms_head(outs, conf_thres):
+    num_dets = int(np.asarray(outs[0]).reshape(-1)[0]) if outs[0].size > 0 else 0
+    boxes = np.asarray(outs[1][0][:num_dets], dtype=float)
+    scores = np.asarray(outs[2][0][:num_dets], dtype=float)
+    classes = np.asarray(outs[3][0][:num_dets]).astype(int)
+    mask = scores >= conf_thres
+    return boxes[mask], scores[mask], classes[mask]
 
-    img_rgb = cv.cvtColor(img_padded, cv.COLOR_BGR2RGB)
+def _decode_raw_head(outs, conf_thres):
+    out = np.asarray(outs[0])
+    if out.ndim == 3:
+        out = out[0]
+    if out.size == 0:
+        return None
+    if out.ndim == 2 and out.shape[0] < out.shape[1] and out.shape[0] < 100:
+        out = out.T
+    if out.shape[1] < 5:
+        print(f"ERROR: Each detection has only {out.shape[1]} elements, need at least 5")
+        return None
 
-    if need_uint8:
-        inp = img_rgb.astype(np.uint8)
+    conf = out[:, 4].astype(float)
+    if out.shape[1] > 5:
+        cls_probs = out[:, 5:]
+        classes = np.argmax(cls_probs, axis=1)
+        scores = conf * cls_probs[np.arange(len(out)), classes]
     else:
-        inp = img_rgb.astype(np.float32) / 255.0
+        classes = np.zeros((len(out),), dtype=int)
+        scores = conf
 
-    if nchw:
-        inp = np.transpose(inp, (2,0,1))
-    inp = np.expand_dims(inp, axis=0)
+    mask = scores >= conf_thres
+    xywh = out[mask, :4].astype(float)
+    half_wh = xywh[:, 2:4] / 2.0
+    boxes = np.concatenate([xywh[:, :2] - half_wh, xywh[:, :2] + half_wh], axis=1)
+    return boxes, scores[mask].astype(float), classes[mask].astype(int)
 
-    if need_uint8:
-        inp = inp.astype(np.uint8)
+def decode_outputs(outs, r, pad_x, pad_y, frame_shape, conf_thres=0.4, iou_threshold=0.45):
+    if len(outs) == 4:
+        decoded = _decode_nms_head(outs, conf_thres)
     else:
-        inp = inp.astype(np.float32)
+        decoded = _decode_raw_head(outs, conf_thres)
+    if decoded is None or len(decoded[0]) == 0:
+        return _empty_detections()
+
+    boxes, scores, classes = decoded
+    boxes = _scale_boxes(boxes, r, pad_x, pad_y, frame_shape)
+    keep = _batched_nms(boxes, scores, classes, iou_threshold=iou_threshold)
+    if len(keep) == 0:
+        return _empty_detections()
+    return boxes[keep], scores[keep], classes[keep]
+
+def supports_batching(sess) -> bool:
+    return bool(getattr(sess, "batched", False))
 
+def run_onnx(sess, frame_bgr, imgsz=(640,640), conf_thres=0.4):
+    if sess is None:
+        return _empty_detections()
+
+    ctx = sess.preprocess_context(imgsz)
+    # Only the shared canvas needs the lock; the tensor is this thread's own,
+    # so streams sharing the session run inference concurrently.
+    with ctx.lock:
+        inp, r, pad_x, pad_y = ctx(frame_bgr, out=ctx.thread_tensor())
     try:
-        outs = sess.run(None, {input_name: inp})
+        outs = sess.run(None, {sess.input_name: inp})
     except Exception as e:
         print(f"ONNX runtime inference error: {e}")
         traceback.print_exc()
-        return np.zeros((0,4)), np.zeros((0,)), np.zeros((0,), dtype=int)
+        return _empty_detections()
 
-    if len(outs) == 4:
-        num_dets = int(outs[0][0][0]) if outs[0].size > 0 else 0
-        boxes_raw = outs[1][0][:num_dets]
-        scores_raw = outs[2][0][:num_dets]
-        classes_raw = outs[3][0][:num_dets]
-        boxes, scores, classes = [], [], []
-        for i in range(num_dets):
-            score = float(scores_raw[i])
-            if score < conf_thres: continue
-            x1, y1, x2, y2 = boxes_raw[i]
-            x1 = (x1 - pad_x) / r
-            y1 = (y1 - pad_y) / r
-            x2 = (x2 - pad_x) / r
-            y2 = (y2 - pad_y) / r
-            x1 = max(0.0, min(x1, frame_bgr.shape[1]-1))
-            x2 = max(0.0, min(x2, frame_bgr.shape[1]-1))
-            y1 = max(0.0, min(y1, frame_bgr.shape[0]-1))
-            y2 = max(0.0, min(y2, frame_bgr.shape[0]-1))
-            boxes.append([x1,y1,x2,y2]); scores.append(score); classes.append(int(classes_raw[i]))
-        if len(boxes) == 0: return np.zeros((0,4)), np.zeros((0,)), np.zeros((0,), dtype=int)
-        boxes = np.array(boxes, dtype=float); scores = np.array(scores, dtype=float); classes = np.array(classes, dtype=int)
-        keep = _nms(boxes, scores, iou_threshold=0.45)
-        if len(keep) == 0: return np.zeros((0,4)), np.zeros((0,)), np.zeros((0,), dtype=int)
-        return boxes[keep], scores[keep], classes[keep]
-    else:
-        out = np.array(outs[0])
-        if out.ndim == 3:
-            out = out[0]
-        if out.size == 0:
-            return np.zeros((0,4)), np.zeros((0,)), np.zeros((0,), dtype=int)
-        if out.ndim == 2 and out.shape[0] < out.shape[1] and out.shape[0] < 100:
-            out = out.T
-        if out.shape[1] < 5:
-            print(f"ERROR: Each detection has only {out.shape[1]} elements, need at least 5")
-            return np.zeros((0,4)), np.zeros((0,)), np.zeros((0,), dtype=int)
-        boxes, scores, classes = [], [], []
-        for det in out:
-            if len(det) < 5: continue
-            x, y, w, h = float(det[0]), float(det[1]), float(det[2]), float(det[3])
-            conf = float(det[4])
-            if len(det) > 5:
-                cls_probs = det[5:]
-                cls = int(np.argmax(cls_probs))
-                try:
-                    score = float(conf * float(cls_probs[cls]))
-                except Exception:
-                    score = conf
-            else:
-                cls = 0; score = conf
-            if score >= conf_thres:
-                x1 = x - w/2.0 - pad_x
-                y1 = y - h/2.0 - pad_y
-                x2 = x + w/2.0 - pad_x
-                y2 = y + h/2.0 - pad_y
-                x1 /= r; y1 /= r; x2 /= r; y2 /= r
-                x1 = max(0.0, min(x1, frame_bgr.shape[1]-1))
-                x2 = max(0.0, min(x2, frame_bgr.shape[1]-1))
-                y1 = max(0.0, min(y1, frame_bgr.shape[0]-1))
-                y2 = max(0.0, min(y2, frame_bgr.shape[0]-1))
-                boxes.append([x1,y1,x2,y2]); scores.append(score); classes.append(cls)
-        if len(boxes) == 0:
-            return np.zeros((0,4)), np.zeros((0,)), np.zeros((0,), dtype=int)
-        boxes = np.array(boxes, dtype=float); scores = np.array(scores, dtype=float); classes = np.array(classes, dtype=int)
-        keep = _nms(boxes, scores, iou_threshold=0.45)
-        if len(keep) == 0:
-            return np.zeros((0,4)), np.zeros((0,)), np.zeros((0,), dtype=int)
-        return boxes[keep], scores[keep], classes[keep]
\ No newline at end of file
+    return decode_outputs(outs, r, pad_x, pad_y, frame_bgr.shape, conf_thres=conf_thres)
@@ -0,0 +1,293 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import onnxruntime as ort
+
+from .config import ORT_OPTIMIZED_DIR, ORT_PROFILE, ORT_TUNE_CACHE, ORT_TUNE_RUNS
+
+_OPT_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+_EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def _cpu_count() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+# Thread counts of 0 leave the choice to ONNX Runtime. "default" keeps the
+# runtime's own settings; the others trade latency, aggregate throughput
+# across many camera streams and resident memory against each other.
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "latency": {
+        "graph_optimization": "all",
+        "intra_op_threads": 0,
+        "inter_op_threads": 1,
+        "execution_mode": "sequential",
+        "cpu_mem_arena": True,
+        "mem_pattern": True,
+        "optimized_model": True,
+    },
+    "multi_stream": {
+        # Many streams already run frames concurrently on the executor, so
+        # each session stays single-threaded to avoid oversubscription.
+        "graph_optimization": "all",
+        "intra_op_threads": 1,
+        "inter_op_threads": 1,
+        "execution_mode": "sequential",
+        "cpu_mem_arena": True,
+        "mem_pattern": True,
+        "allow_spinning": False,
+        "optimized_model": True,
+    },
+    "low_memory": {
+        "graph_optimization": "extended",
+        "intra_op_threads": 2,
+        "inter_op_threads": 1,
+        "execution_mode": "sequential",
+        "cpu_mem_arena": False,
+        "mem_pattern": False,
+        "allow_spinning": False,
+        "optimized_model": True,
+    },
+    "auto": {
+        # Thread layout is filled in by autotune_thread_layout on first use.
+        "graph_optimization": "all",
+        "execution_mode": "sequential",
+        "cpu_mem_arena": True,
+        "mem_pattern": True,
+        "optimized_model": True,
+        "autotune": True,
+    },
+}
+
+_tune_lock = threading.Lock()
+_tuned: Dict[str, Dict[str, Any]] = {}
+
+
+def get_profile(name: Optional[str] = None, model_path: Optional[str] = None,
+                imgsz: Tuple[int, int] = (640, 640)) -> Dict[str, Any]:
+    name = str.lower(name or ORT_PROFILE)
+    if name not in PROFILES:
+        print(f"Unknown ONNX Runtime profile '{name}', using 'default'")
+        name = "default"
+    settings = dict(PROFILES[name])
+    if settings.pop("autotune", False) and model_path:
+        settings.update(autotune_thread_layout(model_path, imgsz=imgsz)["best"])
+    settings["name"] = name
+    return settings
+
+
+def session_options(settings: Dict[str, Any]) -> ort.SessionOptions:
+    so = ort.SessionOptions()
+    if "graph_optimization" in settings:
+        so.graph_optimization_level = _OPT_LEVELS[settings["graph_optimization"]]
+    if settings.get("intra_op_threads"):
+        so.intra_op_num_threads = int(settings["intra_op_threads"])
+    if settings.get("inter_op_threads"):
+        so.inter_op_num_threads = int(settings["inter_op_threads"])
+    if "execution_mode" in settings:
+        so.execution_mode = _EXECUTION_MODES[settings["execution_mode"]]
+    if "cpu_mem_arena" in settings:
+        so.enable_cpu_mem_arena = bool(settings["cpu_mem_arena"])
+    if "mem_pattern" in settings:
+        so.enable_mem_pattern = bool(settings["mem_pattern"])
+    if "allow_spinning" in settings:
+        so.add_session_config_entry(
+            "session.intra_op.allow_spinning", "1" if settings["allow_spinning"] else "0"
+        )
+    return so
+
+
+def optimized_model_path(model_path: str, settings: Dict[str, Any],
+                         cache_dir: Optional[str] = None) -> Optional[str]:
+    cache_dir = ORT_OPTIMIZED_DIR if cache_dir is None else cache_dir
+    if not cache_dir or not settings.get("optimized_model") or "graph_optimization" not in settings:
+        return None
+    # Keyed on the source file's identity, so two models sharing a basename
+    # never load each other's graph and a replaced model gets a fresh file.
+    real = os.path.realpath(model_path)
+    st = os.stat(real)
+    digest = hashlib.sha1(f"{real}\0{st.st_size}\0{st.st_mtime_ns}".encode("utf-8")).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(cache_dir, f"{stem}.{digest}.{settings['graph_optimization']}.opt.onnx")
+
+
+def create_session(model_path: str, settings: Dict[str, Any],
+                   providers: Optional[List[str]] = None) -> ort.InferenceSession:
+    """Build an InferenceSession for ``settings``.
+
+    When an optimized-model directory is configured the graph optimized on
+    the first start is serialized there and later starts load it with graph
+    optimization disabled. The file name changes with the source model's
+    path, size and mtime, so an edited model is re-optimized. Files optimized
+    at level "all" may contain host-specific kernels, so the directory should
+    not be shared between machines.
+    """
+    providers = providers or ["CPUExecutionProvider"]
+    so = session_options(settings)
+    opt_path = optimized_model_path(model_path, settings)
+    if opt_path is None:
+        return ort.InferenceSession(model_path, sess_options=so, providers=providers)
+
+    if os.path.exists(opt_path):
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return ort.InferenceSession(opt_path, sess_options=so, providers=providers)
+        except Exception as e:
+            print(f"Ignoring unusable optimized model {opt_path}: {e}")
+            so = session_options(settings)
+
+    os.makedirs(os.path.dirname(opt_path) or ".", exist_ok=True)
+    # Streams starting together each write their own file and rename it into
+    # place, so a reader never opens a half-written graph.
+    tmp_path = f"{opt_path}.{os.getpid()}.{threading.get_ident()}.tmp.onnx"
+    so.optimized_model_filepath = tmp_path
+    try:
+        sess = ort.InferenceSession(model_path, sess_options=so, providers=providers)
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, opt_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return sess
+
+
+def _dummy_input(sess: ort.InferenceSession, imgsz: Tuple[int, int]) -> Dict[str, np.ndarray]:
+    meta = sess.get_inputs()[0]
+    shape = list(meta.shape)
+    if len(shape) == 4:
+        nhwc = shape[3] == 3 and shape[1] != 3
+        fallback = [1, imgsz[0], imgsz[1], 3] if nhwc else [1, 3, imgsz[0], imgsz[1]]
+    else:
+        fallback = [1] * len(shape)
+    shape = [d if isinstance(d, int) and d > 0 else f for d, f in zip(shape, fallback)]
+    dtype = np.uint8 if "uint8" in str(meta.type).lower() else np.float32
+    return {meta.name: np.zeros(shape, dtype=dtype)}
+
+
+def thread_layouts(cores: Optional[int] = None) -> List[Dict[str, Any]]:
+    cores = cores or _cpu_count()
+    intra = sorted({1, max(1, cores // 4), max(1, cores // 2), cores})
+    layouts = [
+        {"intra_op_threads": n, "inter_op_threads": 1, "execution_mode": "sequential"}
+        for n in intra
+    ]
+    if cores >= 4:
+        layouts.append({
+            "intra_op_threads": max(1, cores // 2),
+            "inter_op_threads": 2,
+            "execution_mode": "parallel",
+        })
+    return layouts
+
+
+def benchmark_layout(model_path: str, layout: Dict[str, Any], imgsz: Tuple[int, int] = (640, 640),
+                     runs: int = ORT_TUNE_RUNS, warmup: int = 2) -> Dict[str, float]:
+    settings = dict(PROFILES["latency"], **layout)
+    settings["optimized_model"] = False
+    sess = create_session(model_path, settings)
+    feed = _dummy_input(sess, imgsz)
+    for _ in range(warmup):
+        sess.run(None, feed)
+    times = []
+    for _ in range(max(1, runs)):
+        t0 = time.perf_counter()
+        sess.run(None, feed)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    return {
+        "median_ms": round(float(np.median(times)), 3),
+        "p95_ms": round(float(np.percentile(times, 95)), 3),
+    }
+
+
+def _load_tune_cache() -> Dict[str, Any]:
+    if not ORT_TUNE_CACHE or not os.path.exists(ORT_TUNE_CACHE):
+        return {}
+    try:
+        with open(ORT_TUNE_CACHE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Failed to read ONNX Runtime tune cache {ORT_TUNE_CACHE}: {e}")
+        return {}
+
+
+def _save_tune_cache(cache: Dict[str, Any]) -> None:
+    if not ORT_TUNE_CACHE:
+        return
+    try:
+        os.makedirs(os.path.dirname(ORT_TUNE_CACHE) or ".", exist_ok=True)
+        with open(ORT_TUNE_CACHE, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+    except Exception as e:
+        print(f"Failed to write ONNX Runtime tune cache {ORT_TUNE_CACHE}: {e}")
+
+
+def autotune_thread_layout(model_path: str, imgsz: Tuple[int, int] = (640, 640),
+                           runs: int = ORT_TUNE_RUNS, force: bool = False) -> Dict[str, Any]:
+    """Time each candidate thread layout for this host and keep the fastest.
+
+    Results are memoized per model, input size and core count for the life
+    of the process, and persisted to ``TRAFFIC_ORT_TUNE_CACHE`` when set so
+    restarts on the same host skip the benchmark.
+    """
+    cores = _cpu_count()
+    key = f"{os.path.realpath(model_path)}|{imgsz[0]}x{imgsz[1]}|{cores}"
+    with _tune_lock:
+        if not force:
+            if key in _tuned:
+                return _tuned[key]
+            cached = _load_tune_cache().get(key)
+            if cached:
+                _tuned[key] = cached
+                return cached
+
+        results = []
+        for layout in thread_layouts(cores):
+            try:
+                results.append(dict(layout, **benchmark_layout(model_path, layout, imgsz, runs)))
+            except Exception as e:
+                print(f"Thread layout {layout} failed: {e}")
+        if not results:
+            best = {"intra_op_threads": 0, "inter_op_threads": 1, "execution_mode": "sequential"}
+        else:
+            fastest = min(results, key=lambda r: r["median_ms"])
+            best = {k: fastest[k] for k in ("intra_op_threads", "inter_op_threads", "execution_mode")}
+        tuned = {"cores": cores, "best": best, "results": results}
+        print(f"ONNX Runtime thread layout for {os.path.basename(model_path)} on {cores} cores: {best}")
+
+        _tuned[key] = tuned
+        cache = _load_tune_cache()
+        cache[key] = tuned
+        _save_tune_cache(cache)
+        return tuned
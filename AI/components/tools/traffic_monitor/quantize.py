@@ -0,0 +1,248 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+"""Offline INT8 quantization of the traffic detector.
+
+Produces a dynamic or static INT8 variant of an ONNX detector. Static
+quantization is calibrated on frames sampled evenly from our camera videos
+and letterboxed exactly like ``run_onnx`` does at runtime. FP16 exports are
+widened to FP32 first, since the quantizer (and the CPU execution provider)
+work on FP32 graphs. Only Conv/MatMul are quantized by default so the
+decode head stays in float.
+
+    python -m components.tools.traffic_monitor.quantize \\
+        --weights models/yolo_nas_s_fp16.onnx --out models/yolo_nas_s_int8.onnx \\
+        --mode static --videos videos/cam1.mp4 videos/cam2.mp4 --frames 200
+
+The result is a drop-in model: point a camera's ``yolo_weights`` at it.
+Use ``benchmarks/compare_detectors.py`` to check accuracy drift and latency
+before switching.
+"""
+from typing import Iterator, List, Optional, Sequence
+import argparse
+import os
+import tempfile
+
+import cv2 as cv
+import numpy as np
+import onnxruntime as ort
+
+from .onnx_utils import OnnxSession
+
+DEFAULT_OP_TYPES = ["Conv", "MatMul"]
+
+
+def _require_onnx():
+    try:
+        import onnx
+        from onnxruntime import quantization
+    except ImportError as e:
+        raise RuntimeError("INT8 quantization needs the 'onnx' package: pip install onnx") from e
+    return onnx, quantization
+
+
+def _widen_graph(graph, onnx) -> int:
+    from onnx import numpy_helper, TensorProto
+
+    changed = 0
+    for i, init in enumerate(graph.initializer):
+        if init.data_type == TensorProto.FLOAT16:
+            arr = numpy_helper.to_array(init).astype(np.float32)
+            graph.initializer[i].CopyFrom(numpy_helper.from_array(arr, init.name))
+            changed += 1
+
+    for vi in list(graph.input) + list(graph.output) + list(graph.value_info):
+        tt = vi.type.tensor_type
+        if tt.elem_type == TensorProto.FLOAT16:
+            tt.elem_type = TensorProto.FLOAT
+            changed += 1
+
+    for node in graph.node:
+        for attr in node.attribute:
+            if node.op_type == "Cast" and attr.name == "to" and attr.i == TensorProto.FLOAT16:
+                attr.i = TensorProto.FLOAT
+                changed += 1
+            elif attr.type == onnx.AttributeProto.TENSOR and attr.t.data_type == TensorProto.FLOAT16:
+                arr = numpy_helper.to_array(attr.t).astype(np.float32)
+                attr.t.CopyFrom(numpy_helper.from_array(arr, attr.t.name))
+                changed += 1
+            elif attr.type == onnx.AttributeProto.GRAPH:
+                changed += _widen_graph(attr.g, onnx)
+            elif attr.type == onnx.AttributeProto.GRAPHS:
+                for g in attr.graphs:
+                    changed += _widen_graph(g, onnx)
+    return changed
+
+
+def fp16_to_fp32(src: str, dst: str) -> bool:
+    """Rewrite every FP16 tensor, Cast target and value type in ``src`` as FP32.
+
+    Returns False (and writes nothing) when the model has no FP16 content.
+    """
+    onnx, _ = _require_onnx()
+    model = onnx.load(src)
+    if _widen_graph(model.graph, onnx) == 0:
+        return False
+    onnx.save(model, dst)
+    return True
+
+
+def sample_frames(videos: Sequence[str], n_frames: int) -> Iterator[np.ndarray]:
+    """Yield ``n_frames`` BGR frames spread evenly across ``videos``."""
+    per_video = max(1, n_frames // max(1, len(videos)))
+    for path in videos:
+        cap = cv.VideoCapture(path)
+        if not cap.isOpened():
+            print(f"Cannot open calibration video {path}")
+            continue
+        total = int(cap.get(cv.CAP_PROP_FRAME_COUNT)) or per_video
+        wanted = set(np.linspace(0, max(0, total - 1), num=min(per_video, total), dtype=int).tolist())
+        idx = 0
+        while wanted:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if idx in wanted:
+                wanted.discard(idx)
+                yield frame
+            idx += 1
+        cap.release()
+
+
+def _calibration_reader(model_path: str, videos: Sequence[str], n_frames: int, imgsz, quantization):
+    sess = OnnxSession(ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]), model_path)
+    ctx = sess.preprocess_context(imgsz)
+
+    class FrameCalibrationReader(quantization.CalibrationDataReader):
+        def __init__(self):
+            self.count = 0
+            self._frames = sample_frames(videos, n_frames)
+
+        def get_next(self):
+            frame = next(self._frames, None)
+            if frame is None:
+                return None
+            self.count += 1
+            # The context reuses its tensor, so hand the calibrator a copy.
+            tensor = ctx(frame)[0].copy()
+            return {sess.input_name: tensor}
+
+    return FrameCalibrationReader()
+
+
+def quantize_detector(
+    weights: str,
+    out: str,
+    mode: str = "static",
+    videos: Optional[Sequence[str]] = None,
+    n_frames: int = 200,
+    imgsz=(640, 640),
+    op_types: Optional[List[str]] = None,
+    exclude_nodes: Optional[List[str]] = None,
+    per_channel: bool = True,
+    calibrate_method: str = "minmax",
+    preprocess: bool = True,
+) -> str:
+    onnx, quantization = _require_onnx()
+    op_types = op_types or DEFAULT_OP_TYPES
+    if mode == "static" and not videos:
+        raise ValueError("Static quantization needs calibration videos")
+
+    with tempfile.TemporaryDirectory(prefix="quantize-") as tmp:
+        src = weights
+        fp32 = os.path.join(tmp, "fp32.onnx")
+        if fp16_to_fp32(src, fp32):
+            print(f"Widened FP16 tensors of {weights} to FP32")
+            src = fp32
+
+        if preprocess:
+            prepped = os.path.join(tmp, "prepped.onnx")
+            for skip_symbolic in (False, True):
+                try:
+                    quantization.quant_pre_process(src, prepped, skip_symbolic_shape=skip_symbolic)
+                    src = prepped
+                    break
+                except Exception as e:
+                    print(f"Quantization pre-processing failed (skip_symbolic_shape={skip_symbolic}): {e}")
+
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        if mode == "dynamic":
+            quantization.quantize_dynamic(
+                src,
+                out,
+                op_types_to_quantize=op_types,
+                nodes_to_exclude=exclude_nodes or [],
+                per_channel=per_channel,
+                weight_type=quantization.QuantType.QInt8,
+            )
+        elif mode == "static":
+            methods = {
+                "minmax": quantization.CalibrationMethod.MinMax,
+                "entropy": quantization.CalibrationMethod.Entropy,
+                "percentile": quantization.CalibrationMethod.Percentile,
+            }
+            reader = _calibration_reader(src, videos, n_frames, imgsz, quantization)
+            quantization.quantize_static(
+                src,
+                out,
+                reader,
+                quant_format=quantization.QuantFormat.QDQ,
+                op_types_to_quantize=op_types,
+                nodes_to_exclude=exclude_nodes or [],
+                per_channel=per_channel,
+                activation_type=quantization.QuantType.QUInt8,
+                weight_type=quantization.QuantType.QInt8,
+                calibrate_method=methods[calibrate_method],
+            )
+            print(f"Calibrated on {reader.count} frames")
+        else:
+            raise ValueError(f"Unknown quantization mode '{mode}'")
+
+    print(f"Wrote {mode} INT8 model to {out}")
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weights", required=True)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--videos", nargs="*", default=[])
+    parser.add_argument("--frames", type=int, default=200, help="calibration frames in total")
+    parser.add_argument("--imgsz", type=int, nargs=2, default=[640, 640])
+    parser.add_argument("--op-types", nargs="+", default=DEFAULT_OP_TYPES)
+    parser.add_argument("--exclude-nodes", nargs="*", default=[])
+    parser.add_argument("--per-tensor", action="store_true", help="disable per-channel weight scales")
+    parser.add_argument("--calibrate-method", choices=["minmax", "entropy", "percentile"], default="minmax")
+    parser.add_argument("--no-preprocess", action="store_true", help="skip shape inference and graph cleanup")
+    args = parser.parse_args()
+
+    quantize_detector(
+        args.weights,
+        args.out,
+        mode=args.mode,
+        videos=args.videos,
+        n_frames=args.frames,
+        imgsz=tuple(args.imgsz),
+        op_types=args.op_types,
+        exclude_nodes=args.exclude_nodes,
+        per_channel=not args.per_tensor,
+        calibrate_method=args.calibrate_method,
+        preprocess=not args.no_preprocess,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # -----------------------------------------------------------------------------
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import numpy as np
 
+from .geometry import iou_matrix
+
 class SimpleTracker:
     def __init__(self, iou_threshold: float = 0.3, max_lost: int = 5):
         self.next_id = 0
@@ -23,33 +25,66 @@ class SimpleTracker:
         self.lost = {}      # id -> lost frames
         self.iou_thr = iou_threshold
         self.max_lost = max_lost
+        self.removed_ids: List[int] = []
+        # Constant-velocity state used only by propagate(): last detected box,
+        # box velocity per frame and frames elapsed since that detection.
+        self._measured = {}
+        self._velocity = {}
+        self._elapsed = {}
+
+    def propagate(self, dt: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+        """Move tracks seen at the last update along their box velocity.
+
+        Used on frames where the detector is skipped; returns the ids and
+        boxes of those tracks.
+        """
+        ids, boxes = [], []
+        for tid, box in self.tracks.items():
+            if self.lost.get(tid, 0) != 0:
+                continue
+            self._elapsed[tid] = self._elapsed.get(tid, 0.0) + dt
+            vel = self._velocity.get(tid)
+            if vel is not None:
+                box = tuple(np.asarray(box, dtype=float) + vel * dt)
+                self.tracks[tid] = box
+            ids.append(tid)
+            boxes.append(box)
+        return np.array(ids, dtype=int), np.array(boxes, dtype=float).reshape(-1, 4)
 
-    def _iou(self, boxA, boxB):
-        xA = max(boxA[0], boxB[0]); yA = max(boxA[1], boxB[1])
-        xB = min(boxA[2], boxB[2]); yB = min(boxA[3], boxB[3])
-        if xB <= xA or yB <= yA:
-            return 0.0
-        inter = (xB - xA) * (yB - yA)
-        boxAArea = max(0.0, (boxA[2] - boxA[0]) * (boxA[3] - boxA[1]))
-        boxBArea = max(0.0, (boxB[2] - boxB[0]) * (boxB[3] - boxB[1]))
-        den = (boxAArea + boxBArea - inter)
-        return inter / den if den > 0 else 0.0
+    def _measure(self, tid, box, dt):
+        prev = self._measured.get(tid)
+        elapsed = self._elapsed.get(tid, 0.0) + dt
+        if prev is not None and elapsed > 0:
+            self._velocity[tid] = (np.asarray(box, dtype=float) - prev) / elapsed
+        self._measured[tid] = np.asarray(box, dtype=float)
+        self._elapsed[tid] = 0.0
 
-    def update(self, boxes: np.ndarray) -> np.ndarray:
+    def _forget(self, tid):
+        self._measured.pop(tid, None)
+        self._velocity.pop(tid, None)
+        self._elapsed.pop(tid, None)
+
+    def update(self, boxes: np.ndarray, scores: Optional[np.ndarray] = None, dt: float = 1.0) -> np.ndarray:
         assigned = {}
         used_track_ids = set()
+        self.removed_ids = []
         boxes_list = [tuple(b) for b in boxes]
 
-        for tid, tbox in list(self.tracks.items()):
-            best_iou = 0.0; best_j = None
-            for j, bbox in enumerate(boxes_list):
-                if j in assigned:
-                    continue
-                iou = self._iou(tbox, bbox)
-                if iou > best_iou:
-                    best_iou = iou; best_j = j
-            if best_j is not None and best_iou >= self.iou_thr:
+        track_ids = list(self.tracks.keys())
+        ious = iou_matrix([self.tracks[tid] for tid in track_ids], boxes_list)
+        taken = np.zeros(len(boxes_list), dtype=bool)
+
+        # Greedy in track order on a precomputed IoU matrix.
+        for row, tid in enumerate(track_ids):
+            if taken.all():
+                break
+            cand = np.where(taken, 0.0, ious[row])
+            best_j = int(np.argmax(cand))
+            best_iou = cand[best_j]
+            if best_iou > 0.0 and best_iou >= self.iou_thr:
                 assigned[best_j] = tid
+                taken[best_j] = True
+                self._measure(tid, boxes_list[best_j], dt)
                 self.tracks[tid] = boxes_list[best_j]
                 self.lost[tid] = 0
                 used_track_ids.add(tid)
@@ -60,14 +95,19 @@ class SimpleTracker:
                 self.next_id += 1
                 self.tracks[tid] = bbox
                 self.lost[tid] = 0
+                self._measure(tid, bbox, dt)
                 assigned[j] = tid
 
+        assigned_ids = set(assigned.values())
         for tid in list(self.tracks.keys()):
-            if tid not in used_track_ids and tid not in assigned.values():
+            if tid not in used_track_ids and tid not in assigned_ids:
                 self.lost[tid] = self.lost.get(tid, 0) + 1
+                self._elapsed[tid] = self._elapsed.get(tid, 0.0) + dt
                 if self.lost[tid] > self.max_lost:
                     del self.tracks[tid]
                     del self.lost[tid]
+                    self._forget(tid)
+                    self.removed_ids.append(tid)
 
         ids = [assigned[j] for j in range(len(boxes_list))]
         return np.array(ids, dtype=int)
@@ -15,6 +15,8 @@
 # -----------------------------------------------------------------------------
 from __future__ import annotations
 from typing import Optional
+import os
+import time
 import cv2 as cv
 import numpy as np
 from collections import defaultdict
@@ -24,10 +26,16 @@ from components.interfaces import Tool
 
 from .core.cam_mapper import Cam2WorldMapper
 from .core.speedometer import Speedometer, MPS_TO_KPH
+from .core.running_stats import RunningStats
 
 from .simple_tracker import SimpleTracker
+from .byte_tracker import ByteTracker
 from .onnx_utils import load_onnx, run_onnx
+from .inference_server import get_inference_server
+from .detection_stride import DetectionStride
+from .config import BATCH_INFERENCE, ROI_CROP, ROI_MARGIN, SPEED_SMOOTHING
 from .annotators import init_annotators
+from .geometry import best_match
 import supervision as sv
 import math
 
@@ -49,12 +57,26 @@ class VehicleSpeedTool(Tool):
         self.zone = None
         self.poly_pts = None
 
-        self.simple_tracker = SimpleTracker(iou_threshold=0.3, max_lost=5)
+        self.shared_inference = False
+        self.batch_inference = BATCH_INFERENCE
+        self.tracking_server = None
+        self.detector_server = None
+
+        self.stream_tracker = "simple"
+        self.tracker = SimpleTracker(iou_threshold=0.3, max_lost=5)
+        self.detection_stride = DetectionStride(1)
+        self.roi_crop = ROI_CROP
+        self._roi = None
+        self._roi_shape = None
+        self._track_meta = {}
+        self._last_ts = None
 
         self.vehicle_counts = defaultdict(int)
         self.current_speeds = {}
-        self.all_speeds = []
-        self.tracked_ids = set()
+        self.speed_stats = RunningStats()
+        self.active_ids = set()
+        self.total_tracked = 0
+        self._reset_latency()
         self.stream_fps = 30
         self.stream_conf = 0.4
         self.stream_classes = [2,3,5,6]
@@ -80,13 +102,41 @@ class VehicleSpeedTool(Tool):
         yolo_weights=None,
         detector_weights=None,
         fps_override=30,
+        batch_inference=None,
+        speed_smoothing=None,
+        ort_profile=None,
+        detection_stride=None,
+        roi_crop=None,
     ):
         try:
             weights_speed = yolo_weights or self.yolo_weights
-            weights_detector = detector_weights or self.detector_weights
-
-            self.model = load_onnx(weights_speed)
-            self.detector_model = load_onnx(weights_detector)
+            # A camera that picks its own yolo_weights (e.g. an INT8 variant)
+            # uses them for display detections too unless told otherwise.
+            weights_detector = detector_weights or yolo_weights or self.detector_weights
+
+            # Tracking and display detections come from the same weights by
+            # default, so load a single session and run it once per frame.
+            self.shared_inference = self._same_weights(weights_speed, weights_detector)
+            self.batch_inference = BATCH_INFERENCE if batch_inference is None else bool(batch_inference)
+
+            if self.batch_inference:
+                # Sessions live in the process-wide inference servers and are
+                # shared with every other stream using the same weights.
+                self.model = None
+                self.detector_model = None
+                self.tracking_server = get_inference_server(weights_speed, profile=ort_profile)
+                self.detector_server = (
+                    self.tracking_server if self.shared_inference
+                    else get_inference_server(weights_detector, profile=ort_profile)
+                )
+            else:
+                self.tracking_server = None
+                self.detector_server = None
+                self.model = load_onnx(weights_speed, profile=ort_profile)
+                if self.shared_inference:
+                    self.detector_model = self.model
+                else:
+                    self.detector_model = load_onnx(weights_detector, profile=ort_profile)
 
             self.stream_classes = classes or self.stream_classes
             self.stream_conf = conf or self.stream_conf
@@ -95,19 +145,32 @@ class VehicleSpeedTool(Tool):
 
             self.mapper = Cam2WorldMapper()
             self.mapper.find_perspective_transform(image_pts, world_pts)
-            self.speedometer = Speedometer(self.mapper, self.stream_fps, unit=MPS_TO_KPH)
+            self.speedometer = Speedometer(
+                self.mapper,
+                self.stream_fps,
+                unit=MPS_TO_KPH,
+                smoothing=speed_smoothing or SPEED_SMOOTHING,
+            )
 
             self.bbox_annot, self.trace_annot, self.label_annot = init_annotators(self.stream_fps)
 
             poly = np.array(image_pts, dtype=np.int32)
             self.poly_pts = poly.reshape((-1, 1, 2))
             self.zone = sv.PolygonZone(poly, (sv.Position.TOP_CENTER, sv.Position.BOTTOM_CENTER))
+            self.roi_crop = ROI_CROP if roi_crop is None else bool(roi_crop)
+            self._roi = None
+            self._roi_shape = None
 
             self.vehicle_counts = defaultdict(int)
             self.current_speeds = {}
-            self.all_speeds = []
-            self.tracked_ids = set()
-            self.simple_tracker = SimpleTracker(iou_threshold=0.3, max_lost=5)
+            self.speed_stats = RunningStats()
+            self.active_ids = set()
+            self.total_tracked = 0
+            self.tracker = self._create_tracker()
+            self.detection_stride = DetectionStride(detection_stride, fps=self.stream_fps)
+            self._track_meta = {}
+            self._last_ts = None
+            self._reset_latency()
 
             self.stream_ready = True
             return True
@@ -124,21 +187,64 @@ class VehicleSpeedTool(Tool):
             return "Missing image_pts or world_pts"
         return None
 
-    def process_frame(self, frame_bgr):
+    def process_frame(self, frame_bgr, timestamp=None, frame_scale=1.0):
+        """Track, measure and optionally annotate one frame.
+
+        ``timestamp`` is the frame's capture or arrival time in seconds. When
+        given, speeds and the tracker's motion model use the real time between
+        frames instead of the nominal fps. ``frame_scale`` is the size of
+        ``frame_bgr`` relative to the calibrated camera resolution (e.g. 0.5
+        for a frame decoded at half size); detections are mapped back to
+        calibrated coordinates before tracking.
+        """
         if not getattr(self, "stream_ready", False):
             raise RuntimeError("Stream mode not initialized.")
 
+        frame_start = time.perf_counter()
+        infer_ms = 0.0
+        onnx_runs = 0
         try:
             # H, W = frame_bgr.shape[:2]
             imgsz = (640, 640)
 
-            boxes_t, scores_t, classes_t = run_onnx(self.model, frame_bgr, imgsz=imgsz, conf_thres=self.stream_conf)
+            # Motion model steps are in nominal frames; real timing stretches them.
+            dt = 1.0
+            if timestamp is not None and self._last_ts is not None:
+                interval = timestamp - self._last_ts
+                self.detection_stride.observe_interval(interval)
+                dt = max(interval, 0.0) * self.stream_fps
+            if timestamp is not None:
+                self._last_ts = timestamp
+
+            detect_now = self.detection_stride.should_detect()
+            if detect_now:
+                t0 = time.perf_counter()
+                boxes_t, scores_t, classes_t = self._detect(self.model, self.tracking_server, frame_bgr, imgsz, frame_scale)
+                detect_ms = (time.perf_counter() - t0) * 1000.0
+                infer_ms += detect_ms
+                onnx_runs += 1
+                # The tracker also runs on empty frames so lost tracks age out.
+                ids = self.tracker.update(boxes_t, scores_t, dt=dt)
+                for tid in getattr(self.tracker, "removed_ids", ()):
+                    self._evict_track(tid)
+                new_tracks = 0
+                for tid, cid, score in zip(ids.tolist(), classes_t.tolist(), scores_t.tolist()):
+                    if tid >= 0:
+                        new_tracks += tid not in self._track_meta
+                        self._track_meta[tid] = (cid, score)
+            else:
+                # Skipped frame: the tracker carries the last detections forward.
+                ids, boxes_t = self.tracker.propagate(dt)
+                meta = [self._track_meta.get(tid, (-1, 0.0)) for tid in ids.tolist()]
+                classes_t = np.array([m[0] for m in meta], dtype=int)
+                scores_t = np.array([m[1] for m in meta], dtype=float)
+
             if len(boxes_t) == 0:
                 det_tracked = sv.Detections.empty()
             else:
-                ids = self.simple_tracker.update(boxes_t)
                 det_tracked = sv.Detections(xyxy=boxes_t, confidence=scores_t, class_id=classes_t)
                 det_tracked.tracker_id = ids
+                det_tracked = det_tracked[ids >= 0]
 
             try:
                 mask_tracked = self.zone.trigger(det_tracked)
@@ -146,13 +252,16 @@ class VehicleSpeedTool(Tool):
             except Exception:
                 det_tracked = sv.Detections.empty()
 
-            dummy_frame = frame_bgr.copy()
-            try:
-                self.trace_annot.annotate(dummy_frame, det_tracked)
-            except Exception:
-                pass
+            if detect_now:
+                self.detection_stride.observe_detection(detect_ms, len(det_tracked), new_tracks)
 
-            boxes_d, scores_d, classes_d = run_onnx(self.detector_model, frame_bgr, imgsz=imgsz, conf_thres=self.stream_conf)
+            if self.shared_inference or not detect_now:
+                boxes_d, scores_d, classes_d = boxes_t, scores_t, classes_t
+            else:
+                t0 = time.perf_counter()
+                boxes_d, scores_d, classes_d = self._detect(self.detector_model, self.detector_server, frame_bgr, imgsz, frame_scale)
+                infer_ms += (time.perf_counter() - t0) * 1000.0
+                onnx_runs += 1
             if len(boxes_d) == 0:
                 det_display = sv.Detections.empty()
             else:
@@ -168,53 +277,48 @@ class VehicleSpeedTool(Tool):
             frame_vehicle_counts = defaultdict(int)
             frame_speeds = []
 
-            for i in range(len(det_tracked)):
-                tid = int(det_tracked.tracker_id[i]) if getattr(det_tracked, "tracker_id", None) is not None else None
-                if tid is not None:
-                    self.tracked_ids.add(tid)
-                    trace = self.trace_annot.trace.get(tid)
+            if len(det_tracked) > 0 and getattr(det_tracked, "tracker_id", None) is not None:
+                tids = np.asarray(det_tracked.tracker_id, dtype=int)
+                # Propagated boxes carry no new measurement, so speeds only
+                # move on frames where the detector ran.
+                if detect_now:
                     try:
-                        self.speedometer.update_with_trace(tid, trace)
-                        sp = self.speedometer.get_current_speed(tid)
+                        centers = det_tracked.get_anchors_coordinates(sv.Position.CENTER)
+                        self.speedometer.update_points(
+                            tids, centers, frame_idx=self.latency["frames"], timestamp=timestamp
+                        )
                     except Exception:
-                        sp = 0
+                        pass
+
+                for tid in tids.tolist():
+                    if tid not in self.active_ids:
+                        self.active_ids.add(tid)
+                        self.total_tracked += 1
+                    sp = self.speedometer.get_current_speed(tid)
                     tracker_speeds[tid] = sp
                     self.current_speeds[tid] = sp
                     if sp > 0:
                         frame_speeds.append(sp)
-                        self.all_speeds.append(sp)
+                        if detect_now:
+                            self.speed_stats.add(sp)
 
             labels = []
-            matched_tracker_ids = []
 
             for i in range(len(det_display)):
                 cid = int(det_display.class_id[i]) if det_display.class_id is not None else -1
                 cls_name = self.class_names[cid] if 0 <= cid < len(self.class_names) else "vehicle"
 
                 frame_vehicle_counts[cls_name] += 1
-
-                best_iou = 0.0
-                best_tid = None
-                display_box = det_display.xyxy[i]
-
-                for j in range(len(det_tracked)):
-                    if getattr(det_tracked, "tracker_id", None) is None:
-                        continue
-                    tracked_box = det_tracked.xyxy[j]
-                    iou = self._calculate_iou(display_box, tracked_box)
-                    if iou > best_iou and iou > 0.3:
-                        best_iou = iou
-                        best_tid = int(det_tracked.tracker_id[j])
-
                 labels.append(f"{cls_name}")
 
-                if best_tid is not None:
-                    matched_tracker_ids.append(best_tid)
-                else:
-                    matched_tracker_ids.append(i)
-
             if len(det_display) > 0:
-                det_display.tracker_id = np.array(matched_tracker_ids, dtype=int)
+                # Display boxes without a tracked match keep their row index as id.
+                matched_tracker_ids = np.arange(len(det_display))
+                if len(det_tracked) > 0 and getattr(det_tracked, "tracker_id", None) is not None:
+                    best_j, _ = best_match(det_display.xyxy, det_tracked.xyxy, iou_threshold=0.3)
+                    matched = best_j >= 0
+                    matched_tracker_ids[matched] = np.asarray(det_tracked.tracker_id)[best_j[matched]]
+                det_display.tracker_id = matched_tracker_ids.astype(int)
 
             for cls_name, count in frame_vehicle_counts.items():
                 self.vehicle_counts[cls_name] = max(self.vehicle_counts[cls_name], count)
@@ -232,9 +336,19 @@ class VehicleSpeedTool(Tool):
 
             annot = frame_bgr.copy()
             overlay = annot.copy()
-            cv.fillPoly(overlay, [self.poly_pts], (0, 180, 0))
+            poly_draw = self.poly_pts
+            if frame_scale != 1.0:
+                poly_draw = np.round(self.poly_pts * frame_scale).astype(np.int32)
+                if len(det_display) > 0:
+                    det_display = sv.Detections(
+                        xyxy=det_display.xyxy * frame_scale,
+                        confidence=det_display.confidence,
+                        class_id=det_display.class_id,
+                        tracker_id=det_display.tracker_id,
+                    )
+            cv.fillPoly(overlay, [poly_draw], (0, 180, 0))
             annot = cv.addWeighted(overlay, 0.2, annot, 0.8, 0)
-            cv.polylines(annot, [self.poly_pts], True, (0,255,0), 2)
+            cv.polylines(annot, [poly_draw], True, (0,255,0), 2)
 
             if len(det_display) > 0:
                 try:
@@ -264,29 +378,119 @@ class VehicleSpeedTool(Tool):
             print(f"Error processing frame: {e}")
             traceback.print_exc()
             return frame_bgr, {}
-
-    def _calculate_iou(self, box1, box2):
-        x1 = max(box1[0], box2[0])
-        y1 = max(box1[1], box2[1])
-        x2 = min(box1[2], box2[2])
-        y2 = min(box1[3], box2[3])
-        if x2 < x1 or y2 < y1:
-            return 0.0
-        intersection = (x2 - x1) * (y2 - y1)
-        area1 = max(0.0, (box1[2] - box1[0]) * (box1[3] - box1[1]))
-        area2 = max(0.0, (box2[2] - box2[0]) * (box2[3] - box2[1]))
-        union = area1 + area2 - intersection
-        return intersection / union if union > 0 else 0.0
+        finally:
+            self._record_latency((time.perf_counter() - frame_start) * 1000.0, infer_ms, onnx_runs)
+
+    def _evict_track(self, tid: int):
+        self.active_ids.discard(tid)
+        self.current_speeds.pop(tid, None)
+        self._track_meta.pop(tid, None)
+        if self.speedometer is not None:
+            self.speedometer.evict(tid)
+
+    def _create_tracker(self):
+        # tracker_cfg is stored as "bytetrack.yaml" by the camera setup API.
+        if "bytetrack" in str(self.stream_tracker).lower():
+            return ByteTracker(
+                high_thresh=max(0.5, float(self.stream_conf)),
+                max_lost=max(5, int(self.stream_fps)),
+            )
+        return SimpleTracker(iou_threshold=0.3, max_lost=5)
+
+    def _detect(self, sess, server, frame_bgr, imgsz, frame_scale=1.0):
+        roi = self._zone_roi(frame_bgr.shape, frame_scale) if self.roi_crop else None
+        if roi is not None:
+            x1, y1, x2, y2 = roi
+            frame_bgr = frame_bgr[y1:y2, x1:x2]
+        if server is not None:
+            boxes, scores, classes = server.infer(frame_bgr, conf_thres=self.stream_conf)
+        else:
+            boxes, scores, classes = run_onnx(sess, frame_bgr, imgsz=imgsz, conf_thres=self.stream_conf)
+        if roi is not None and len(boxes):
+            boxes = boxes + np.array([x1, y1, x1, y1], dtype=boxes.dtype)
+        if frame_scale != 1.0 and len(boxes):
+            boxes = boxes / frame_scale
+        return boxes, scores, classes
+
+    def _zone_roi(self, frame_shape, frame_scale=1.0):
+        # Bounding box of the calibrated polygon plus a margin, so vehicles
+        # whose anchor is inside the zone are not cut off; cached per frame size.
+        shape = (frame_shape[0], frame_shape[1], frame_scale)
+        if shape != self._roi_shape:
+            self._roi_shape = shape
+            self._roi = None
+            if self.poly_pts is not None:
+                h, w = shape[:2]
+                pts = self.poly_pts.reshape(-1, 2) * frame_scale
+                x1, y1 = pts.min(axis=0)
+                x2, y2 = pts.max(axis=0)
+                mx = max(16, int((x2 - x1) * ROI_MARGIN))
+                my = max(16, int((y2 - y1) * ROI_MARGIN))
+                x1, y1 = max(0, int(x1) - mx), max(0, int(y1) - my)
+                x2, y2 = min(w, int(x2) + mx + 1), min(h, int(y2) + my + 1)
+                # A crop covering (almost) the whole frame gains nothing.
+                if x2 - x1 >= 32 and y2 - y1 >= 32 and (x2 - x1) * (y2 - y1) < 0.95 * w * h:
+                    self._roi = (x1, y1, x2, y2)
+        return self._roi
+
+    @staticmethod
+    def _same_weights(path_a: str, path_b: str) -> bool:
+        try:
+            return os.path.samefile(path_a, path_b)
+        except OSError:
+            return os.path.realpath(path_a) == os.path.realpath(path_b)
+
+    def _reset_latency(self):
+        self.latency = {
+            "frames": 0,
+            "last_frame_ms": 0.0,
+            "last_infer_ms": 0.0,
+            "total_frame_ms": 0.0,
+            "total_infer_ms": 0.0,
+            "onnx_runs": 0,
+        }
+
+    def _record_latency(self, frame_ms: float, infer_ms: float, onnx_runs: int):
+        lat = self.latency
+        lat["frames"] += 1
+        lat["last_frame_ms"] = frame_ms
+        lat["last_infer_ms"] = infer_ms
+        lat["total_frame_ms"] += frame_ms
+        lat["total_infer_ms"] += infer_ms
+        lat["onnx_runs"] += onnx_runs
+
+    def get_latency_stats(self):
+        lat = self.latency
+        n = lat["frames"]
+        return {
+            "frames": n,
+            "shared_inference": self.shared_inference,
+            "batch_inference": self.batch_inference,
+            "last_frame_ms": round(lat["last_frame_ms"], 2),
+            "last_infer_ms": round(lat["last_infer_ms"], 2),
+            "avg_frame_ms": round(lat["total_frame_ms"] / n, 2) if n else 0.0,
+            "avg_infer_ms": round(lat["total_infer_ms"] / n, 2) if n else 0.0,
+            "onnx_runs_per_frame": round(lat["onnx_runs"] / n, 2) if n else 0.0,
+            "detection_stride": self.detection_stride.stats(),
+            "roi": list(self._roi) if self.roi_crop and self._roi is not None else None,
+        }
 
     def get_stream_metrics(self):
         if not self.stream_ready:
             return {}
 
-        avg_speed = np.mean(self.all_speeds) if self.all_speeds else 0
+        stats = self.speed_stats
+        avg_speed = stats.mean if len(stats) else 0
 
         return {
-            "total_tracked_vehicles": len(self.tracked_ids),
+            "total_tracked_vehicles": self.total_tracked,
             "vehicle_counts_by_class": dict(self.vehicle_counts),
             "average_speed_kmh": round(avg_speed, 1),
-            "all_speeds": self.all_speeds[-100:]
+            "all_speeds": stats.recent(),
+            "speed_stats": {
+                "count": len(stats),
+                "std_kmh": round(stats.std, 2),
+                **{k: round(v, 1) for k, v in stats.percentiles().items()},
+            },
+            "latency": self.get_latency_stats(),
         }
\ No newline at end of file
@@ -35,6 +35,8 @@ from app.routers import knowledge, streams, navigation, camera_setup
 from app.ws_traffic import router as ws_traffic_router
 from app.ws_flood import router as ws_flood_router
 
+from app.traffic_backends import close_traffic_backends
+from service.orion_publisher import close_orion_publishers
 from service.rag.rag_service import MiniRagService
 from components.watcher.rss_watcher import RSSWatcher
 from components.watcher.s3_watcher import S3Watcher
@@ -122,6 +124,11 @@ def create_app():
     app.include_router(ws_traffic_router)
     app.include_router(ws_flood_router)
 
+    # Flush queued Orion upserts before the loop goes away.
+    app.add_event_handler("shutdown", close_orion_publishers)
+    # Detach from shared traffic state; the last worker out removes it.
+    app.add_event_handler("shutdown", close_traffic_backends)
+
     @app.get("/")
     async def root():
         return {
@@ -0,0 +1,314 @@
+# -----------------------------------------------------------------------------
+# Copyright 2025 Fenwick Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# -----------------------------------------------------------------------------
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from components.logging.logger import setup_logger
+
+logger = setup_logger("orion_publisher")
+
+ORION_URL = os.getenv("ORION_URL", "http://localhost:1026")
+ORION_FLUSH_INTERVAL = float(os.getenv("ORION_FLUSH_INTERVAL", "1.0"))
+ORION_MAX_BATCH = int(os.getenv("ORION_MAX_BATCH", "100"))
+ORION_MAX_PENDING = int(os.getenv("ORION_MAX_PENDING", "5000"))
+ORION_MAX_RETRIES = int(os.getenv("ORION_MAX_RETRIES", "3"))
+ORION_RETRY_BASE = float(os.getenv("ORION_RETRY_BASE", "0.25"))
+ORION_TIMEOUT = float(os.getenv("ORION_TIMEOUT", "8.0"))
+ORION_MAX_CONNECTIONS = int(os.getenv("ORION_MAX_CONNECTIONS", "10"))
+
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def default_upsert_url() -> str:
+    return ORION_URL.rstrip("/") + "/ngsi-ld/v1/entityOperations/upsert"
+
+
+class OrionPublisher:
+    """Coalescing, batched NGSI-LD upserts on a pooled httpx.AsyncClient.
+
+    ``submit`` never blocks the caller: it records the entity as the latest
+    state of its id and returns. Every flush interval the pending entities
+    are sent as arrays of up to ``max_batch`` to /entityOperations/upsert,
+    retrying transport errors, 429 and 5xx with exponentially growing,
+    fully jittered delays. An entity updated again before its flush is sent
+    once, with the newest attributes. Pending entities are bounded; new ids
+    are rejected once ``max_pending`` distinct entities are waiting.
+    """
+
+    def __init__(
+        self,
+        upsert_url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = ORION_TIMEOUT,
+        flush_interval: float = ORION_FLUSH_INTERVAL,
+        max_batch: int = ORION_MAX_BATCH,
+        max_pending: int = ORION_MAX_PENDING,
+        max_retries: int = ORION_MAX_RETRIES,
+        retry_base: float = ORION_RETRY_BASE,
+    ) -> None:
+        self.upsert_url = upsert_url
+        self.headers = {"Content-Type": "application/ld+json", **(headers or {})}
+        self.timeout = timeout
+        self.flush_interval = max(0.01, flush_interval)
+        self.max_batch = max(1, max_batch)
+        self.max_pending = max(1, max_pending)
+        self.max_retries = max(0, max_retries)
+        self.retry_base = retry_base
+
+        # entity id -> (entity, first enqueue time, futures awaiting the send)
+        self._pending: Dict[str, Tuple[Dict[str, Any], float, List[asyncio.Future]]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing = False
+
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.batches = 0
+        self.sent_entities = 0
+        self.failed_entities = 0
+        self.retries = 0
+        self.last_status: Optional[int] = None
+        self.last_error: Optional[str] = None
+        self.last_flush_ms = 0.0
+        self.last_lag_ms = 0.0
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        if self._client is not None:
+            self._close_client(self._client, self._loop)
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        limits = httpx.Limits(max_connections=ORION_MAX_CONNECTIONS, max_keepalive_connections=ORION_MAX_CONNECTIONS)
+        self._client = httpx.AsyncClient(timeout=self.timeout, limits=limits)
+        self._task = loop.create_task(self._run())
+
+    @staticmethod
+    def _close_client(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        # The client's connections belong to the loop that opened them, so
+        # close it there while that loop still runs.
+        async def _close():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.debug("Closing previous Orion client failed: %s", e)
+
+        running = asyncio.get_running_loop()
+        if loop is not None and loop is not running and loop.is_running():
+            asyncio.run_coroutine_threadsafe(_close(), loop)
+        else:
+            running.create_task(_close())
+
+    def submit(self, entity: Dict[str, Any], waiter: Optional[asyncio.Future] = None) -> bool:
+        """Queue ``entity`` for the next flush; must run on the event loop.
+
+        Returns False when the queue is full. ``waiter`` (if given) receives
+        (ok, message) once the entity has been sent.
+        """
+        if self._closing:
+            if waiter is not None:
+                waiter.set_result((False, "Orion publisher closed"))
+            return False
+        self._ensure_started()
+        entity_id = str(entity.get("id"))
+        self.submitted += 1
+
+        current = self._pending.get(entity_id)
+        if current is not None:
+            self.coalesced += 1
+            _, first_at, waiters = current
+        elif len(self._pending) >= self.max_pending:
+            self.rejected += 1
+            if waiter is not None:
+                waiter.set_result((False, "Orion publisher queue full"))
+            return False
+        else:
+            first_at, waiters = time.monotonic(), []
+        if waiter is not None:
+            waiters.append(waiter)
+        self._pending[entity_id] = (entity, first_at, waiters)
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return True
+
+    async def publish(self, entity: Dict[str, Any]) -> Tuple[bool, str]:
+        """Queue ``entity`` and wait for the batch that carries it."""
+        waiter = asyncio.get_running_loop().create_future()
+        self.submit(entity, waiter)
+        return await waiter
+
+    async def _run(self) -> None:
+        while True:
+            if not self._closing:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Orion flush failed")
+            if self._closing and not self._pending:
+                return
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        now = time.monotonic()
+        self.last_lag_ms = max((now - first_at) * 1000.0 for _, first_at, _ in pending.values())
+
+        items = list(pending.items())
+        t0 = time.perf_counter()
+        try:
+            for start in range(0, len(items), self.max_batch):
+                chunk = items[start:start + self.max_batch]
+                ok, message = await self._post([entity for _, (entity, _, _) in chunk])
+                self.batches += 1
+                if ok:
+                    self.sent_entities += len(chunk)
+                else:
+                    self.failed_entities += len(chunk)
+                self._resolve(chunk, ok, message)
+        finally:
+            # A flush cut short (cancelled or raised) must not leave
+            # publish() callers waiting on entities that were never sent.
+            self._resolve(items, False, "Orion flush interrupted")
+        self.last_flush_ms = (time.perf_counter() - t0) * 1000.0
+
+    @staticmethod
+    def _resolve(items, ok: bool, message: str) -> None:
+        for _, (_, _, waiters) in items:
+            for future in waiters:
+                if not future.done():
+                    future.set_result((ok, message))
+
+    async def _post(self, entities: List[Dict[str, Any]]) -> Tuple[bool, str]:
+        attempt = 0
+        while True:
+            retryable = True
+            try:
+                r = await self._client.post(self.upsert_url, json=entities, headers=self.headers)
+                self.last_status = r.status_code
+                if r.status_code in (200, 201, 204, 207):
+                    if r.status_code == 207:
+                        logger.warning("Orion upsert partially failed: %s", r.text[:500])
+                    return True, f"Upsert OK ({r.status_code})"
+                message = f"Upsert failed {r.status_code}: {r.text[:500]}"
+                retryable = r.status_code in _RETRY_STATUS
+            except httpx.HTTPError as e:
+                message = f"HTTP error on upsert: {e}"
+            self.last_error = message
+
+            if not retryable or attempt >= self.max_retries:
+                logger.warning("%s (%d entities dropped)", message, len(entities))
+                return False, message
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(random.uniform(0, self.retry_base * (2 ** attempt)))
+
+    async def aclose(self, timeout: Optional[float] = None) -> None:
+        """Stop the flush loop after one last flush of everything pending.
+
+        The final flush gets ``timeout`` seconds (default: one request
+        timeout per attempt); whatever is still unsent after that is
+        resolved as failed rather than left for its awaiters to hang on.
+        """
+        self._closing = True
+        if timeout is None:
+            timeout = self.timeout * (self.max_retries + 1)
+        task = self._task
+        if task is not None and not task.done():
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Final Orion flush timed out after %.1fs", timeout)
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+            except Exception:
+                logger.exception("Final Orion flush failed")
+        self._task = None
+        if self._pending:
+            pending, self._pending = self._pending, {}
+            self.failed_entities += len(pending)
+            self._resolve(pending.items(), False, "Orion publisher closed")
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._closing = False
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        oldest = min((first_at for _, first_at, _ in self._pending.values()), default=None)
+        return {
+            "upsert_url": self.upsert_url,
+            "pending": len(self._pending),
+            "queue_lag_ms": round((now - oldest) * 1000.0, 1) if oldest is not None else 0.0,
+            "last_flush_lag_ms": round(self.last_lag_ms, 1),
+            "last_flush_ms": round(self.last_flush_ms, 1),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "sent_entities": self.sent_entities,
+            "failed_entities": self.failed_entities,
+            "retries": self.retries,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+        }
+
+
+_publishers: Dict[Any, OrionPublisher] = {}
+
+
+def get_orion_publisher(
+    upsert_url: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+) -> OrionPublisher:
+    upsert_url = upsert_url or default_upsert_url()
+    timeout = timeout or ORION_TIMEOUT
+    key = (upsert_url, tuple(sorted((headers or {}).items())), timeout)
+    publisher = _publishers.get(key)
+    if publisher is None:
+        publisher = OrionPublisher(upsert_url, headers=headers, timeout=timeout)
+        _publishers[key] = publisher
+    return publisher
+
+
+def list_orion_publishers() -> List[Dict[str, Any]]:
+    return [p.stats() for p in _publishers.values()]
+
+
+async def close_orion_publishers() -> None:
+    for publisher in list(_publishers.values()):
+        await publisher.aclose()
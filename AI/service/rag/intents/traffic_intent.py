@@ -41,7 +41,7 @@ class TrafficIntent(BaseIntent):
         conversation_id: str,
         router_tokens: Dict[str, Any],
     ) -> Dict[str, Any]:
-        all_segments_data = traffic_state.snapshot_with_addresses()
+        all_segments_data = traffic_state.snapshot_with_addresses(smoothed=True)
         all_frames = traffic_media.snapshot()
 
         streams_config = service.streams_config
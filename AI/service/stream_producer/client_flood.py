@@ -21,6 +21,7 @@ import websockets
 import time
 from typing import Any, Dict, List, Optional
 
+from components.codec.jpeg_codec import JpegCodec
 from components.logging.logger import setup_logger
 
 CONFIG_PATH = os.getenv("FLOOD_CONFIG_PATH", "config/flood_stream.json")
@@ -60,6 +61,10 @@ async def run_stream(
                     logger.info(f"[{stream_id}] Cannot open video {video_path}")
                     return
 
+                # Upload quality of the producer itself, independent of what
+                # the server re-encodes for frontends.
+                codec = JpegCodec(quality=config.get("upload_jpeg_quality", 80))
+
                 video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
                 send_fps = min(limit_fps, video_fps) if limit_fps > 0 else video_fps
 
@@ -73,6 +78,8 @@ async def run_stream(
                     "yolo_weights": config.get("yolo_weights"),
                     "fps": send_fps,
                     "address": config.get("address"),
+                    "ingest_mode": config.get("ingest_mode", "latest"),
+                    "frame_encoding": "jpeg",
                 }
 
                 await ws.send(json.dumps(init_cfg))
@@ -97,12 +104,12 @@ async def run_stream(
                     if acc >= sample_step:
                         acc -= sample_step
 
-                        ok, jpg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-                        if not ok:
+                        jpg_bytes = codec.encode(frame)
+                        if jpg_bytes is None:
                             continue
 
                         try:
-                            await ws.send(jpg.tobytes())
+                            await ws.send(jpg_bytes)
                         except Exception as e:
                             logger.info(f"[{stream_id}] send error: {e}")
                             break
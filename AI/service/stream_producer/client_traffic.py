@@ -19,6 +19,8 @@ import os
 import time
 from typing import Any, Dict, Optional
 
+from app.frame_encoding import pack_capture_ts
+from components.codec.jpeg_codec import JpegCodec
 from components.logging.logger import setup_logger
 from components.manager import ConfigManager
 
@@ -28,8 +30,24 @@ import websockets
 DEFAULT_CONFIG_PATH = "config/streams_config.json"
 DEFAULT_WS = f"ws://{os.getenv('AI_HOST')}/ws/process"
 
+MIN_SEND_FPS = 0.5
+
 logger = setup_logger("client_traffic")
 
+
+def _suggested_fps(message: Any) -> Optional[float]:
+    if not isinstance(message, str):
+        return None
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or data.get("type") != "ack":
+        return None
+    flow = data.get("flow") or {}
+    suggested = flow.get("suggested_fps")
+    return float(suggested) if suggested else None
+
 async def run_stream(
     config: Dict[str, Any],
     ws_url: str,
@@ -60,12 +78,19 @@ async def run_stream(
                     logger.info(f"[{stream_id}] Cannot open video {video_path}")
                     return
 
+                # Upload quality of the producer itself, independent of what
+                # the server re-encodes for frontends.
+                codec = JpegCodec(quality=config.get("upload_jpeg_quality", 80))
+                # "raw_bgr" skips the JPEG round trip for a server on the same host.
+                frame_encoding = config.get("frame_encoding", "jpeg")
+
                 video_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
 
                 if limit_fps and limit_fps > 0:
                     send_fps = min(limit_fps, video_fps)
                 else:
                     send_fps = video_fps
+                max_send_fps = send_fps
 
                 init_cfg = {
                     "stream_id": stream_id,
@@ -78,6 +103,19 @@ async def run_stream(
                     "fps": send_fps,
                     "address": config.get("address"),
                     "segment_ids": config.get("segment_ids"),
+                    "ingest_mode": config.get("ingest_mode", "latest"),
+                    "ort_profile": config.get("ort_profile"),
+                    "detection_stride": config.get("detection_stride"),
+                    "roi_crop": config.get("roi_crop"),
+                    "jpeg_quality": config.get("jpeg_quality"),
+                    "jpeg_subsampling": config.get("jpeg_subsampling"),
+                    "decode_scale": config.get("decode_scale"),
+                    "frame_encoding": frame_encoding,
+                    "frame_width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                    "frame_height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                    # Each frame carries its capture time, so the server's
+                    # speeds do not depend on network and queueing jitter.
+                    "frame_timestamps": True,
                 }
 
                 await ws.send(json.dumps(init_cfg))
@@ -90,6 +128,7 @@ async def run_stream(
 
                 while True:
                     ret, frame = cap.read()
+                    captured_at = time.time()
                     if not ret:
                         logger.info(f"[{stream_id}] End of video reached. Restarting...")
                         cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
@@ -98,14 +137,15 @@ async def run_stream(
                     acc += 1.0
                     if acc >= sample_step:
                         acc -= sample_step
-                        ok, jpg = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-                        if not ok:
+                        if frame_encoding == "raw_bgr":
+                            frame_bytes = frame.tobytes()
+                        else:
+                            frame_bytes = codec.encode(frame)
+                        if frame_bytes is None:
                             continue
 
-                        jpg_bytes = jpg.tobytes()
-
                         try:
-                            await ws.send(jpg_bytes)
+                            await ws.send(pack_capture_ts(captured_at, frame_bytes))
                         except Exception as e:
                             logger.info(f"[{stream_id}] send error: {e}")
                             break
@@ -114,7 +154,15 @@ async def run_stream(
                             recv_task = asyncio.create_task(ws.recv())
                             done, pending = await asyncio.wait([recv_task], timeout=0.01)
                             if done:
-                                _ = recv_task.result()
+                                suggested = _suggested_fps(recv_task.result())
+                                if suggested is not None:
+                                    # Follow the server's sustainable rate, never
+                                    # above the configured limit_fps.
+                                    new_fps = max(MIN_SEND_FPS, min(max_send_fps, suggested))
+                                    if abs(new_fps - send_fps) / send_fps > 0.1:
+                                        logger.info(f"[{stream_id}] adapting send_fps {send_fps:.2f} -> {new_fps:.2f}")
+                                        send_fps = new_fps
+                                        sample_step = video_fps / float(send_fps) if send_fps < video_fps else 1.0
                             else:
                                 for p in pending:
                                     p.cancel()
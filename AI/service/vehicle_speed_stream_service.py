@@ -17,10 +17,10 @@ from typing import List, Tuple, Dict, Any, Optional
 from pathlib import Path
 
 import numpy as np
-import httpx
 
 from components.manager import ToolManager
 from components.logging.logger import setup_logger
+from service.orion_publisher import get_orion_publisher
 
 logger = setup_logger("vehicle_speed_stream_service")
 
@@ -52,6 +52,11 @@ class VehicleSpeedStreamService:
         tracker_cfg: Optional[str] = None,
         yolo_weights: Optional[str] = None,
         fps: int = 30,
+        batch_inference: Optional[bool] = None,
+        speed_smoothing: Optional[str] = None,
+        ort_profile: Optional[str] = None,
+        detection_stride: Optional[Any] = None,
+        roi_crop: Optional[bool] = None,
     ) -> bool:
         self.stream_config = {
             "image_pts": image_pts,
@@ -61,6 +66,11 @@ class VehicleSpeedStreamService:
             "tracker_cfg": tracker_cfg,
             "yolo_weights": yolo_weights,
             "fps_override": fps,
+            "batch_inference": batch_inference,
+            "speed_smoothing": speed_smoothing,
+            "ort_profile": ort_profile,
+            "detection_stride": detection_stride,
+            "roi_crop": roi_crop,
         }
 
         success = self.tool.init_stream_mode(**self.stream_config)
@@ -71,11 +81,16 @@ class VehicleSpeedStreamService:
         logger.info("Stream initialized successfully")
         return True
 
-    def process_frame(self, frame_bgr: np.ndarray) -> Tuple[np.ndarray, Dict[str, Any]]:
+    def process_frame(
+        self,
+        frame_bgr: np.ndarray,
+        timestamp: Optional[float] = None,
+        frame_scale: float = 1.0,
+    ) -> Tuple[np.ndarray, Dict[str, Any]]:
         if not self.initialized:
             raise RuntimeError("Stream not initialized. Call init_stream first.")
 
-        result = self.tool.process_frame(frame_bgr)
+        result = self.tool.process_frame(frame_bgr, timestamp=timestamp, frame_scale=frame_scale)
 
         if isinstance(result, tuple) and len(result) == 2:
             annotated_frame, metrics = result
@@ -115,22 +130,7 @@ class VehicleSpeedStreamService:
             else:
                 entity[k] = {"type": "Property", "value": v}
 
-        payload = [entity]
-        request_headers = {"Content-Type": "application/ld+json"}
-        if headers:
-            request_headers.update(headers)
-
+        # Batched with every other upsert to the same Orion on a pooled client.
         upsert_url = orion_base.rstrip("/") + "/entityOperations/upsert"
-
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            try:
-                r = await client.post(upsert_url, json=payload, headers=request_headers)
-            except Exception as e:
-                logger.exception("HTTP error on upsert: %s", e)
-                return False, f"HTTP error on upsert: {e}"
-
-        if r.status_code in (200, 201, 204):
-            return True, f"Upsert OK ({r.status_code})"
-        else:
-            logger.warning("Upsert failed %s: %s", r.status_code, r.text)
-            return False, f"Upsert failed {r.status_code}: {r.text}"
+        publisher = get_orion_publisher(upsert_url, headers=headers, timeout=timeout)
+        return await publisher.publish(entity)